@@ -0,0 +1,53 @@
+"""Load a stream of generated records into a file database with `insert_batch` and its options.
+
+Records are generated lazily, so the peak memory stays flat whatever the number of rows.
+Pass the number of rows as argument, like: `python -m benchmarks.bulk_load 10000000`
+"""
+
+import os
+import resource
+import sys
+import tempfile
+
+from .helper import (
+    BENCHMARK_TABLE,
+    create_database,
+    generate_records,
+    measure,
+    print_table,
+)
+
+ROWS = 1_000_000
+OPTIONS = {
+    "per batch": dict(batch_size=1000),
+    "every 100k rows": dict(batch_size=1000, commit_rows=100_000),
+    "every 500 ms": dict(batch_size=1000, commit_interval=500),
+    "once": dict(batch_size=1000, commit_rows=0),
+    "once, multi-row": dict(batch_size=5000, commit_rows=0, multi_values=True),
+}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in OPTIONS.items():
+            path = os.path.join(directory, f"{len(results)}.db")
+            database = create_database(path, profile="bulk-load")
+            table = database[BENCHMARK_TABLE]
+            count = 0
+
+            def load():
+                nonlocal count
+                count = table.insert_batch(generate_records(rows), **options)
+
+            elapsed = measure(load)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            results.append([name, count, f"{count / elapsed:,.0f}", f"{peak:.0f}"])
+            database.close()
+    print(f"{rows} rows, file database, bulk-load profile")
+    print_table(["commit", "inserted", "rows/s", "peak memory (MB)"], results)
+
+
+if __name__ == "__main__":
+    main()
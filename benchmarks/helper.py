@@ -0,0 +1,80 @@
+"""Shared helpers for the benchmark scripts. Run a benchmark from the repository root, like: `python -m benchmarks.statement_cache`"""
+
+import time
+from collections import OrderedDict
+
+from cmdapp.database import Database
+from cmdapp.parser import TableMeta, COLUMN_CREATE, COLUMN_UPDATE, COLUMN_DELETE
+
+BENCHMARK_TABLE = "person"
+
+
+def create_database(path: str = ":memory:", **kwargs) -> Database:
+    schema = [
+        TableMeta(
+            name=BENCHMARK_TABLE,
+            columns={
+                "name": "(*str): name of the person",
+                "age": "(int): age of the person",
+                "score": "(float): score of the person",
+                "team": "(str): team of the person",
+            },
+            meta_columns=[COLUMN_CREATE, COLUMN_UPDATE, COLUMN_DELETE],
+        )
+    ]
+    database = Database(path, schema, **kwargs)
+    database.prepare()
+    return database
+
+
+def generate_records(count: int, start: int = 0):
+    for index in range(start, start + count):
+        yield {
+            "name": f"Name #{index:08}",
+            "age": index % 90,
+            "score": (index % 1000) / 10,
+            "team": f"Team #{index % 50:02}",
+        }
+
+
+def measure(handler, repeat: int = 1) -> float:
+    """Run `handler` `repeat` times and return the elapsed time in seconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        handler()
+    return time.perf_counter() - start
+
+
+def print_table(headers: list[str], rows: list[list]):
+    widths = [
+        max(len(str(header)), *(len(str(row[i])) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    print(" | ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+class StatementTracker:
+    """Simulate the LRU statement cache of a sqlite3 connection (keyed by the SQL string) to report its hit rate"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.statements = OrderedDict()
+        self.hits = 0
+        self.total = 0
+
+    def track(self, sql: str):
+        self.total += 1
+        if sql in self.statements:
+            self.hits += 1
+            self.statements.move_to_end(sql)
+            return
+        self.statements[sql] = True
+        if len(self.statements) > self.capacity:
+            self.statements.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.total if self.total else 0.0
@@ -0,0 +1,89 @@
+"""Compare the strategies of `Table.select_in` to match long lists of values: one `IN (...)` statement, chunks of bound parameters and a joined temporary table.
+
+One statement fails over the limit of SQL parameters (`SQLITE_MAX_VARIABLE_NUMBER`) and it slows down much faster than the list grows,
+so it is skipped over `SINGLE_LIMIT` values. The other strategies have no limit.
+"""
+
+import random
+import sqlite3
+
+from cmdapp.database import SQLBuilder, SQLCondition, SQLOperators
+from cmdapp.database.helper import CursorHelper
+from cmdapp.parser import COLUMN_ID
+
+from .helper import (
+    BENCHMARK_TABLE,
+    create_database,
+    generate_records,
+    measure,
+    print_table,
+)
+
+ROWS = 200_000
+SIZES = [100, 1_000, 10_000, 50_000, 200_000]
+SINGLE_LIMIT = 20_000
+
+
+def run_single(table, values: list):
+    sql, data = SQLBuilder.select(
+        table.name,
+        columns=[COLUMN_ID],
+        condition=SQLCondition(COLUMN_ID, SQLOperators.IN, values),
+        compiled=True,
+    )
+    cursor = table.conn.execute(sql, data, on_error=table.on_error)
+    if cursor is None:
+        raise sqlite3.OperationalError(table.errors[-1]["message"])
+    return CursorHelper.as_objects(cursor)
+
+
+def run_chunked(table, values: list):
+    return table.select_in(
+        COLUMN_ID, values, [COLUMN_ID], temp_table_threshold=len(values)
+    )
+
+
+def run_temp_table(table, values: list):
+    return table.select_in(COLUMN_ID, values, [COLUMN_ID], temp_table_threshold=0)
+
+
+def main():
+    database = create_database()
+    table = database[BENCHMARK_TABLE]
+    table.insert_batch(generate_records(ROWS), batch_size=5000)
+
+    strategies = [
+        ("one statement", run_single),
+        ("chunked", run_chunked),
+        ("temp table", run_temp_table),
+    ]
+    rows = []
+    for size in SIZES:
+        values = random.sample(range(1, ROWS * 2), size)
+        expected = None
+        row = [size]
+        for _, runner in strategies:
+            if runner is run_single and size > SINGLE_LIMIT:
+                row.append("skipped")
+                continue
+            table.refresh()
+            try:
+                result = []
+                elapsed = measure(lambda: result.extend(runner(table, values)))
+            except sqlite3.Error:
+                row.append("error")
+                continue
+            found = sorted(record[COLUMN_ID] for record in result)
+            assert expected is None or found == expected
+            expected = found
+            row.append(f"{elapsed * 1e3:.1f}")
+        rows.append(row)
+    print(
+        f"{ROWS} rows, about half of the values match. max SQL parameters = {database.conn.max_variables()}"
+    )
+    print_table(["values"] + [f"{name} (ms)" for name, _ in strategies], rows)
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare the performance profiles (PRAGMAs) of a file database on `insert_batch` and `query`.
+
+Small batches commit often, so they show the cost of syncing the journal to disk on each commit.
+"""
+
+import os
+import random
+import tempfile
+
+from cmdapp.database import SQLCondition, SQLOperators, PERFORMANCE_PROFILES
+from cmdapp.parser import COLUMN_DELETE
+
+from .helper import (
+    BENCHMARK_TABLE,
+    create_database,
+    generate_records,
+    measure,
+    print_table,
+)
+
+ROWS = 100_000
+BATCH_SIZES = [10, 1000]
+QUERIES = 2_000
+PAGE_SIZE = 100
+
+
+def run(profile: str, directory: str):
+    rows = []
+    for batch_size in BATCH_SIZES:
+        path = os.path.join(directory, f"{profile}-{batch_size}.db")
+        database = create_database(path, profile=profile)
+        table = database[BENCHMARK_TABLE]
+        records = list(generate_records(ROWS))
+        insert = lambda: table.insert_batch(records, batch_size=batch_size)
+        insert_time = measure(insert)
+
+        condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+        pages = [random.randint(1, ROWS // PAGE_SIZE) for _ in range(QUERIES)]
+        query = lambda: [
+            table.query(condition=condition, page_size=PAGE_SIZE, page_index=page)
+            for page in pages
+        ]
+        query_time = measure(query)
+        scan_time = measure(lambda: table.query(condition=condition))
+        rows.append(
+            [
+                profile,
+                batch_size,
+                f"{ROWS / insert_time:,.0f}",
+                f"{query_time / QUERIES * 1e3:.2f}",
+                f"{scan_time * 1e3:.0f}",
+            ]
+        )
+        database.close()
+    return rows
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PERFORMANCE_PROFILES:
+            rows.extend(run(profile, directory))
+    print(f"{ROWS} rows, {QUERIES} pages of {PAGE_SIZE} rows, file database")
+    headers = ["profile", "batch size", "insert (rows/s)", "page (ms/query)"]
+    print_table(headers + ["full scan (ms)"], rows)
+
+
+if __name__ == "__main__":
+    main()
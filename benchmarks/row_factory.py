@@ -0,0 +1,70 @@
+"""Fetch all rows of a big table under each row factory.
+
+The legacy factories rebuild the columns name for every row (and a new namedtuple class for every row),
+the cached ones build the layout once per result set.
+"""
+
+import sqlite3
+import sys
+from collections import namedtuple
+
+from cmdapp.database.helper import RowFactory
+
+from .helper import (
+    BENCHMARK_TABLE,
+    create_database,
+    generate_records,
+    measure,
+    print_table,
+)
+
+ROWS = 1_000_000
+# creating a class per row is too slow to run on all rows
+LEGACY_NAMEDTUPLE_ROWS = 10_000
+
+
+def legacy_dict_factory(cursor: sqlite3.Cursor, row):
+    fields = [column[0] for column in cursor.description]
+    return {key: value for key, value in zip(fields, row)}
+
+
+def legacy_namedtuple_factory(cursor: sqlite3.Cursor, row):
+    fields = [column[0] for column in cursor.description]
+    cls = namedtuple("Row", fields)
+    return cls._make(row)
+
+
+FACTORIES = {
+    "dict (legacy)": legacy_dict_factory,
+    "namedtuple (legacy)": legacy_namedtuple_factory,
+    "dict": RowFactory.dict_factory,
+    "namedtuple": RowFactory.namedtuple_factory,
+    "record": RowFactory.record_factory,
+    "sqlite3.Row": sqlite3.Row,
+    "tuple": RowFactory.tuple_factory,
+}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    database = create_database()
+    database[BENCHMARK_TABLE].insert_batch(
+        generate_records(rows), batch_size=10_000, commit_rows=0, multi_values=True
+    )
+    conn = database.conn.conn
+
+    results = []
+    for name, factory in FACTORIES.items():
+        limit = LEGACY_NAMEDTUPLE_ROWS if "namedtuple (legacy)" == name else rows
+        conn.row_factory = factory
+        sql = f"SELECT * FROM {BENCHMARK_TABLE} LIMIT {limit}"
+        elapsed = measure(lambda: conn.execute(sql).fetchall())
+        per_row = f"{elapsed / limit * 1e9:,.0f}"
+        results.append([name, limit, per_row, f"{limit / elapsed:,.0f}"])
+    print(f"Fetch all rows ({len(RowFactory.layouts)} cached layouts at the end)")
+    print_table(["factory", "rows", "ns/row", "rows/s"], results)
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare inlined literals against bound parameters on repeated `get`/`list` queries.
+
+Inlined literals make every call a new SQL string, so the sqlite3 statement cache never hits and every call is re-parsed.
+Both modes build the same statements with `SQLBuilder` and run them through `Database.execute`, only the binding differs.
+"""
+
+import random
+
+from cmdapp.database import SQLBuilder, SQLCondition, SQLOperators
+from cmdapp.database.helper import CursorHelper
+from cmdapp.parser import COLUMN_DELETE
+
+from .helper import (
+    BENCHMARK_TABLE,
+    StatementTracker,
+    create_database,
+    generate_records,
+    measure,
+    print_table,
+)
+
+ROWS = 50_000
+CALLS = 20_000
+PAGE_SIZE = 20
+CACHED_STATEMENTS = 128
+
+
+def run(
+    database,
+    tracker: StatementTracker,
+    ids: list[int],
+    pages: list[int],
+    compiled: bool,
+):
+    """Run the same `get` and `list` statements, with their values inlined or bound, through the same execution path"""
+    table = database[BENCHMARK_TABLE]
+    columns = table.selected_columns()
+    deleted = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+
+    def execute(statement):
+        sql, data = statement if compiled else (statement, None)
+        tracker.track(sql)
+        return database.execute(sql, data)
+
+    def get():
+        for item_id in ids:
+            statement = SQLBuilder.select(
+                table.name,
+                columns=columns,
+                condition=SQLCondition.with_id(item_id),
+                compiled=compiled,
+            )
+            CursorHelper.as_object(execute(statement))
+
+    def list_():
+        for page in pages:
+            statement = SQLBuilder.select(
+                table.name,
+                columns=columns,
+                condition=deleted,
+                limit=PAGE_SIZE,
+                offset=PAGE_SIZE * (page - 1),
+                compiled=compiled,
+            )
+            CursorHelper.as_objects(execute(statement))
+
+    return measure(get), measure(list_)
+
+
+def main():
+    database = create_database(cached_statements=CACHED_STATEMENTS)
+    database[BENCHMARK_TABLE].insert_batch(list(generate_records(ROWS)), batch_size=1000)
+
+    ids = [random.randint(1, ROWS) for _ in range(CALLS)]
+    pages = [random.randint(1, 50) for _ in range(CALLS // 10)]
+
+    rows = []
+    for mode, compiled in [("inline", False), ("compiled", True)]:
+        tracker = StatementTracker(CACHED_STATEMENTS)
+        get_time, list_time = run(database, tracker, ids, pages, compiled)
+        rows.append(
+            [
+                mode,
+                f"{tracker.hit_rate:.1%}",
+                f"{get_time / len(ids) * 1e6:.1f}",
+                f"{list_time / len(pages) * 1e6:.1f}",
+            ]
+        )
+    print(
+        f"{ROWS} rows, {len(ids)} `get` and {len(pages)} `list` calls, cached_statements = {CACHED_STATEMENTS}"
+    )
+    print_table(["mode", "cache hit rate", "get (us/call)", "list (us/call)"], rows)
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
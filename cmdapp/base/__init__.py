@@ -1,3 +1,4 @@
 from .app import BaseApp
 from .prototype import BasePrototype
 from .alias import Alias
+from .names import NameIndex
@@ -1,5 +1,13 @@
-from ..database import Database
-from ..parser import COLUMN_ID
+from datetime import datetime
+from collections import OrderedDict
+
+from ..database import Database, SQLCondition, SQLOperators
+from ..parser import COLUMN_ID, COLUMN_UPDATE, TableMeta
+from ..types import DTypes
+from .names import NameIndex
+
+# cached (lazy mode) for the values without record, so they are not queried again
+_NOT_FOUND = object()
 
 
 class Alias:
@@ -9,6 +17,8 @@ class Alias:
     - If you just need to resolve once or twice, better to lookup directly with Database query using `Alias.resolve_directly`
     - If not, you can save this Class instance into App Class and reference it in prototype methods
     - If you want the alias keep updates in realtime, with new data, you should initialize it directly inside prototype methods
+    - If the tables are large, use `lazy` mode: values are resolved on demand and kept in a bounded cache, which drops the values of the changed tables
+    - Names can be completed by prefix (`complete`) and resolved with typos (`resolve` with `fuzzy`) by the name index of each scope, see `index`
     """
 
     def __init__(
@@ -18,6 +28,8 @@ class Alias:
         *,
         key_name: str = "name",
         full_record: bool = False,
+        lazy: bool = False,
+        max_size: int = 10_000,
     ):
         """Create an alias dictionary and cache the query to further lookup. If you want to just lookup once or twice, better to use static method `Alias.resolve_directly`
 
@@ -26,6 +38,8 @@ class Alias:
             scope (list[str  |  tuple[str]]): Tables' names to match the aliases, use a list of tuple like `(table_a, column_b)` to override the `column_name` for this table
             key_name (str, optional): Column name to match the `values`. Defaults to "name".
             full_record (bool, optional): True if want to return full record instead of just record ID. Defaults to False.
+            lazy (bool, optional): True to resolve the values on demand (the missing values of each lookup in one query) instead of loading all records up front. The resolved values are dropped when their tables are written (through this database or by another connection). Defaults to False.
+            max_size (int, optional): [Lazy] Maximum number of cached values, the least recently used are dropped over it. Defaults to 10_000.
         """
         aliases = {}
         key_struct = []
@@ -35,30 +49,187 @@ class Alias:
             elif isinstance(sc, str):
                 key_struct.append((sc, key_name))
 
+        self.database = database
+        self.key_names = dict(key_struct)
+        self.full_record = full_record
+        self.lazy = lazy
+        self.max_size = max_size
+        # scope -> name index and the state of its table when it was updated, see `index`
+        self.indexes: dict[str, dict] = {}
+        if lazy:
+            self.aliases: OrderedDict[tuple[str, str], object] = OrderedDict()
+            self.folded_scopes = set()
+            # writes of each table when its values were cached, see `sync`
+            self.versions: dict[str, int] = {}
+            self.data_version = None
+            return
+
         # Get all records and cache them to alias object
+        folded_scopes = set()
         for table_name, key_name in key_struct:
-            all_records = database[table_name].query(
+            table = database[table_name]
+            all_records = table.query(
                 columns=None if full_record else [COLUMN_ID, key_name]
             )
+            # values of a folded column are also resolved by their folded values (accent-insensitive)
+            folded = key_name in table.table_meta.folded_columns
+            if folded:
+                folded_scopes.add(table_name)
             for record in all_records:
-                aliases[(table_name, record[key_name])] = (
-                    record if full_record else record[COLUMN_ID]
-                )
+                value = record if full_record else record[COLUMN_ID]
+                aliases[(table_name, record[key_name])] = value
+                if folded:
+                    aliases.setdefault(
+                        (table_name, TableMeta.fold(record[key_name])), value
+                    )
         self.aliases = aliases
+        self.folded_scopes = folded_scopes
+
+    def lookup_key(self, key: tuple[str, str]):
+        if key in self.aliases or key[0] not in self.folded_scopes:
+            return key
+        return (key[0], TableMeta.fold(key[1]))
 
     def __contains__(self, key: tuple[str, str]):
-        return key in self.aliases
+        if self.lazy:
+            return self.fetch(key[0], [key[1]])[key[1]] is not None
+        return self.lookup_key(key) in self.aliases
 
     def __getitem__(self, key: tuple[str, str]):
-        return self.aliases.get(key, None)
+        if self.lazy:
+            return self.fetch(key[0], [key[1]])[key[1]]
+        return self.aliases.get(self.lookup_key(key), None)
+
+    def sync(self):
+        """[Lazy] Drop the cached values of the tables changed since they were cached"""
+        data_version = self.database.conn.data_version()
+        if data_version != self.data_version:
+            # committed by another connection, any table may be changed
+            self.aliases.clear()
+            self.versions.clear()
+            self.data_version = data_version
+        for scope, writes in list(self.versions.items()):
+            if self.database[scope].writes == writes:
+                continue
+            for key in [key for key in self.aliases if key[0] == scope]:
+                del self.aliases[key]
+            del self.versions[scope]
+
+    def fetch(self, scope: str, values: list[str]) -> dict:
+        """[Lazy] Resolve values from the cache, the missing ones are resolved together in one query and cached
+
+        Args:
+            scope (str): Table to lookup
+            values (list[str]): Values to resolve
+
+        Returns:
+            dict: Map each value to matched data (record or ID), None if not found
+        """
+        self.sync()
+        misses = [v for v in dict.fromkeys(values) if (scope, v) not in self.aliases]
+        if misses and scope not in self.key_names:
+            return {value: None for value in values}
+        if misses:
+            table = self.database[scope]
+            self.versions.setdefault(scope, table.writes)
+            found = table.translate(
+                self.key_names[scope], *misses, full_record=self.full_record
+            )
+            for value in misses:
+                matches = found.get(value, None)
+                self.aliases[(scope, value)] = matches[0] if matches else _NOT_FOUND
+
+        result = {}
+        for value in values:
+            self.aliases.move_to_end((scope, value))
+            data = self.aliases[(scope, value)]
+            result[value] = None if data is _NOT_FOUND else data
+        while len(self.aliases) > self.max_size:
+            self.aliases.popitem(last=False)
+        return result
+
+    def index(self, scope: str) -> NameIndex:
+        """Get the name index of a scope. It is built on first use, then updated with the records created or updated (by `updated_at`) since the last use.
+        It is rebuilt if the records can not be tracked: the table has no `updated_at` column or some records were deleted permanently
+
+        Args:
+            scope (str): Table of the names
 
-    def resolve(self, scope: str, values: list[str]):
+        Returns:
+            NameIndex: Index of the names, map to the record IDs
+        """
+        table = self.database[scope]
+        key_name = self.key_names[scope]
+        state = self.indexes.get(scope, None)
+        stamp = (table.writes, self.database.conn.data_version())
+        if state is not None and state["stamp"] == stamp:
+            return state["index"]
+
+        synced_at = DTypes.cast_to_sqlite(datetime.now(), "datetime")
+        columns = [COLUMN_ID, key_name]
+        if state is None or COLUMN_UPDATE not in table:
+            records = table.iter_query(columns)
+            index = NameIndex()
+        else:
+            index = state["index"]
+            condition = SQLCondition(
+                COLUMN_ID, SQLOperators.GREATER_THAN, state["max_id"]
+            ).OR(COLUMN_UPDATE, SQLOperators.GREATER_THAN_OR_EQUAL, state["synced_at"])
+            records = table.iter_query(columns, condition)
+        max_id = state["max_id"] if state else 0
+        for record in records:
+            index.add(record[COLUMN_ID], record[key_name])
+            max_id = max(max_id, record[COLUMN_ID])
+        named = SQLCondition(key_name, SQLOperators.IS_NOT_NULL)
+        if state is not None and len(index) != (table.count(named) or 0):
+            # some records were deleted permanently
+            self.indexes.pop(scope)
+            return self.index(scope)
+        self.indexes[scope] = dict(
+            index=index, stamp=stamp, synced_at=synced_at, max_id=max_id
+        )
+        return index
+
+    def complete(self, scope: str, text: str, limit: int = 20) -> list[str]:
+        """Get the names of a scope starting with `text` (accent-insensitive), for tab completion"""
+        if scope not in self.key_names:
+            return []
+        return self.index(scope).prefix(text, limit)
+
+    def match(self, scope: str, text: str, threshold: float = 0.5):
+        """Get the data (record or ID) of the name most similar to `text`, None if no name is similar enough"""
+        if scope not in self.key_names:
+            return None
+        index = self.index(scope)
+        matches = index.fuzzy(text, limit=1, threshold=threshold)
+        if not matches:
+            return None
+        item_id = index.get(matches[0][0])[0]
+        return self.database[scope].get(item_id) if self.full_record else item_id
+
+    def resolve(self, scope: str, values: list[str], fuzzy: bool = False):
+        """Resolve names (or IDs) of a scope
+
+        Args:
+            scope (str): Table to lookup
+            values (list[str]): Names to resolve. Digits are taken as IDs
+            fuzzy (bool, optional): True to resolve a name without exact match by the most similar name, see `match`. Defaults to False.
+
+        Raises:
+            ValueError: A name is not found
+
+        Returns:
+            Matched data (record or ID), a list if `values` is a list
+        """
         if not values:
             return None
         as_array = True
         if not isinstance(values, (tuple, list)):
             values = [values]
             as_array = False
+        if self.lazy:
+            names = [v for v in values if v and not (isinstance(v, int) or v.isdigit())]
+            resolved = self.fetch(scope, names) if names else {}
         result = []
         for item in values:
             if not item:
@@ -66,10 +237,15 @@ class Alias:
             elif isinstance(item, int) or item.isdigit():
                 result.append(int(item))
             else:
-                key = (scope, item)
-                if key not in self.aliases:
+                if self.lazy:
+                    data = resolved[item]
+                else:
+                    data = self.aliases.get(self.lookup_key((scope, item)), None)
+                if data is None and fuzzy:
+                    data = self.match(scope, item)
+                if data is None:
                     raise ValueError(f"NOT FOUND alias `{item}` in scope `{scope}`")
-                result.append(self.aliases[key])
+                result.append(data)
         return result if as_array else (result[0] if result else None)
 
     def resolve_directly(
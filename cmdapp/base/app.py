@@ -1,5 +1,7 @@
-from ..database import Database
+from ..database import Database, PERFORMANCE_PROFILES
 from ..core import CmdApp
+from ..parser import COLUMN_ID
+from .alias import Alias
 
 
 class BaseApp(CmdApp):
@@ -11,6 +13,30 @@ class BaseApp(CmdApp):
     ):
         super().__init__(*args, **kwargs)
         self.database = database
+        self.alias = None
+        if database is not None:
+            # resolve and complete the related records by their displayed names
+            scopes = {
+                relation["table"]: relation["display"]
+                for table in database.tables.values()
+                for relation in table.table_meta.relations.values()
+                if relation["column"] == COLUMN_ID
+            }
+            self.alias = Alias(database, list(scopes.items()), lazy=True)
+            self.add_setting(
+                "db_profile",
+                "str",
+                database.profile_name,
+                "Performance profile (PRAGMAs) of the database",
+                choices=list(PERFORMANCE_PROFILES),
+            )
+            slowlog = database.conn.slowlog
+            self.add_setting(
+                "slowlog",
+                "float",
+                slowlog.threshold if slowlog is not None else -1,
+                "Record statements slower than this (milliseconds), negative to disable",
+            )
         # self.add_setting("verbose", bool, False, "Show errors with detail")
         self.debug = True
 
@@ -20,6 +46,12 @@ class BaseApp(CmdApp):
     #             self.do_set("debug true")
     #             self.print_database_errors()
 
+    def on_change_settings(self, param_name, old, new):
+        if param_name == "db_profile":
+            self.database.set_profile(new)
+        elif param_name == "slowlog":
+            self.database.set_slowlog(new)
+
     def terminate(self, status_code=0):
         self.database.close()
         return super().terminate(status_code)
@@ -0,0 +1,162 @@
+import bisect
+import heapq
+from collections import Counter
+from itertools import chain
+from typing import Iterable
+
+from ..parser import TableMeta
+
+
+class NameIndex:
+    """In-memory index of record names, to complete a prefix (tab completion) and to match a text with typos (fuzzy)
+    - Names are matched by their folded values (see `TableMeta.fold`), so the matching is accent-insensitive and case-insensitive
+    - Prefix: binary search on the sorted folded names
+    - Fuzzy: names sharing most n-grams (substrings of `n` characters) with the text, scored by their Dice coefficient
+
+    Names are added and removed one by one, so the index is kept up to date without rebuilding it.
+    The n-grams are indexed on the first fuzzy matching, so completion only does not pay for them.
+    """
+
+    def __init__(self, items: Iterable[tuple[object, str]] = (), n: int = 3):
+        """Create the index
+
+        Args:
+            items (Iterable[tuple[object, str]], optional): Values (like the record IDs) and their names. Defaults to ().
+            n (int, optional): Length of the n-grams for fuzzy matching. Defaults to 3.
+        """
+        self.n = n
+        # value -> name
+        self.names: dict[object, str] = {}
+        # name -> values, some records may have same name
+        self.values: dict[str, list] = {}
+        # folded name -> names, in sorted list of the folded names
+        self.folded: dict[str, set[str]] = {}
+        self.sorted: list[str] = []
+        # n-gram -> folded names containing it, None until the first fuzzy matching
+        self.grams: dict[str, set[str]] = None
+        for value, name in items:
+            self.add(value, name, sort=False)
+        self.sorted.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, value):
+        return value in self.names
+
+    def ngrams(self, folded: str) -> set[str]:
+        padded = f" {folded} "
+        if len(padded) <= self.n:
+            return {padded}
+        return {padded[i : i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def add(self, value, name: str, *, sort: bool = True):
+        """Add (or rename) the name of a value
+
+        Args:
+            sort (bool, optional): False to skip sorting the folded names, they must be sorted before the next prefix lookup. Defaults to True.
+        """
+        if value in self.names:
+            if self.names[value] == name:
+                return
+            self.remove(value)
+        if name is None:
+            return
+        name = str(name)
+        self.names[value] = name
+        self.values.setdefault(name, []).append(value)
+        folded = TableMeta.fold(name)
+        names = self.folded.setdefault(folded, set())
+        if not names:
+            if sort:
+                bisect.insort(self.sorted, folded)
+            else:
+                self.sorted.append(folded)
+            if self.grams is not None:
+                for gram in self.ngrams(folded):
+                    self.grams.setdefault(gram, set()).add(folded)
+        names.add(name)
+
+    def remove(self, value):
+        """Remove the name of a value, no effect if not indexed"""
+        name = self.names.pop(value, None)
+        if name is None:
+            return
+        values = self.values[name]
+        values.remove(value)
+        if values:
+            return
+        del self.values[name]
+        folded = TableMeta.fold(name)
+        names = self.folded[folded]
+        names.discard(name)
+        if names:
+            return
+        del self.folded[folded]
+        index = bisect.bisect_left(self.sorted, folded)
+        if index < len(self.sorted) and self.sorted[index] == folded:
+            del self.sorted[index]
+        for gram in self.ngrams(folded) if self.grams is not None else []:
+            grams = self.grams.get(gram, set())
+            grams.discard(folded)
+            if not grams:
+                self.grams.pop(gram, None)
+
+    def get(self, name: str) -> list:
+        """Get the values of a name. If no exact match, match by the folded name"""
+        if name in self.values:
+            return list(self.values[name])
+        names = self.folded.get(TableMeta.fold(name), ())
+        return [value for name in sorted(names) for value in self.values[name]]
+
+    def prefix(self, text: str, limit: int = 20) -> list[str]:
+        """Get the names starting with `text` (accent-insensitive), in order of their folded names"""
+        folded = TableMeta.fold(text or "")
+        result = []
+        index = bisect.bisect_left(self.sorted, folded)
+        while index < len(self.sorted) and len(result) < limit:
+            key = self.sorted[index]
+            if not key.startswith(folded):
+                break
+            result.extend(sorted(self.folded[key]))
+            index += 1
+        return result[:limit]
+
+    def fuzzy(
+        self, text: str, limit: int = 5, threshold: float = 0.3
+    ) -> list[tuple[str, float]]:
+        """Get the names most similar to `text`
+
+        Args:
+            text (str): Text to match, may have typos
+            limit (int, optional): Maximum number of names. Defaults to 5.
+            threshold (float, optional): Minimum score (0 to 1) of the names. Defaults to 0.3.
+
+        Returns:
+            list[tuple[str, float]]: Names and their scores, from the most similar
+        """
+        if self.grams is None:
+            self.grams = {}
+            for folded in self.folded:
+                for gram in self.ngrams(folded):
+                    self.grams.setdefault(gram, set()).add(folded)
+        text = TableMeta.fold(text or "")
+        grams = self.ngrams(text)
+        shared = Counter()
+        shared.update(chain.from_iterable(self.grams.get(g, ()) for g in grams))
+        # number of n-grams by the length, not to split each candidate again
+        size = lambda folded: max(len(folded) + 3 - self.n, 1)
+        # a name needs this many shared n-grams to reach the threshold, even if it is the shortest
+        least = threshold * (size(text) + 1) / 2
+        scores = (
+            (2 * count / (size(text) + size(folded)), folded)
+            for folded, count in shared.items()
+            if count >= least
+        )
+        best = heapq.nlargest(limit, (s for s in scores if s[0] >= threshold))
+        best.sort(key=lambda s: (-s[0], s[1]))
+        return [
+            (name, round(min(score, 1.0), 4))
+            for score, folded in best
+            for name in sorted(self.folded[folded])
+        ][:limit]
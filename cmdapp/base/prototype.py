@@ -1,5 +1,11 @@
 from ..parser import COLUMN_ID, COLUMN_CREATE, COLUMN_UPDATE, COLUMN_DELETE
-from ..database import Database, Table, SQLCondition, SQLOperators
+from ..database import (
+    Database,
+    Table,
+    SQLCondition,
+    SQLOperators,
+    SQLOrderByDirection,
+)
 from ..core import Prototype, as_command, ContextStore, Response
 from ..utils import Platform, Hash, Text
 from .app import BaseApp
@@ -38,8 +44,31 @@ class BasePrototype(Prototype):
 
     def contexted_arguments_creator(self, context: str, command: str) -> dict | None:
         table: Table = self.context_store.get_context_data(context)
-        if table:
-            return self.get_table_arguments(command, table.table_meta.columns)
+        if not table:
+            return None
+        arguments = self.get_table_arguments(command, table.table_meta.columns)
+        # related records are also given by their names, see `resolve_relations`
+        for column, relation in table.table_meta.relations.items():
+            if column not in arguments or relation["column"] != COLUMN_ID:
+                continue
+            comment = arguments[column].get("comment", None) or ""
+            arguments[column] = arguments[column] | {
+                "dtype": "str",
+                "comment": f"{comment} (or its {relation['display']})".strip(),
+                "completer": BasePrototype.name_completer(relation["table"]),
+            }
+        return arguments
+
+    @staticmethod
+    def name_completer(scope: str):
+        """Create a tab completion function of the names in a table, see `Alias.complete`"""
+
+        def completer(app: BaseApp, text: str, line: str, begidx: int, endidx: int):
+            if getattr(app, "alias", None) is None:
+                return []
+            return app.alias.complete(scope, text)
+
+        return completer
 
     def contexted_value_parser(
         self, context: str, value: str, command: str = None
@@ -63,11 +92,59 @@ class BasePrototype(Prototype):
                 argument=error["data"],
             )
             response.send("-" * 80)
+        if errors.dropped:
+            counts = ", ".join(
+                f"{name} x{count}" for name, count in errors.summary().items()
+            )
+            response.send(
+                f"{errors.total} errors in total, {errors.dropped} older errors are not shown: {counts}"
+            )
+            response.send("-" * 80)
         return response
 
+    def resolve_relations(app: BaseApp, table: Table, attributes: dict):
+        """Replace the names given to the relation columns (like `--team "Team A"`) by the IDs of the related records
+
+        Returns:
+            Response | None: The error response if a name is not found
+        """
+        alias = getattr(app, "alias", None)
+        for column, relation in table.table_meta.relations.items():
+            value = attributes.get(column, None)
+            if alias is None or not isinstance(value, str):
+                continue
+            try:
+                attributes[column] = alias.resolve(relation["table"], value)
+            except ValueError as error:
+                index = alias.index(relation["table"])
+                # same name except accents and case
+                ids = index.get(value)
+                if len(ids) == 1:
+                    attributes[column] = ids[0]
+                    continue
+                matches = index.fuzzy(value, limit=1)
+                return (
+                    Response(app)
+                    .on("error")
+                    .message(
+                        "argument",
+                        style="error",
+                        argument=column,
+                        status="invalid",
+                        reason=error.args[0],
+                        recommend=(
+                            f"Did you mean `{matches[0][0]}`?" if matches else None
+                        ),
+                    )
+                )
+        return None
+
     @as_command(description="Create new record", dependencies="*")
     def do_create(app, args, *, table: Table):
         attributes = vars(args)
+        error = BasePrototype.resolve_relations(app, table, attributes)
+        if error is not None:
+            return error
         new_id = table.insert(attributes)
         message_kwargs = dict(action="CREATE", what=table.human_name())
         if new_id > 0:
@@ -103,6 +180,9 @@ class BasePrototype(Prototype):
         for key, value in vars(args).items():
             if key in table and value is not None:
                 attributes[key] = value
+        error = BasePrototype.resolve_relations(app, table, attributes)
+        if error is not None:
+            return error
 
         if len(attributes) == 1:  # only id
             return (
@@ -113,7 +193,10 @@ class BasePrototype(Prototype):
                 )
             )
         item_id = attributes[COLUMN_ID]
-        existed_ids = table.which_exists(item_id, with_deleted=False)
+        # the record cannot be deleted by another writer between the check and the update
+        with app.database.transaction():
+            existed_ids = table.which_exists(item_id, with_deleted=False)
+            success = table.update(attributes) if existed_ids else False
         if not existed_ids:
             return (
                 Response(app)
@@ -127,7 +210,6 @@ class BasePrototype(Prototype):
                     items=item_id,
                 )
             )
-        success = table.update(attributes)
         message_kwargs = dict(
             action="UPDATE",
             what=table.human_name(success),
@@ -161,7 +243,11 @@ class BasePrototype(Prototype):
     def do_delete(app, args, *, table: Table):
         ids, permanent = Hash.get(vars(args), id=[], permanent=False)
         # search on deleted items if permanent is True
-        existed_ids = table.which_exists(*ids, with_deleted=permanent)
+        with app.database.transaction():
+            existed_ids = table.which_exists(*ids, with_deleted=permanent)
+            success = (
+                table.delete_by_id(*ids, permanent=permanent) if existed_ids else 0
+            )
         count = len(existed_ids)
         response = Response(app).message(
             "found",
@@ -173,7 +259,6 @@ class BasePrototype(Prototype):
         )
         if not existed_ids:
             return response
-        success = table.delete_by_id(*ids, permanent=permanent)
         message_kwargs = dict(
             action="DELETE",
             what=table.human_name(success),
@@ -201,41 +286,97 @@ class BasePrototype(Prototype):
             "widths": "w (array[int]): set width scale to the column, in display order. the column with width=2 is twice wider than column with width=1",
             "size": "s (int = 20): number of records per each page",
             "page": "p (int = 1): page index (based 1)",
+            "after": "(str): token printed at the end of the previous page, to list the page after it. faster than [--page] on far pages",
             "columns": f'* (array[str] = ["^meta", "{COLUMN_ID}"]): columns to extract data',
             "all": "a (bool = 0): set to include deleted records",
+            "filter": "(json): only list records with these values, like `name=abc`. accent-insensitive on folded columns",
+            "expand": "e (bool = 0): set to show the related values, like the team name of a person",
         },
         dependencies="*",
     )
     def do_list(app, args, *, table: Table):
-        column_filters, format, widths, page_size, page_index, with_deleted = Hash.get(
+        (
+            column_filters,
+            format,
+            widths,
+            page_size,
+            page_index,
+            after,
+            with_deleted,
+            filters,
+            expand,
+        ) = Hash.get(
             vars(args),
             columns=["^meta", COLUMN_ID],
             format=0,
             widths=[],
             size=None,
             page=1,
+            after=None,
             all=False,
+            filter=None,
+            expand=False,
         )
         if page_size < 0:
             page_size = None
         if page_index <= 0:
             page_index = 1
+        if isinstance(column_filters, str):
+            column_filters = [column_filters]
 
         if with_deleted or COLUMN_DELETE not in table:
             condition = None
         else:
             condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+        if filters:
+            try:
+                condition = table.match_condition(dict(filters), condition)
+            except ValueError as error:
+                return Response(app).message(
+                    "argument",
+                    style="error",
+                    argument="filter",
+                    status="invalid",
+                    reason=error.args[0],
+                )
 
-        all_items = table.query(
-            columns=column_filters,
-            condition=condition,
-            page_size=page_size,
-            page_index=page_index,
-        )
-        count = len(all_items)
+        order_by = [(COLUMN_ID, SQLOrderByDirection.ASC)]
+        next_token = None
+        if page_size:
+            # a page is small enough to load at once. the ID is required for the next page token
+            all_items = table.query(
+                columns=column_filters + [COLUMN_ID],
+                condition=condition,
+                order_by=order_by,
+                page_size=page_size,
+                page_index=page_index,
+                after=after,
+                expand=expand,
+            )
+            count = len(all_items)
+            if count == page_size:
+                next_token = table.next_page_token(all_items[-1], order_by)
+            requested = table.table_meta.filter_columns(column_filters)
+            if requested and COLUMN_ID not in requested:
+                all_items = [
+                    {k: v for k, v in item.items() if k != COLUMN_ID}
+                    for item in all_items
+                ]
+        else:
+            count = table.count(condition) or 0
+            all_items = table.iter_query(
+                columns=column_filters,
+                condition=condition,
+                order_by=order_by,
+                expand=expand,
+            )
         if count == 0:
-            return Response(app).message(
-                "found", style="info", negative=True, what=table.human_name(count)
+            return (
+                Response(app)
+                .message(
+                    "found", style="info", negative=True, what=table.human_name(count)
+                )
+                .concat(BasePrototype.print_database_errors(app))
             )
 
         response = (
@@ -250,13 +391,124 @@ class BasePrototype(Prototype):
             .table(data=all_items, style=format, widths=widths)
         )
         if page_size:
+            page = f"AFTER {after}" if after is not None else page_index
             response.message(
                 None,
-                f"PAGE {page_index} - {table.human_name(page_size).upper()}_PER_PAGE: {page_size}",
+                f"PAGE {page} - {table.human_name(page_size).upper()}_PER_PAGE: {page_size}",
                 style="info",
             )
+            if next_token is not None:
+                response.message(None, f"NEXT PAGE: --after {next_token}", style="info")
         return response
 
+    @as_command(
+        description="Search records by words in their text columns, the best matched first",
+        epilog="Words are matched as is. Use [--raw] to write a FTS5 query like `word*` (prefix), `a OR b`, `name: word`",
+        arguments={
+            "words": "* (array[str]): words to search",
+            "format": "f (int: [0, 1, 2] = 1): table style: [0: no bordered], [1: bordered], [2: row alternating]",
+            "widths": "w (array[int]): set width scale to the column, in display order",
+            "limit": "n (int = 20): maximum number of records",
+            "raw": "(bool = 0): set to use the words as a FTS5 query",
+            "all": "a (bool = 0): set to include deleted records",
+        },
+        dependencies="*",
+    )
+    def do_search(app, args, *, table: Table):
+        words, format, widths, limit, raw, with_deleted = Hash.get(
+            vars(args),
+            words=[],
+            format=1,
+            widths=[],
+            limit=20,
+            raw=False,
+            all=False,
+        )
+        query = " ".join(words)
+        items = table.search(
+            query,
+            limit=limit if limit > 0 else None,
+            columns=["^meta", COLUMN_ID],
+            with_deleted=with_deleted,
+            raw=raw,
+        )
+        count = len(items)
+        if count == 0:
+            return (
+                Response(app)
+                .message(
+                    "found",
+                    style="info",
+                    negative=True,
+                    what=table.human_name(count),
+                    field=f"[{query}]",
+                )
+                .concat(BasePrototype.print_database_errors(app))
+            )
+        return (
+            Response(app)
+            .message(
+                "found",
+                style="info",
+                count=count,
+                what=table.human_name(count),
+                field=f"[{query}]",
+            )
+            .table(data=items, style=format, widths=widths)
+        )
+
+    @as_command(
+        description="Group records and print metrics of each group",
+        epilog="Metrics are computed by the database, like `n=count avg_age=avg(age) teams=count_distinct(team_id)`",
+        arguments={
+            "by": "* (array[str]): columns to group records by. empty for one group of all records",
+            "metrics": "m (json): metrics to compute on each group, as name=function or name=function(column). defaults to the number of records",
+            "format": "f (int: [0, 1, 2] = 1): table style: [0: no bordered], [1: bordered], [2: row alternating]",
+            "widths": "w (array[int]): set width scale to the column, in display order",
+            "limit": "n (int): maximum number of groups",
+            "all": "a (bool = 0): set to include deleted records",
+        },
+        dependencies="*",
+    )
+    def do_stats(app, args, *, table: Table):
+        group_by, metrics, format, widths, limit, with_deleted = Hash.get(
+            vars(args),
+            by=[],
+            metrics=None,
+            format=1,
+            widths=[],
+            limit=None,
+            all=False,
+        )
+        metrics = {
+            name: (
+                tuple(p.strip() for p in metric.rstrip(")").split("(", 1))
+                if "(" in metric
+                else metric
+            )
+            for name, metric in dict(metrics or []).items()
+        }
+        if with_deleted or COLUMN_DELETE not in table:
+            condition = None
+        else:
+            condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+        groups = table.aggregate(
+            group_by, metrics or None, condition=condition, limit=limit
+        )
+        count = len(groups)
+        what = f"{'group' if count == 1 else 'groups'} of {table.human_name(2)}"
+        if not groups:
+            return (
+                Response(app)
+                .message("found", style="info", negative=True, what=what)
+                .concat(BasePrototype.print_database_errors(app))
+            )
+        return (
+            Response(app)
+            .message("found", style="info", count=count, what=what)
+            .table(data=groups, style=format, widths=widths)
+        )
+
     @as_command(
         description="Get all records and save them in one or many file format",
         epilog="You can use redirection > (write) or >> (append) to save result to file.",
@@ -268,11 +520,14 @@ class BasePrototype(Prototype):
             "headers": "(bool = 1): [CSV] set to not render headers",
             "indent": "(int): [JSON, YAML] number of whitespaces for indentation at each level",
             "sort": "(bool = 0): [JSON, YAML] set to sort keys on same level",
+            "expand": "e (bool = 0): set to export the related values, like the team name of a person",
         },
         dependencies="*",
     )
     def do_export(app: BaseApp, args, *, table: Table):
-        format, column_filters = Hash.get(vars(args), format=False, columns=[])
+        format, column_filters, expand = Hash.get(
+            vars(args), format=False, columns=[], expand=False
+        )
         if not hasattr(app.response_formatter, format):
             return (
                 Response(app)
@@ -286,8 +541,7 @@ class BasePrototype(Prototype):
                 )
             )
 
-        all_items = table.query(columns=column_filters)
-        count = len(all_items)
+        count = table.count() or 0
         if count == 0:
             return Response(app).message(
                 "found", style="info", negative=True, what=table.human_name(count)
@@ -297,7 +551,7 @@ class BasePrototype(Prototype):
             "found", style="info", count=count, what=table.human_name(count)
         )
         options = Hash.ignore(
-            vars(args), "format", "columns", rename={"sort": "sort_keys"}
+            vars(args), "format", "columns", "expand", rename={"sort": "sort_keys"}
         )
 
         path = options.get("path", None)
@@ -312,9 +566,15 @@ class BasePrototype(Prototype):
             )
             path = None
 
+        # records are streamed from the database into the writer
+        all_items = table.iter_query(columns=column_filters, expand=expand)
         if not path:
             options.pop("path")
-            return response.on("paged").__getattr__(format)(all_items, **options)
+            # written to the output record by record, not buffered for the pager
+            response.on("output").__getattr__(format)(
+                all_items, file=app.stdout, **options
+            )
+            return response.send("")
         else:
             return (
                 response.on("output")
@@ -327,3 +587,77 @@ class BasePrototype(Prototype):
                     result=f"Check the file at [{Platform.abs(path)}]",
                 )
             )
+
+    @as_command(
+        description="Count all records again and repair the maintained counts",
+        epilog="Only for tables declared with `counted`, their counts are kept by triggers",
+        dependencies="*",
+    )
+    def do_recount(app: BaseApp, args, *, table: Table):
+        message_kwargs = dict(action="RECOUNT", what=table.human_name(2))
+        if not table.table_meta.counted:
+            return Response(app).message(
+                "action",
+                style="warning",
+                reason="the counts are not maintained",
+                **message_kwargs,
+            )
+        counts = table.recount()
+        if counts is None:
+            return (
+                Response(app)
+                .on("error")
+                .message("action", style="error", **message_kwargs)
+                .concat(BasePrototype.print_database_errors(app))
+            )
+        return Response(app).message(
+            "action",
+            style="success",
+            result=f"{counts['alive']} available, {counts['total']} with deleted",
+            **message_kwargs,
+        )
+
+    @as_command(
+        description="Print the recent slow statements recorded by the slow query log",
+        epilog="Enable the log with `set slowlog <milliseconds>`, disable it with a negative value",
+        arguments={
+            "limit": "n (int = 20): number of recent statements to print",
+            "scans": "s (bool = 0): set to only print statements that scan a whole table",
+            "clear": "c (bool = 0): set to clear the recorded statements after printing",
+        },
+    )
+    def do_slowlog(app: BaseApp, args):
+        limit, full_scan_only, clear = Hash.get(
+            vars(args), limit=20, scans=False, clear=False
+        )
+        slowlog = app.database.conn.slowlog
+        if slowlog is None:
+            return Response(app).message(
+                None,
+                "Slow query log is disabled. Use `set slowlog <milliseconds>` to enable it",
+                style="warning",
+            )
+
+        records = slowlog.get_records(limit, full_scan_only=full_scan_only)
+        if clear:
+            slowlog.clear()
+        what = f"slow statements over {slowlog.threshold} ms"
+        if not records:
+            return Response(app).message(
+                "found", style="info", negative=True, what=what
+            )
+        rows = [
+            {
+                "time": record["time"],
+                "ms": record["duration"],
+                "sql": record["sql"],
+                "plan": "\n".join(record["plan"]),
+                "scan": "FULL SCAN" if record["full_scan"] else "",
+            }
+            for record in records
+        ]
+        return (
+            Response(app)
+            .message("found", style="info", count=len(records), what=what)
+            .table(data=rows, style=1, widths=[2, 1, 6, 3, 1])
+        )
@@ -27,7 +27,14 @@ class CmdApp(Cmd):
         elif app_name:
             self.prompt = Template("*C[{app_name} >> ]").format(app_name=app_name)
 
-    def add_setting(self, name: str, dtype: str, default_value, description: str):
+    def add_setting(
+        self,
+        name: str,
+        dtype: str,
+        default_value,
+        description: str,
+        choices: list = None,
+    ):
         if hasattr(self, name):
             raise ValueError(
                 f"the attribute [{name}] has been used on [{self.__class__}]",
@@ -37,7 +44,12 @@ class CmdApp(Cmd):
         setattr(self, name, converter(default_value))
         self.add_settable(
             Settable(
-                name, converter, description, self, onchange_cb=self.on_change_settings
+                name,
+                converter,
+                description,
+                self,
+                onchange_cb=self.on_change_settings,
+                choices=choices,
             )
         )
 
@@ -1,3 +1,4 @@
+from types import GeneratorType
 from typing import Callable
 
 from .app import CmdApp
@@ -22,6 +23,11 @@ class Response:
 
             def format(*args, **kwargs):
                 formatted_data = formatter(*args, **kwargs)
+                if isinstance(formatted_data, GeneratorType):
+                    # streamed output: send part by part without keeping them
+                    for part in formatted_data:
+                        self.send(part)
+                    return self
                 self.data.append(formatted_data)
                 return self.send(formatted_data) if formatted_data else self
 
@@ -2,4 +2,10 @@ from .constants import *
 from .condition import SQLCondition
 from .sql import SQLBuilder
 from .table import Table
+from .shard import ShardedTable
 from .database import Database
+from .slowlog import SlowQueryLog
+from .cache import QueryCache
+from .errors import ErrorStore
+from .columnar import ColumnSet
+from .aio import AsyncDatabase, AsyncTable
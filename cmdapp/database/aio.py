@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from .database import Database
+from .table import Table
+from .constants import DEFAULT_CHUNK_SIZE
+
+
+class AsyncTable:
+    """Awaitable facade of a `Table`: every method of the table is a coroutine function that runs the method on the executor of its `AsyncDatabase`.
+
+    Sanitization and error collection are done by the wrapped table, so `errors` holds the errors of the last finished operation.
+    """
+
+    def __init__(self, table: Table, database: "AsyncDatabase"):
+        self.table = table
+        self.database = database
+
+    def __getattr__(self, name):
+        attribute = getattr(self.table, name)
+        if not callable(attribute):
+            return attribute
+
+        async def method(*args, **kwargs):
+            return await self.database.run(attribute, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attribute.__doc__
+        return method
+
+    def __contains__(self, name):
+        return name in self.table
+
+    async def iter_query(self, *args, chunk_size: int = None, **kwargs):
+        """Same as `Table.iter_query`, as an async generator: records are fetched on the executor `chunk_size` at a time"""
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        records = await self.database.run(
+            self.table.iter_query, *args, chunk_size=chunk_size, **kwargs
+        )
+        while True:
+            chunk = await self.database.run(lambda: list(islice(records, chunk_size)))
+            if not chunk:
+                break
+            for record in chunk:
+                yield record
+
+
+class AsyncDatabase:
+    """Awaitable facade of a `Database`. Operations are queued and run one by one on a dedicated thread, so the event loop is never blocked by SQLite.
+
+    Use it as an async context manager, or call `close` to close the database and stop the thread.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="cmdapp-database"
+        )
+        self.tables = {
+            name: AsyncTable(table, self) for name, table in database.tables.items()
+        }
+
+    async def run(self, handler, *args, **kwargs):
+        """Run `handler` on the database thread and wait for its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(handler, *args, **kwargs)
+        )
+
+    def __getitem__(self, name) -> AsyncTable:
+        table_name = self.database.aliases.get(name, name)
+        return self.tables[table_name]
+
+    def __contains__(self, key):
+        return key in self.database
+
+    async def query(self, sql: str, data: dict = None):
+        return await self.run(self.database.query, sql, data)
+
+    async def iter_query(self, sql: str, data: dict = None, chunk_size: int = None):
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        records = await self.run(self.database.iter_query, sql, data, chunk_size)
+        while True:
+            chunk = await self.run(lambda: list(islice(records, chunk_size)))
+            if not chunk:
+                break
+            for record in chunk:
+                yield record
+
+    async def prepare(self):
+        return await self.run(self.database.prepare)
+
+    async def get_errors(self):
+        return await self.run(self.database.get_errors)
+
+    async def close(self):
+        await self.run(self.database.close)
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
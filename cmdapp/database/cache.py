@@ -0,0 +1,159 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from .columnar import ColumnSet
+
+
+class QueryCache:
+    """LRU cache of query results, shared by the tables of a database and bounded by the estimated memory of the results.
+
+    - Entries are keyed by the table, the SQL and its parameters
+    - Writes through a table drop the entries of that table (and the entries of other tables that joined it)
+    - Commits of other connections (e.g. other processes) are detected by `PRAGMA data_version` of the writer, they drop all entries.
+      The commits of the writer are not counted there, they only drop the entries of the written tables
+
+    Cached results are shared between hits, so they must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = 8_000_000, max_entry_bytes: int = None):
+        """Create a query cache
+
+        Args:
+            max_bytes (int, optional): Estimated memory of all cached results. The least recently used entries are evicted over it. Defaults to 8_000_000.
+            max_entry_bytes (int, optional): Results larger than this are not cached. Defaults to None (a quarter of `max_bytes`).
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.lock = threading.Lock()
+        # key -> (result, size, tables read by the result)
+        self.entries: OrderedDict[tuple, tuple[object, int, tuple]] = OrderedDict()
+        self.tables: dict[str, set[tuple]] = {}
+        # bumped on each invalidation, so a result read before a write is not cached after it
+        self.generations: dict[str, int] = {}
+        self.epoch = 0
+        self.bytes = 0
+        # last `PRAGMA data_version` of the writer
+        self.data_version = None
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def make_key(table: str, sql: str, data) -> tuple:
+        if isinstance(data, dict):
+            data = tuple(sorted(data.items()))
+        elif isinstance(data, list):
+            data = tuple(data)
+        return (table, sql, data)
+
+    @staticmethod
+    def estimate_size(value) -> int:
+        """Estimate the memory (bytes) of a result: the object and its items, recursively for lists, tuples and dicts"""
+        size = sys.getsizeof(value)
+        if isinstance(value, ColumnSet):
+            return size + sum(
+                QueryCache.estimate_size(column) for column in value.columns.values()
+            )
+        if isinstance(value, dict):
+            return size + sum(QueryCache.estimate_size(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return size + sum(QueryCache.estimate_size(v) for v in value)
+        if hasattr(value, "__slots__") and hasattr(value, "values"):
+            return size + sum(QueryCache.estimate_size(v) for v in value.values())
+        return size
+
+    def generation(self, *tables: str) -> tuple[int, ...]:
+        with self.lock:
+            return (self.epoch, *[self.generations.get(t, 0) for t in tables])
+
+    def sync(self, data_version: int):
+        """Drop all entries if the database was changed by another connection since the last check"""
+        with self.lock:
+            if self.data_version is not None and data_version != self.data_version:
+                self._clear()
+                self.invalidations += 1
+                self.epoch += 1
+            self.data_version = data_version
+
+    def get(self, key: tuple) -> tuple[bool, object]:
+        """Get the cached result of a key
+
+        Returns:
+            tuple[bool, object]: Whether the key is cached and its result
+        """
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(
+        self,
+        key: tuple,
+        value,
+        generation: tuple[int, ...] = None,
+        related: list[str] = None,
+    ):
+        """Cache the result of a key
+
+        Args:
+            key (tuple): Key from `make_key`
+            value: Result to cache
+            generation (tuple[int, ...], optional): `generation` of the tables (the table of the key, then `related`) before the result was read. If a table was invalidated since then, the result is not cached. Defaults to None.
+            related (list[str], optional): Other tables read by the result, invalidating them also drops it. Defaults to None.
+        """
+        size = QueryCache.estimate_size(value)
+        if size > self.max_entry_bytes:
+            return
+        tables = (key[0], *(related or []))
+        with self.lock:
+            current = (self.epoch, *[self.generations.get(t, 0) for t in tables])
+            if generation is not None and generation != current:
+                return
+            self._remove(key)
+            self.entries[key] = (value, size, tables)
+            for table in tables:
+                self.tables.setdefault(table, set()).add(key)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self.entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, table: str = None):
+        """Drop the entries of a table (all entries by default)"""
+        with self.lock:
+            if table is None:
+                self._clear()
+                self.epoch += 1
+            else:
+                for key in list(self.tables.pop(table, [])):
+                    self._remove(key)
+                self.generations[table] = self.generations.get(table, 0) + 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+    def _remove(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            for table in entry[2]:
+                self.tables.get(table, set()).discard(key)
+
+    def _clear(self):
+        self.entries.clear()
+        self.tables.clear()
+        self.bytes = 0
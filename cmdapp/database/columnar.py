@@ -0,0 +1,98 @@
+import sqlite3
+from array import array
+from typing import Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# `array.array` type codes for the column dtypes stored as C values
+ARRAY_TYPECODES = {"int": "q", "float": "d"}
+
+
+class ColumnSet:
+    """Query results stored column by column: `array.array` for `int` and `float` columns (without NULL), lists for the others.
+
+    It is also an iterable of dict (one per row), so it can be passed to anything that consumes records,
+    while columnar consumers read the columns (`columns[name]`) or the rows as tuples (`rows()`) directly.
+    """
+
+    def __init__(self, columns: dict[str, Sequence]):
+        self.columns = columns
+        self.names = list(columns)
+
+    @staticmethod
+    def as_column(values: Sequence, dtype: str = None) -> Sequence:
+        typecode = ARRAY_TYPECODES.get(dtype, None)
+        if typecode and None not in values:
+            try:
+                return array(typecode, values)
+            except (TypeError, OverflowError):
+                pass
+        return list(values)
+
+    @staticmethod
+    def from_cursor(cursor: sqlite3.Cursor | None, dtypes: dict[str, str] = None):
+        """Fetch all rows of the cursor as plain tuples (no per-row dict) and transpose them into columns
+
+        Args:
+            cursor (sqlite3.Cursor | None): Executed cursor
+            dtypes (dict[str, str], optional): Data types of the columns by name. Defaults to None.
+
+        Returns:
+            ColumnSet: The result set
+        """
+        if not cursor or not cursor.description:
+            return ColumnSet({})
+        dtypes = dtypes or {}
+        names = [column[0] for column in cursor.description]
+        cursor.row_factory = None
+        values = list(zip(*cursor.fetchall())) or [()] * len(names)
+        return ColumnSet(
+            {
+                name: ColumnSet.as_column(column, dtypes.get(name, None))
+                for name, column in zip(names, values)
+            }
+        )
+
+    def __len__(self):
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def __contains__(self, name: str):
+        return name in self.columns
+
+    def __iter__(self):
+        names = self.names
+        for values in self.rows():
+            yield dict(zip(names, values))
+
+    def rows(self, names: list[str] = None):
+        """Iterate over the rows as tuples of values, in order of `names` (all columns by default)"""
+        return zip(*[self.columns[name] for name in names or self.names])
+
+    def to_numpy(self) -> dict:
+        """Get the columns as NumPy arrays. `array.array` columns are shared without copying
+
+        Raises:
+            ModuleNotFoundError: NumPy is not installed
+        """
+        if numpy is None:
+            raise ModuleNotFoundError(
+                "NumPy is required to convert the columns into NumPy arrays",
+                "install it with `pip install numpy`",
+            )
+        return {
+            name: (
+                numpy.frombuffer(column, dtype=column.typecode)
+                if isinstance(column, array)
+                else numpy.array(column, dtype=object)
+            )
+            for name, column in self.columns.items()
+        }
+
+    def to_json(self):
+        return {name: list(column) for name, column in self.columns.items()}
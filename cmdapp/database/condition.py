@@ -2,6 +2,9 @@ from .constants import SQLOperators
 
 from ..parser import COLUMN_ID
 
+# Prefix of named parameters generated on compiling a SQL Condition
+PARAMETER_PREFIX = "__p"
+
 
 def _quote(use_quote: bool, value: object) -> object:
     """Get value after quoting (''). All data types will be quoted except: (1) int, (2) float and (3) named argument like `:name`
@@ -22,6 +25,24 @@ def _quote(use_quote: bool, value: object) -> object:
     return f"'{value}'" if q else str(value)
 
 
+def _bind(params: dict, use_quote: bool, value: object) -> str:
+    """Get placeholder after binding value into `params`. Named argument like `:name` is kept as is (not bound)
+
+    Args:
+        params (dict): Parameters of the compiled statement, the value is added into it
+        use_quote (bool): True to bind int, float and named argument as text
+        value: Value to bind
+
+    Returns:
+        str: Placeholder of the value, like `:__p0`
+    """
+    if isinstance(value, str) and value.startswith(":") and not use_quote:
+        return value
+    name = f"{PARAMETER_PREFIX}{len(params)}"
+    params[name] = str(value) if use_quote else value
+    return f":{name}"
+
+
 class SQLCondition:
     def __init__(
         self, *condition, negative: bool = False, force_quote: bool = False
@@ -72,17 +93,56 @@ class SQLCondition:
         self.raw.extend(["OR", "("] + sql_condition.raw + [")"])
         return self
 
-    def build(self) -> str:
+    def qualify(self, table: str, columns) -> "SQLCondition":
+        """Get a copy of the condition with the `columns` prefixed by `table` (like `name` -> `person.name`), to use it in a query joining other tables
+
+        Args:
+            table (str): Table name (or alias) to prefix
+            columns: Column names to qualify. Other columns (and expressions) are kept as is
+        """
+        prefix = lambda c: f"{table}.{c}" if c in columns else c
+        qualified = SQLCondition.__new__(SQLCondition)
+        qualified.raw = []
+        for part in self.raw:
+            if isinstance(part, str):
+                qualified.raw.append(part)
+                continue
+            condition, negative, force_quote = part
+            if condition:
+                column = condition[0]
+                if isinstance(column, (list, tuple)):
+                    column = tuple(prefix(c) for c in column)
+                else:
+                    column = prefix(column)
+                condition = (column, *condition[1:])
+            qualified.raw.append((condition, negative, force_quote))
+        return qualified
+
+    def build(self, compiled: bool = False, params: dict = None) -> str | tuple:
         """Make SQL Condition string concat all statements
 
+        Args:
+            compiled (bool, optional): True to bind data values as named parameters instead of inlining them. Defaults to False.
+            params (dict, optional): Parameters to continue binding into (used on compiling many parts of one statement). Implies `compiled`. Defaults to None.
+
         Returns:
-            str: SQL Condition string
+            str | tuple: SQL Condition string, or a tuple of (SQL Condition string, parameters) if compiled
         """
+        compiled = compiled or params is not None
+        if compiled and params is None:
+            params = {}
         processed = [
-            v if isinstance(v, str) else SQLCondition.convert_to_string(*v)
+            (
+                v
+                if isinstance(v, str)
+                else SQLCondition.convert_to_string(
+                    *v, params=params if compiled else None
+                )
+            )
             for v in self.raw
         ]
-        return " ".join(processed)
+        sql = " ".join(processed)
+        return (sql, params) if compiled else sql
 
     @staticmethod
     def with_id(value=None) -> "SQLCondition":
@@ -103,14 +163,15 @@ class SQLCondition:
 
     @staticmethod
     def convert_to_string(
-        condition, negative: bool = False, force_quote: bool = False
+        condition, negative: bool = False, force_quote: bool = False, params: dict = None
     ) -> str:
         """Convert to Condition String
 
         Args:
-            condition (tuple): tuple of 3 parts in condition: <COLUMN> <OPERATOR> <DATA>
+            condition (tuple): tuple of 3 parts in condition: <COLUMN> <OPERATOR> <DATA>. <COLUMN> and <DATA> can be tuples of same length to compare row values
             negative (bool, optional): True to prepend NOT into Condition String. Defaults to False.
             force_quote (bool, optional): True to force quoting on all data value. Defaults to False.
+            params (dict, optional): If provided, data values are bound into it as named parameters instead of inlined. Defaults to None.
 
         Raises:
             ValueError: Condition tuple is invalid: Missing parts, Invalid DATA
@@ -121,21 +182,33 @@ class SQLCondition:
         try:
             # Process a single condition
             column, operator, value = (list(condition) + [None])[:3]
+            if params is None:
+                format = lambda v: _quote(force_quote, v)
+            else:
+                format = lambda v: _bind(params, force_quote, v)
+
+            if isinstance(column, (list, tuple)):
+                # row value comparison: (<COLUMN>, <COLUMN>) <OPERATOR> (<DATA>, <DATA>)
+                if len(column) != len(value):
+                    raise ValueError()
+                column = f"({', '.join(column)})"
+                row_format = format
+                format = lambda v: f"({', '.join(row_format(i) for i in v)})"
 
             if operator == SQLOperators.IN:
-                formatted_values = ", ".join(_quote(force_quote, v) for v in value)
+                formatted_values = ", ".join(format(v) for v in value)
                 base = f"{column} {operator} ({formatted_values})"
             elif operator == SQLOperators.LIKE:
-                base = f"{column} {operator} {_quote(force_quote, value)}"
+                base = f"{column} {operator} {format(value)}"
             elif operator == SQLOperators.BETWEEN:
-                low, high = _quote(force_quote, value[0]), _quote(force_quote, value[1])
+                low, high = format(value[0]), format(value[1])
                 base = f"{column} {operator} {low} AND {high}"
             elif (
                 operator == SQLOperators.IS_NULL or operator == SQLOperators.IS_NOT_NULL
             ):
                 base = f"{column} {operator}"
             else:
-                base = f"{column} {operator} {_quote(force_quote, value)}"
+                base = f"{column} {operator} {format(value)}"
             return ("NOT " if negative else "") + base
         except:
             raise ValueError(
@@ -1,52 +1,413 @@
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable
+
 from .helper import RowFactory
+from .slowlog import SlowQueryLog
+from .constants import (
+    READ_STATEMENTS,
+    RETRY_BACKOFF,
+    PERFORMANCE_PROFILES,
+    DEFAULT_PROFILE,
+    DATABASE_PRAGMAS,
+)
 
 # Cursor is like a ITERATOR that can traversal over the result records
 
 
 class DbConnection:
-    def __init__(self, database_path, *, row_factory: str = "dict"):
-        self.conn = sqlite3.connect(database_path, detect_types=sqlite3.PARSE_DECLTYPES)
-        self.conn.row_factory = getattr(
-            RowFactory, f"{row_factory}_factory", sqlite3.Row
+    """Pool of connections to one SQLite database, safe to use from many threads:
+    - One writer connection, shared by all threads. Writes are serialized by a lock
+    - One reader connection per thread for SELECT statements. With WAL journal mode, readers run concurrently with the writer
+    - In-memory databases cannot be shared between connections, so the writer is also used for reading (serialized by the lock)
+    - Statements failed because the database is busy (locked by another process) are retried with an exponential backoff
+    - A performance profile (set of PRAGMAs) is applied to all connections and can be switched at runtime
+    - Statements can be timed, the slow ones are recorded to a `SlowQueryLog`
+    - Writes of many statements can share one transaction (see `transaction`), nested blocks are savepoints
+    """
+
+    def __init__(
+        self,
+        database_path,
+        *,
+        row_factory: str = "dict",
+        cached_statements: int = 128,
+        timeout: float = 5.0,
+        retries: int = 5,
+        profile: str | dict = DEFAULT_PROFILE,
+        slowlog: SlowQueryLog = None,
+    ):
+        """Open a connection pool to the SQLite database
+
+        Args:
+            database_path (str): Path to the database file or `:memory:`
+            row_factory (str, optional): Name of the factory in `RowFactory` to combine cursor values and columns name. Defaults to "dict".
+            cached_statements (int, optional): Number of prepared statements each connection keeps for reusing. Defaults to 128.
+            timeout (float, optional): Seconds a connection waits for a lock on the database (busy timeout). Defaults to 5.0.
+            retries (int, optional): Number of retries for a statement still failed because the database is busy. Defaults to 5.
+            profile (str | dict, optional): Name of a preset in `PERFORMANCE_PROFILES` or a dict of PRAGMAs. Defaults to "balanced".
+            slowlog (SlowQueryLog, optional): Log to record slow statements. Defaults to None (disabled).
+        """
+        self.database_path = database_path
+        self.row_factory = getattr(RowFactory, f"{row_factory}_factory", sqlite3.Row)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.retries = retries
+        self.in_memory = DbConnection.is_memory_path(database_path)
+        self.slowlog = slowlog
+
+        self.lock = threading.RLock()
+        # guards the list of connections only, so new readers do not wait for a running transaction
+        self.connections_lock = threading.Lock()
+        # thread running a transaction on the writer (see `transaction`) and its number of nested blocks
+        self.transaction_owner = None
+        self.transaction_depth = 0
+        self.connections: list[sqlite3.Connection] = []
+        # reader of each thread, closed once its thread has exited (see `close_dead_readers`)
+        self.readers: dict[threading.Thread, sqlite3.Connection] = {}
+        self.local = threading.local()
+        self.conn = self.connect()
+        self.profile_name = None
+        self.profile = {}
+        self.profile_version = 0
+        self.set_profile(profile)
+
+    @staticmethod
+    def is_memory_path(database_path) -> bool:
+        path = str(database_path)
+        return path in ("", ":memory:") or "mode=memory" in path
+
+    @staticmethod
+    def is_read_statement(sql: str) -> bool:
+        return sql.lstrip()[:7].upper().startswith(READ_STATEMENTS)
+
+    @staticmethod
+    def resolve_profile(profile: str | dict) -> dict:
+        if isinstance(profile, str):
+            if profile not in PERFORMANCE_PROFILES:
+                raise ValueError(
+                    f"performance profile [{profile}] is not supported",
+                    f"choose one of {list(PERFORMANCE_PROFILES)}",
+                )
+            return PERFORMANCE_PROFILES[profile]
+        supported = PERFORMANCE_PROFILES[DEFAULT_PROFILE]
+        unknowns = [key for key in profile if key not in supported]
+        if unknowns:
+            raise ValueError(
+                f"PRAGMAs {unknowns} are not supported in a performance profile",
+                f"use some of {list(supported)}",
+            )
+        return dict(profile)
+
+    @staticmethod
+    def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+    @staticmethod
+    def is_busy_error(error: sqlite3.Error) -> bool:
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and (
+            "locked" in message or "busy" in message
         )
 
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=self.cached_statements,
+            timeout=self.timeout,
+            # transactions are managed explicitly (see `with_transaction`)
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.row_factory = self.row_factory
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        with self.connections_lock:
+            self.connections.append(conn)
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Get the read connection of the current thread"""
+        if self.in_memory:
+            return self.conn
+        conn = getattr(self.local, "reader", None)
+        if conn is None:
+            self.close_dead_readers()
+            conn = self.connect()
+            self.local.reader = conn
+            with self.connections_lock:
+                self.readers[threading.current_thread()] = conn
+        # readers are owned by their threads, so they pick up a new profile on their next use
+        if getattr(self.local, "profile_version", None) != self.profile_version:
+            DbConnection.apply_pragmas(
+                conn,
+                {k: v for k, v in self.profile.items() if k not in DATABASE_PRAGMAS},
+            )
+            self.local.profile_version = self.profile_version
+        return conn
+
+    def close_dead_readers(self):
+        """Close the readers of the threads which have exited, so short-lived threads do not leak connections"""
+        with self.connections_lock:
+            for thread in [t for t in self.readers if not t.is_alive()]:
+                conn = self.readers.pop(thread)
+                self.connections.remove(conn)
+                conn.close()
+
+    def set_profile(self, profile: str | dict):
+        """Apply a performance profile to the writer now and to the readers on their next use
+
+        Args:
+            profile (str | dict): Name of a preset in `PERFORMANCE_PROFILES` or a dict of PRAGMAs
+
+        Raises:
+            ValueError: The profile is unknown or contains unsupported PRAGMAs
+        """
+        pragmas = DbConnection.resolve_profile(profile)
+        with self.lock:
+            self.with_retry(lambda: DbConnection.apply_pragmas(self.conn, pragmas))
+            self.profile_name = profile if isinstance(profile, str) else "custom"
+            self.profile = pragmas
+            self.profile_version += 1
+
     def close(self):
-        return self.conn.close()
+        with self.lock, self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+            self.readers = {}
+            self.local = threading.local()
+            if self.slowlog:
+                self.slowlog.close()
+
+    def with_retry(self, handler):
+        """Run `handler`, retry it with an exponential backoff while the database is busy"""
+        for attempt in range(self.retries + 1):
+            try:
+                return handler()
+            except sqlite3.OperationalError as error:
+                if attempt >= self.retries or not DbConnection.is_busy_error(error):
+                    raise
+                time.sleep(RETRY_BACKOFF * (2**attempt))
+
+    def in_transaction(self) -> bool:
+        """Check the current thread runs a transaction on the writer (see `transaction`)"""
+        return self.transaction_owner == threading.get_ident()
+
+    @contextmanager
+    def transaction(self):
+        """Run the statements of the block in one transaction of the writer, committed once at the end of the block
+
+        - The writer is held by the current thread until the end of the block, writes of other threads wait for it
+        - Reads of the current thread also use the writer, so they see the changes not committed yet
+        - Nested blocks (and `with_transaction`, `batch_execute` inside the block) are savepoints of the transaction
+        - An exception raised out of a block rolls back the block only, then it is raised again
+
+        Yields:
+            sqlite3.Connection: The writer connection
+        """
+        with self.lock:
+            depth = self.transaction_depth
+            savepoint = f"transaction_{depth}"
+            if depth:
+                self.conn.execute(f"SAVEPOINT {savepoint}")
+            else:
+                self.with_retry(lambda: self.conn.execute("BEGIN IMMEDIATE"))
+                self.transaction_owner = threading.get_ident()
+            self.transaction_depth += 1
+            try:
+                yield self.conn
+                if depth:
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.commit()
+            except BaseException:
+                # SQLite may have rolled back the whole transaction already (like on SQLITE_FULL)
+                if self.conn.in_transaction:
+                    if depth:
+                        self.conn.execute(f"ROLLBACK TO {savepoint}")
+                        self.conn.execute(f"RELEASE {savepoint}")
+                    else:
+                        self.conn.rollback()
+                raise
+            finally:
+                self.transaction_depth = depth
+                if not depth:
+                    self.transaction_owner = None
 
     def with_transaction(self, handler, on_error=None):
-        result = None
+        """Run `handler` with the writer in a transaction, or in a savepoint inside `transaction`. Errors roll it back and are passed to `on_error`
+
+        Returns:
+            The result of `handler`, or None on errors
+        """
+        try:
+            with self.transaction() as conn:
+                return handler(conn)
+        except sqlite3.Error as error:
+            if on_error:
+                on_error(error)
+            return None
+
+    def with_reader(self, handler, on_error=None):
+        """Run `handler` with the read connection of the current thread, for reads of many statements (like a query joined to a temporary table).
+        The writer is used instead inside a transaction of the current thread and for in-memory databases. Errors are passed to `on_error`
+
+        Returns:
+            The result of `handler`, or None on errors
+        """
         try:
-            self.conn.execute("BEGIN TRANSACTION")
-            result = handler(self.conn)
-            self.conn.commit()
+            if self.in_memory or self.in_transaction():
+                with self.lock:
+                    return self.with_retry(lambda: handler(self.conn))
+            conn = self.reader()
+            return self.with_retry(lambda: handler(conn))
         except sqlite3.Error as error:
-            self.conn.rollback()
-            result = None
             if on_error:
                 on_error(error)
-        return result
+            return None
+
+    def run(self, conn: sqlite3.Connection, sql: str, data=None, many=False):
+        """Run a statement on `conn` (with `executemany` if `many`), timed by the slow query log if it is enabled.
+        For a query, the duration is until its first row is ready
+        """
+        if self.slowlog is None:
+            return (conn.executemany if many else conn.execute)(sql, data or {})
+        started = time.perf_counter()
+        cursor = (conn.executemany if many else conn.execute)(sql, data or {})
+        self.slowlog.track(conn, sql, data, time.perf_counter() - started)
+        return cursor
 
     def execute(self, sql: str, data=None, on_error=None):
-        with self.conn:
+        try:
+            if (
+                DbConnection.is_read_statement(sql)
+                and not self.in_memory
+                and not self.in_transaction()
+            ):
+                conn = self.reader()
+                return self.with_retry(lambda: self.run(conn, sql, data))
+            with self.lock:
+                return self.with_retry(lambda: self.run(self.conn, sql, data))
+        except sqlite3.Error as error:
+            if callable(on_error):
+                on_error(error, sql=sql, data=data)
+        return None
+
+    def data_version(self) -> int:
+        """Get `PRAGMA data_version` of the writer, it changes when another connection (e.g. another process) commits into the database.
+        The commits of the writer itself are not counted.
+
+        It is read without waiting for the writer lock: sqlite3 serializes the calls on a connection, and the pragma does not change a running transaction.
+        """
+        if sqlite3.threadsafety != 3:
+            # the writer can not be used from two threads at once
+            with self.lock:
+                return self._data_version(self.conn)
+        return self._data_version(self.conn)
+
+    def _data_version(self, conn: sqlite3.Connection) -> int:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return self.with_retry(
+            lambda: cursor.execute("PRAGMA data_version").fetchone()[0]
+        )
+
+    def max_variables(self) -> int:
+        """Maximum number of parameters in one statement (`SQLITE_MAX_VARIABLE_NUMBER`)"""
+        try:
+            return self.conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        except AttributeError:
+            # `getlimit` requires Python 3.11. The default limit was raised in SQLite 3.32.0
+            return 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+    def _execute_batch(self, batch: list[tuple[str, list]], on_error=None) -> int:
+        self.conn.execute("SAVEPOINT batch")
+        rowcount = 0
+        for sql, data in batch:
             try:
-                return self.conn.execute(sql, data or {})
+                rowcount += self.run(self.conn, sql, data, many=True).rowcount
             except sqlite3.Error as error:
+                self.conn.execute("ROLLBACK TO batch")
+                self.conn.execute("RELEASE batch")
                 if callable(on_error):
                     on_error(error, sql=sql, data=data)
-        return None
+                return 0
+        self.conn.execute("RELEASE batch")
+        return rowcount
 
     def batch_execute(
-        self, sql: str, data: list[dict], batch_size: int = 10, on_error=None
-    ):
-        with self.conn:
-            for batch in range(0, len(data), batch_size):
-                batch_data = data[batch : batch + batch_size]
-                _handler = lambda conn: conn.executemany(sql, batch_data)
-                _on_error = (
-                    (lambda error: on_error(error, sql=sql, data=batch_data))
-                    if callable(on_error)
-                    else None
-                )
-                cursor = self.with_transaction(handler=_handler, on_error=_on_error)
-                yield cursor
+        self,
+        batches: Iterable[list[tuple[str, list]]],
+        *,
+        commit_rows: int = None,
+        commit_interval: float = None,
+        on_error=None,
+        on_progress=None,
+    ) -> int:
+        """Execute batches of write statements. Batches are consumed lazily, so they can be generated from a stream of any size.
+
+        Each batch is a list of `(sql, data)` run by `executemany` inside a savepoint:
+        if a statement fails, the whole batch is rolled back, its error is captured and the next batches continue.
+        Inside `transaction`, the batches join its transaction and are committed with it (the commit options are ignored).
+
+        Args:
+            batches (Iterable[list[tuple[str, list]]]): Batches of statements
+            commit_rows (int, optional): Commit after at least this number of changed rows, 0 to commit once at the end. Defaults to None (commit after each batch).
+            commit_interval (float, optional): Commit after at least this number of milliseconds. Defaults to None.
+            on_error (Callable, optional): Error handler, called with the error, `sql` and `data`. Defaults to None.
+            on_progress (Callable, optional): Called after each batch with the number of changed rows and the rate (rows/second). Defaults to None.
+
+        Returns:
+            int: Number of changed rows which are committed
+        """
+        count = pending = 0
+        started = committed_at = time.perf_counter()
+        in_transaction = nested = False
+        try:
+            for batch in batches:
+                if not in_transaction:
+                    # the writer is held until the next commit
+                    self.lock.acquire()
+                    in_transaction = True
+                    nested = self.in_transaction()
+                    if not nested:
+                        self.with_retry(lambda: self.conn.execute("BEGIN IMMEDIATE"))
+                rowcount = self._execute_batch(batch, on_error)
+                count += rowcount
+                pending += rowcount
+
+                now = time.perf_counter()
+                if commit_interval is not None:
+                    should_commit = (now - committed_at) * 1000 >= commit_interval
+                else:
+                    should_commit = commit_rows is None
+                if commit_rows:
+                    should_commit |= pending >= commit_rows
+                if should_commit and not nested:
+                    self.conn.commit()
+                    self.lock.release()
+                    in_transaction = False
+                    pending = 0
+                    committed_at = now
+
+                if callable(on_progress):
+                    on_progress(count, count / max(now - started, 1e-9))
+            if in_transaction and not nested:
+                self.conn.commit()
+                pending = 0
+        except sqlite3.Error as error:
+            # the changes inside `transaction` are kept, it decides to commit them or not
+            if not nested:
+                count -= pending
+            if callable(on_error):
+                on_error(error)
+        finally:
+            if in_transaction:
+                if self.conn.in_transaction and not nested:
+                    self.conn.rollback()
+                self.lock.release()
+        return count
@@ -1,3 +1,88 @@
+# Number of rows fetched from a cursor each time on streaming query results
+DEFAULT_CHUNK_SIZE = 1000
+
+# Number of recent errors kept by each table, older errors are only counted (see `ErrorStore`)
+ERROR_STORE_CAPACITY = 100
+
+# Rows of a failed batch kept in its error, and maximum length of the text values
+ERROR_PAYLOAD_ROWS = 3
+ERROR_PAYLOAD_LENGTH = 100
+
+# Values of an `IN (...)` list bound in one statement. Longer lists are split into chunks of this size, see `Table.select_in`
+IN_LIST_CHUNK_SIZE = 1000
+
+# Above this number of values, an `IN (...)` list is loaded into a temporary table and joined instead of chunked
+IN_LIST_TEMP_TABLE_THRESHOLD = 5_000
+
+# Temporary table (per connection) of the values of a long `IN (...)` list
+IN_LIST_TEMP_TABLE = "_in_values"
+
+# Statements run on the per-thread read connections, others run on the single writer connection
+READ_STATEMENTS = ("SELECT", "EXPLAIN", "VALUES")
+
+# Table of the record counts maintained by triggers for the tables with `TableMeta.counted`
+COUNTERS_TABLE = "_counters"
+
+# Suffix of the FTS5 table that indexes the `searchable` columns of a table
+SEARCH_TABLE_SUFFIX = "_fts"
+
+# Column of the BM25 rank selected to merge the search results of many shards
+SEARCH_RANK_COLUMN = "__rank"
+
+# Aggregate functions supported in `Table.aggregate`, by name. `count_distinct` counts the distinct non-NULL values of a column
+AGGREGATE_FUNCTIONS = {
+    "count": "COUNT",
+    "count_distinct": "COUNT",
+    "sum": "SUM",
+    "total": "TOTAL",
+    "avg": "AVG",
+    "min": "MIN",
+    "max": "MAX",
+    "group_concat": "GROUP_CONCAT",
+}
+
+# Seconds to wait before the first retry of a statement failed because the database is busy (doubled on each retry)
+RETRY_BACKOFF = 0.01
+
+# PRAGMAs of the performance profiles, applied in this order. `page_size` only takes effect on a new database file
+PERFORMANCE_PROFILES = {
+    # safest: every commit is synced to disk
+    "durable": {
+        "page_size": 4096,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "wal_autocheckpoint": 1000,
+    },
+    # a commit can be rolled back on power loss but never corrupts the database
+    "balanced": {
+        "page_size": 4096,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    # fastest writes for importing data: nothing is synced, checkpoints are rare
+    "bulk-load": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# PRAGMAs of a profile which are stored in the database file (not per connection)
+DATABASE_PRAGMAS = ("page_size", "journal_mode")
+
+
 class SQLOperators:
     EQUAL = "="
     NOT_EQUAL = "<>"
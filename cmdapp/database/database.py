@@ -1,8 +1,15 @@
+from contextlib import contextmanager
+
 from ..parser import TableMeta
 
 from .connection import DbConnection
 from .table import Table
+from .shard import ShardedTable
 from .helper import CursorHelper
+from .slowlog import SlowQueryLog
+from .cache import QueryCache
+from .errors import ErrorStore
+from .constants import DEFAULT_CHUNK_SIZE, DEFAULT_PROFILE
 
 
 class Database:
@@ -12,14 +19,67 @@ class Database:
         schema: list[TableMeta],
         *,
         row_factory_name: str = "dict",
+        cached_statements: int = 128,
+        timeout: float = 5.0,
+        retries: int = 5,
+        profile: str | dict = DEFAULT_PROFILE,
+        slowlog: SlowQueryLog = None,
+        shards: dict[str, list[str] | dict] = None,
+        cache: QueryCache = None,
     ):
-        self.conn = DbConnection(database_path, row_factory=row_factory_name)
+        """Open the database
+
+        Args:
+            database_path (str): Path to the database file or `:memory:`
+            schema (list[TableMeta]): Tables of the database
+            shards (dict[str, list[str] | dict], optional): Tables split across many database files, see `ShardedTable`. Map each table name to the paths of its shards,
+                or to a dict of `paths`, `by` ("hash" or "range") and `ranges`. Defaults to None (no sharding).
+            cache (QueryCache, optional): Cache for query results, shared by the tables (except sharded tables). Defaults to None (disabled).
+            Other options are passed to `DbConnection` and also used for the connections to the shards.
+        """
+        options = dict(
+            row_factory=row_factory_name,
+            cached_statements=cached_statements,
+            timeout=timeout,
+            retries=retries,
+            profile=profile,
+            slowlog=slowlog,
+        )
+        self.conn = DbConnection(database_path, **options)
+        # file of a slow query log enabled later with `set_slowlog`
+        self.slowlog_path = slowlog.path if slowlog is not None else None
+        self.cache = cache
+        self.shard_connections: list[DbConnection] = []
+        shards = shards or {}
         self.tables = {
-            table_meta.name: Table(self.conn, table_meta) for table_meta in schema
+            table_meta.name: (
+                self.create_sharded_table(table_meta, shards[table_meta.name], options)
+                if table_meta.name in shards
+                else Table(self.conn, table_meta, cache=cache)
+            )
+            for table_meta in schema
         }
         self.aliases = {
             table.human_name(1): name for name, table in self.tables.items()
         }
+        sharded = {n for n, t in self.tables.items() if isinstance(t, ShardedTable)}
+        for table in self.tables.values():
+            if isinstance(table, Table):
+                table.sharded_tables = sharded
+
+    def create_sharded_table(
+        self, table_meta: TableMeta, config: list[str] | dict, options: dict
+    ):
+        if not isinstance(config, dict):
+            config = {"paths": config}
+        tables = []
+        for path in config["paths"]:
+            conn = DbConnection(path, **options)
+            self.shard_connections.append(conn)
+            tables.append(Table(conn, table_meta, with_id=True))
+        return ShardedTable(
+            tables, table_meta, config.get("by", "hash"), config.get("ranges", None)
+        )
 
     def __getattr__(self, name):
         return getattr(self.conn, name)
@@ -31,15 +91,82 @@ class Database:
     def __contains__(self, key):
         return key in self.tables or key in self.aliases
 
+    def set_profile(self, profile: str | dict):
+        """Apply a performance profile to the database and to the shards, see `DbConnection.set_profile`
+
+        Raises:
+            ValueError: The profile is unknown or contains unsupported PRAGMAs
+        """
+        for conn in [self.conn, *self.shard_connections]:
+            conn.set_profile(profile)
+
+    def set_slowlog(self, threshold: float):
+        """Enable, update or disable the slow query log of the database and of the shards, which share one log
+
+        A log enabled here appends to the same file as the log given on opening the database, if any.
+
+        Args:
+            threshold (float): Minimum duration (milliseconds) of a statement to record, negative to disable the log
+        """
+        connections = [self.conn, *self.shard_connections]
+        slowlog = self.conn.slowlog
+        if threshold < 0:
+            if slowlog is not None:
+                slowlog.close()
+            slowlog = None
+        elif slowlog is None:
+            slowlog = SlowQueryLog(threshold, self.slowlog_path)
+        else:
+            slowlog.threshold = threshold
+        for conn in connections:
+            conn.slowlog = slowlog
+
     def with_transaction(self, handler, on_error=None):
         return self.conn.with_transaction(handler, on_error)
 
+    @contextmanager
+    def transaction(self):
+        """Run the operations of all tables inside the block in one transaction, committed once at the end of the block.
+        Blocks can be nested, see `DbConnection.transaction`
+
+        Table operations still capture their errors (see `Table.errors`) without rolling back the block,
+        raise an exception out of the block to roll it back. Sharded tables use their own connections, they are not included.
+
+        Yields:
+            sqlite3.Connection: The writer connection
+
+        Examples:
+            with database.transaction():
+                team_id = database["team"].insert({"name": "Team A"})
+                database["person"].insert({"name": "Ann", "team_id": team_id})
+        """
+        tables = [table for table in self.tables.values() if isinstance(table, Table)]
+        writes = [table.writes for table in tables]
+        try:
+            with self.conn.transaction() as conn:
+                yield conn
+        except BaseException:
+            # results of the rolled back changes may be cached already
+            for table in tables:
+                table.on_write()
+            raise
+        if not self.conn.in_transaction():
+            # other threads still read (and cache) the old records until the commit
+            for table, count in zip(tables, writes):
+                if table.writes != count:
+                    table.invalidate_cache()
+
     def query(self, sql: str, data: dict = None):
         cursor = self.conn.execute(sql, data)
         return CursorHelper.as_objects(cursor)
 
-    def get_errors(self):
-        errors = []
+    def iter_query(self, sql: str, data: dict = None, chunk_size: int = None):
+        cursor = self.conn.execute(sql, data)
+        return CursorHelper.as_stream(cursor, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def get_errors(self) -> ErrorStore:
+        """Get the errors of the last operations of all tables, with their counts by type (see `ErrorStore`)"""
+        errors = ErrorStore()
         for _, table in self.tables.items():
             errors.extend(table.errors)
         return errors
@@ -49,3 +176,11 @@ class Database:
         for _, table in self.tables.items():
             status &= table.prepare()
         return status
+
+    def close(self):
+        for table in self.tables.values():
+            if isinstance(table, ShardedTable):
+                table.close()
+        for conn in self.shard_connections:
+            conn.close()
+        self.conn.close()
@@ -0,0 +1,129 @@
+from collections import Counter, deque
+from typing import Iterable
+
+from .constants import ERROR_PAYLOAD_LENGTH, ERROR_PAYLOAD_ROWS, ERROR_STORE_CAPACITY
+
+
+class ErrorStore:
+    """Bounded store of the errors of database operations, used as the `errors` of a table.
+
+    - Only the most recent errors are kept (a ring buffer of `capacity` errors), older ones are dropped
+    - Every error is counted by its type, including the dropped ones
+    - The payload (`data`) of an error is truncated: a failed batch keeps its number of rows and a few of them, long texts are cut
+
+    So a failing import of millions of rows does not keep its rows alive. The store reads like a list of error dicts
+    (`table`, `type`, `message`, `sql`, `data`), from the oldest kept error.
+    """
+
+    def __init__(
+        self,
+        capacity: int = ERROR_STORE_CAPACITY,
+        *,
+        rows: int = ERROR_PAYLOAD_ROWS,
+        length: int = ERROR_PAYLOAD_LENGTH,
+    ):
+        """Create an empty store
+
+        Args:
+            capacity (int, optional): Number of recent errors to keep. Defaults to ERROR_STORE_CAPACITY.
+            rows (int, optional): Rows of a batch payload to keep. Defaults to ERROR_PAYLOAD_ROWS.
+            length (int, optional): Maximum length of the text values of a payload. Defaults to ERROR_PAYLOAD_LENGTH.
+        """
+        self.records: deque[dict] = deque(maxlen=capacity)
+        self.counts: Counter[str] = Counter()
+        self.rows = rows
+        self.length = length
+
+    @property
+    def total(self) -> int:
+        """Number of errors added, including the dropped ones"""
+        return sum(self.counts.values())
+
+    @property
+    def dropped(self) -> int:
+        """Number of errors no longer kept"""
+        return self.total - len(self.records)
+
+    def truncate(self, data):
+        """Get a small copy of an error payload
+
+        Args:
+            data: Parameters of the failed statement: a dict, a sequence of values or a batch of them
+
+        Returns:
+            Same payload if small, otherwise `{"rows": <number of rows>, "sample": <first rows>}` for a long batch. Long texts are cut as `<text>...(<length>)`
+        """
+        if isinstance(data, dict):
+            return {key: self.truncate(value) for key, value in data.items()}
+        if isinstance(data, (list, tuple)):
+            if len(data) > self.rows and any(
+                isinstance(row, (dict, list, tuple)) for row in data[:1]
+            ):
+                sample = [self.truncate(row) for row in data[: self.rows]]
+                return {"rows": len(data), "sample": sample}
+            if len(data) > self.length:
+                values = [self.truncate(value) for value in data[: self.length]]
+                return values + [f"...({len(data)})"]
+            return type(data)(self.truncate(value) for value in data)
+        if isinstance(data, (str, bytes)) and len(data) > self.length:
+            return f"{data[: self.length]}...({len(data)})"
+        if data is None or isinstance(data, (int, float, str, bytes)):
+            return data
+        return self.truncate(str(data))
+
+    def add(self, table: str, error_name: str, message: str, sql=None, data=None):
+        """Record an error with a truncated payload"""
+        self.append(
+            {
+                "table": table,
+                "type": error_name,
+                "message": message,
+                "sql": sql,
+                "data": data,
+            }
+        )
+
+    def append(self, error: dict):
+        error = error | {"data": self.truncate(error.get("data"))}
+        self.counts[error.get("type")] += 1
+        self.records.append(error)
+
+    def extend(self, errors: Iterable[dict]):
+        """Add the errors of another store (with its counts of the dropped errors) or of a list"""
+        if isinstance(errors, ErrorStore):
+            if errors is self:
+                return
+            self.counts.update(errors.counts)
+            self.records.extend(errors.records)
+            return
+        for error in errors:
+            self.append(error)
+
+    def clear(self):
+        self.records.clear()
+        self.counts.clear()
+
+    def summary(self) -> dict[str, int]:
+        """Get the number of errors of each type, from the most frequent"""
+        return dict(self.counts.most_common())
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.records)[index]
+        return self.records[index]
+
+    def __eq__(self, other):
+        if isinstance(other, ErrorStore):
+            return list(self.records) == list(other.records)
+        if isinstance(other, list):
+            return list(self.records) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ErrorStore({list(self.records)!r}, counts={dict(self.counts)!r})"
@@ -1,8 +1,12 @@
 from collections import namedtuple
 
+import base64
+import keyword
 import sqlite3
 
-from ..utils import Array
+from ..utils import Array, Json
+
+from .columnar import ColumnSet
 
 
 def parse_error(error: sqlite3.Error | Exception):
@@ -17,6 +21,31 @@ def parse_error(error: sqlite3.Error | Exception):
     return (error_name, message)
 
 
+def encode_page_token(values: list) -> str:
+    """Encode the sort key values of the last record of a page into an opaque token"""
+    data = Json.dump(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> list:
+    """Decode a token created by `encode_page_token`
+
+    Raises:
+        ValueError: The token is invalid
+    """
+    try:
+        padding = "=" * (-len(token) % 4)
+        values = Json.load(base64.urlsafe_b64decode(token + padding).decode())
+    except Exception:
+        values = None
+    if not isinstance(values, list):
+        raise ValueError(
+            f"page token [{token}] is invalid",
+            "use the token printed at the end of the previous page",
+        )
+    return values
+
+
 class CursorHelper:
     @staticmethod
     def as_status(cursor: sqlite3.Cursor | None, on_rowcount=True):
@@ -40,27 +69,174 @@ class CursorHelper:
     def as_objects(cursor: sqlite3.Cursor | None):
         return cursor.fetchall() if cursor else []
 
+    @staticmethod
+    def as_columns(cursor: sqlite3.Cursor | None, dtypes: dict[str, str] = None):
+        return ColumnSet.from_cursor(cursor, dtypes)
+
+    @staticmethod
+    def as_stream(cursor: sqlite3.Cursor | None, chunk_size: int = 1000):
+        """Iterate over the result records, fetching `chunk_size` records each time instead of all of them at once"""
+        if not cursor:
+            return
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            if not records:
+                break
+            yield from records
+
+    @staticmethod
+    def row_values(row) -> list:
+        """Values of a row created by any row factory: dict, `Record`, `sqlite3.Row`, namedtuple or tuple"""
+        return list(row.values()) if hasattr(row, "values") else list(row)
+
     @staticmethod
     def as_value(cursor: sqlite3.Cursor | None):
         result = cursor.fetchone() if cursor else None
-        return Array.unpack_one(result.values()) if result else result
+        return Array.unpack_one(CursorHelper.row_values(result)) if result else result
 
     @staticmethod
     def as_values(cursor: sqlite3.Cursor | None):
         result = cursor.fetchall() if cursor else None
         return (
-            [Array.unpack_one(item.values()) for item in result] if result else result
+            [Array.unpack_one(CursorHelper.row_values(item)) for item in result]
+            if result
+            else result
         )
 
 
+class Record:
+    """Base of the light-weight records created by `RowFactory.record_factory`: values are stored in `__slots__`
+    (no per-record dict) and read like a dict, by column name
+    """
+
+    __slots__ = ()
+    _fields: tuple[str] = ()
+    _columns: tuple[str] = ()
+
+    def __getitem__(self, column: str):
+        try:
+            return getattr(self, self._fields[self._columns.index(column)])
+        except ValueError:
+            raise KeyError(column) from None
+
+    def get(self, column: str, default=None):
+        return self[column] if column in self._columns else default
+
+    def keys(self):
+        return list(self._columns)
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return list(zip(self._columns, self.values()))
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Record({dict(self.items())})"
+
+    def to_json(self):
+        return dict(self.items())
+
+
+def as_fields(columns: tuple[str]) -> tuple[str]:
+    """Turn columns name into valid and unique attribute names.
+    Names starting with `__` are renamed too, they would be mangled as slots of the record class
+    """
+    fields = []
+    for index, column in enumerate(columns):
+        if (
+            not column.isidentifier()
+            or keyword.iskeyword(column)
+            or column.startswith("__")
+            or column in fields
+        ):
+            column = f"_{index}"
+        fields.append(column)
+    return tuple(fields)
+
+
+class RowLayout:
+    """Columns of a result set and the record classes built for them, shared by all of its rows"""
+
+    __slots__ = ("description", "columns", "_namedtuple", "_record")
+
+    def __init__(self, description):
+        self.description = description
+        self.columns = tuple(column[0] for column in description)
+        self._namedtuple = None
+        self._record = None
+
+    def namedtuple(self):
+        if self._namedtuple is None:
+            self._namedtuple = namedtuple("Row", self.columns, rename=True)
+        return self._namedtuple
+
+    def record(self):
+        if self._record is None:
+            fields = as_fields(self.columns)
+            # a generated `__init__` assigns the slots directly, like dataclasses do
+            source = f"def __init__(self, {', '.join(fields)}):\n"
+            source += "".join(f"    self.{field} = {field}\n" for field in fields)
+            source += "    pass\n"
+            namespace = {}
+            exec(source, {}, namespace)
+            self._record = type(
+                "Record",
+                (Record,),
+                {
+                    "__slots__": fields,
+                    "__init__": namespace["__init__"],
+                    "_fields": fields,
+                    "_columns": self.columns,
+                },
+            )
+        return self._record
+
+
 class RowFactory:
-    """Define how to combined cursor values and columns name"""
+    """Define how to combined cursor values and columns name.
+
+    The layout of a result set is built once and cached by its `cursor.description`
+    (the same object for all rows of one execution), so each row only pays for creating its record.
+    """
+
+    LAYOUT_CACHE_SIZE = 64
+    layouts: dict[int, RowLayout] = {}
+
+    @staticmethod
+    def layout(cursor: sqlite3.Cursor) -> RowLayout:
+        description = cursor.description
+        layout = RowFactory.layouts.get(id(description), None)
+        # the cached layout holds its description, so the id is not reused while it is cached
+        if layout is None or layout.description is not description:
+            if len(RowFactory.layouts) >= RowFactory.LAYOUT_CACHE_SIZE:
+                RowFactory.layouts.clear()
+            layout = RowLayout(description)
+            RowFactory.layouts[id(description)] = layout
+        return layout
 
     def dict_factory(cursor: sqlite3.Cursor, row):
-        fields = [column[0] for column in cursor.description]
-        return {key: value for key, value in zip(fields, row)}
+        return dict(zip(RowFactory.layout(cursor).columns, row))
 
     def namedtuple_factory(cursor: sqlite3.Cursor, row):
-        fields = [column[0] for column in cursor.description]
-        cls = namedtuple("Row", fields)
-        return cls._make(row)
+        return RowFactory.layout(cursor).namedtuple()._make(row)
+
+    def record_factory(cursor: sqlite3.Cursor, row):
+        return RowFactory.layout(cursor).record()(*row)
+
+    # plain tuples: no row factory at all
+    tuple_factory = None
@@ -0,0 +1,616 @@
+import bisect
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable
+
+from .table import Table
+from .condition import SQLCondition
+from .columnar import ColumnSet
+from .errors import ErrorStore
+from .helper import CursorHelper, parse_error
+from .constants import *
+
+from ..parser import TableMeta, COLUMN_ID
+from ..utils import Sanitizer
+
+
+class SortKey:
+    """Compare records by their sort keys, like SQLite does for `ORDER BY`: NULL is the smallest value and each key has its own direction"""
+
+    __slots__ = ("values", "descending")
+
+    def __init__(self, record, keys: list[tuple[str, SQLOrderByDirection]]):
+        self.values = [record[column] for column, _ in keys]
+        self.descending = [d.upper() == SQLOrderByDirection.DESC for _, d in keys]
+
+    def __lt__(self, other: "SortKey"):
+        for value, other_value, descending in zip(
+            self.values, other.values, self.descending
+        ):
+            if value == other_value:
+                continue
+            if value is None:
+                less = True
+            elif other_value is None:
+                less = False
+            else:
+                less = value < other_value
+            return less != descending
+        return False
+
+
+class ShardedTable:
+    """A table split across many databases (shards). Records are routed to the shards by their ID:
+    - "hash": the shard at `id % number of shards`
+    - "range": the shard of the range containing the ID, `ranges` are the upper bounds (exclusive) of the shards except the last one
+
+    IDs are assigned by the sharded table, so they are unique across shards. Reads fan out to all shards on a thread pool and the results are merged,
+    keeping the order and the pagination of a single table. Merging reads records by column names, so the row factory must return mappings ("dict" or "record").
+    """
+
+    def __init__(
+        self,
+        shards: list[Table],
+        table_meta: TableMeta,
+        by: str = "hash",
+        ranges: list[int] = None,
+    ):
+        if by not in ["hash", "range"]:
+            raise ValueError(
+                f"sharding by [{by}] is not supported", 'use "hash" or "range"'
+            )
+        if by == "range" and len(ranges or []) != len(shards) - 1:
+            raise ValueError(
+                f"sharding by range requires {len(shards) - 1} upper bounds for {len(shards)} shards",
+                f"got [{ranges}]",
+            )
+        self.shards = shards
+        self.table_meta = table_meta
+        self.name = shards[0].name
+        self.by = by
+        self.ranges = list(ranges or [])
+        self.pool = ThreadPoolExecutor(
+            max_workers=len(shards), thread_name_prefix=f"cmdapp-shard-{self.name}"
+        )
+        self.id_lock = threading.Lock()
+        self.next_id = None
+        self._errors = ErrorStore()
+
+    # ######### Shards #########
+
+    def shard_index(self, item_id: int) -> int:
+        if self.by == "range":
+            return bisect.bisect_right(self.ranges, int(item_id))
+        return int(item_id) % len(self.shards)
+
+    def shard_of(self, item_id: int) -> Table:
+        return self.shards[self.shard_index(item_id)]
+
+    def group_ids(self, item_ids: Iterable[int]) -> dict[int, list[int]]:
+        groups = {}
+        for item_id in item_ids:
+            groups.setdefault(self.shard_index(item_id), []).append(item_id)
+        return groups
+
+    def fan_out(self, handler: Callable[[Table], object], shards: list[Table] = None):
+        """Run `handler` on each shard in parallel and return their results in order of the shards"""
+        return list(self.pool.map(handler, shards or self.shards))
+
+    def allocate_ids(self, count: int) -> list[int]:
+        with self.id_lock:
+            if self.next_id is None:
+                sql = f"SELECT MAX({COLUMN_ID}) FROM {self.name}"
+                max_ids = self.fan_out(
+                    lambda shard: CursorHelper.as_value(shard.execute(sql))
+                )
+                self.next_id = max([i or 0 for i in max_ids], default=0) + 1
+            start = self.next_id
+            self.next_id += count
+        return list(range(start, start + count))
+
+    # ######### Table #########
+
+    @property
+    def writes(self):
+        return sum(shard.writes for shard in self.shards)
+
+    @property
+    def errors(self):
+        errors = ErrorStore()
+        errors.extend(self._errors)
+        for shard in self.shards:
+            errors.extend(shard.errors)
+        return errors
+
+    def on_error(self, error: Exception, sql=None, data=None):
+        error_name, message = parse_error(error)
+        self._errors.add(self.name, error_name, message, sql, data)
+
+    def refresh(self):
+        self._errors = ErrorStore()
+        for shard in self.shards:
+            shard.refresh()
+
+    def keep_errors(self):
+        """Move the errors of the shards into the sharded table, before the shards are refreshed by a next operation"""
+        for shard in self.shards:
+            self._errors.extend(shard.errors)
+            shard.refresh()
+
+    def __getattr__(self, name):
+        return getattr(self.table_meta, name)
+
+    def __contains__(self, name):
+        return name in self.table_meta
+
+    keyset_order = staticmethod(Table.keyset_order)
+    next_page_token = staticmethod(Table.next_page_token)
+    # only depends on the table meta, same on all shards
+    match_condition = Table.match_condition
+
+    def prepare(self):
+        return all(self.fan_out(lambda shard: shard.prepare()))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+    # ######### DML #########
+
+    def insert(self, item: dict):
+        self.refresh()
+        item_id = self.allocate_ids(1)[0]
+        return self.shard_of(item_id).insert(item | {COLUMN_ID: item_id})
+
+    def insert_all(self, items: list[dict]):
+        self.refresh()
+        errors = ErrorStore()
+        count = 0
+        for item in items:
+            new_id = self.insert(item)
+            count += int(new_id is None)
+            errors.extend(self.errors)
+        self.refresh()
+        self._errors = errors
+        return count
+
+    def insert_batch(
+        self,
+        items: Iterable[dict],
+        batch_size: int = 1000,
+        *,
+        on_progress: Callable[[int, float], None] = None,
+        **kwargs,
+    ):
+        """Same as `Table.insert_batch`. Each batch is split by shards and the parts are inserted into their shards in parallel"""
+        self.refresh()
+        count = 0
+        started = time.perf_counter()
+        iterator = iter(items)
+        while chunk := list(islice(iterator, batch_size)):
+            parts: dict[int, list[dict]] = {}
+            for item, item_id in zip(chunk, self.allocate_ids(len(chunk))):
+                parts.setdefault(self.shard_index(item_id), []).append(
+                    item | {COLUMN_ID: item_id}
+                )
+            shards = [self.shards[index] for index in parts]
+            counts = self.fan_out(
+                lambda shard: shard.insert_batch(
+                    parts[self.shards.index(shard)], batch_size=batch_size, **kwargs
+                ),
+                shards,
+            )
+            self.keep_errors()
+            count += sum(counts)
+            if callable(on_progress):
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                on_progress(count, count / elapsed)
+        return count
+
+    def update(self, item: dict, condition: SQLCondition = None):
+        self.refresh()
+        if condition is None:
+            if item.get(COLUMN_ID, None) is None:
+                self.on_error(ValueError(f"require [{COLUMN_ID}] to update a record"))
+                return 0
+            return self.shard_of(item[COLUMN_ID]).update(item)
+        return sum(self.fan_out(lambda shard: shard.update(item, condition)))
+
+    def update_batch(self, items: Iterable[dict]):
+        self.refresh()
+        groups: dict[int, list[dict]] = {}
+        for item in items:
+            index = self.shard_index(item[COLUMN_ID]) if COLUMN_ID in item else 0
+            groups.setdefault(index, []).append(item)
+        shards = [self.shards[index] for index in groups]
+        return sum(
+            self.fan_out(
+                lambda shard: shard.update_batch(groups[self.shards.index(shard)]),
+                shards,
+            )
+        )
+
+    def upsert(
+        self,
+        item: dict,
+        conflict_columns: list[str],
+        update_columns: list[str] = None,
+    ):
+        """Same as `Table.upsert`. The existing record is looked up by `conflict_columns` on all shards and upserted on its shard,
+        a new record is inserted on the shard of a new ID. Unique constraints only hold within each shard, and the lookup and the write are not atomic
+        """
+        self.refresh()
+        values = self.table_meta.sanitize_data(item)
+        shard = None
+        if COLUMN_ID in conflict_columns and values.get(COLUMN_ID) is not None:
+            shard = self.shard_of(values[COLUMN_ID])
+        elif all(values.get(column) is not None for column in conflict_columns):
+            condition = None
+            for column in conflict_columns:
+                part = (column, SQLOperators.EQUAL, values[column])
+                condition = condition.AND(*part) if condition else SQLCondition(*part)
+            found = self.fan_out(
+                lambda shard: shard.query([COLUMN_ID], condition, page_size=1)
+            )
+            self.keep_errors()
+            shard = next((s for s, records in zip(self.shards, found) if records), None)
+        if shard is None:
+            item = item | {COLUMN_ID: self.allocate_ids(1)[0]}
+            shard = self.shard_of(item[COLUMN_ID])
+        count = shard.upsert(item, conflict_columns, update_columns)
+        self.keep_errors()
+        return count
+
+    def upsert_batch(
+        self,
+        items: Iterable[dict],
+        conflict_columns: list[str],
+        update_columns: list[str] = None,
+        **kwargs,
+    ):
+        """Same as `Table.upsert_batch`, but the records are upserted one by one (see `upsert`), each one is looked up on all shards. Other options are ignored"""
+        self.refresh()
+        errors = ErrorStore()
+        count = 0
+        for item in items:
+            count += self.upsert(item, conflict_columns, update_columns)
+            errors.extend(self.errors)
+        self.refresh()
+        self._errors = errors
+        return count
+
+    def delete(self, condition: SQLCondition = None, permanent: bool = False):
+        self.refresh()
+        return sum(
+            self.fan_out(lambda shard: shard.delete(condition, permanent=permanent))
+        )
+
+    def delete_by_id(self, *item_id: int, permanent: bool = False):
+        self.refresh()
+        groups = self.group_ids(item_id)
+        return sum(
+            self.shards[index].delete_by_id(*ids, permanent=permanent)
+            for index, ids in groups.items()
+        )
+
+    # ######### Query #########
+
+    def get(self, item_id: int):
+        self.refresh()
+        return self.shard_of(item_id).get(item_id)
+
+    def get_columns(self, columns: list[str], item_ids: list[int] = None):
+        self.refresh()
+        if item_ids:
+            groups = self.group_ids(item_ids)
+            results = [
+                self.shards[index].get_columns(columns, ids)
+                for index, ids in groups.items()
+            ]
+        else:
+            results = self.fan_out(lambda shard: shard.get_columns(columns))
+        return {k: v for result in results for k, v in result.items()}
+
+    def which_exists(self, *item_id: int, with_deleted=True):
+        self.refresh()
+        groups = self.group_ids(item_id)
+        ids = []
+        for index, group in groups.items():
+            ids.extend(
+                self.shards[index].which_exists(*group, with_deleted=with_deleted)
+                or []
+            )
+        return sorted(ids)
+
+    def first(self):
+        records = self.query(order_by=[(COLUMN_ID, SQLOrderByDirection.ASC)], page_size=1)
+        return records[0] if records else None
+
+    def last(self):
+        records = self.query(order_by=[(COLUMN_ID, SQLOrderByDirection.DESC)], page_size=1)
+        return records[0] if records else None
+
+    def count(self, condition: SQLCondition = None):
+        self.refresh()
+        return sum(self.fan_out(lambda shard: shard.count(condition) or 0))
+
+    def recount(self):
+        """Same as `Table.recount`, each shard repairs its own counts and they are summed"""
+        self.refresh()
+        results = self.fan_out(lambda shard: shard.recount())
+        self.keep_errors()
+        if any(result is None for result in results):
+            return None
+        return {key: sum(result[key] for result in results) for key in results[0]}
+
+    def translate(self, column_name: str, *values, full_record: bool = False) -> dict:
+        self.refresh()
+        results = self.fan_out(
+            lambda shard: shard.translate(
+                column_name, *values, full_record=full_record
+            )
+        )
+        dictionary = {}
+        for result in results:
+            for value, matches in result.items():
+                dictionary.setdefault(value, []).extend(matches)
+        return dictionary
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        columns: str | list[str] = None,
+        with_deleted: bool = False,
+        raw: bool = False,
+    ):
+        """Same as `Table.search`. The best records of each shard are merged by their BM25 ranks.
+        Each shard ranks by the statistics of its own records, so the order is close to (not always same as) the order in a single table
+        """
+        self.refresh()
+        if not self.table_meta.searchable_columns:
+            self.on_error(
+                ValueError(
+                    f"table [{self.name}] has no searchable columns",
+                    "declare columns with `searchable`",
+                )
+            )
+            return []
+        results = self.fan_out(
+            lambda shard: shard.search(
+                query, limit, columns, with_deleted, raw, rank=SEARCH_RANK_COLUMN
+            )
+        )
+        records = sorted(
+            (record for result in results for record in result),
+            key=lambda record: record[SEARCH_RANK_COLUMN],
+        )
+        return [
+            {k: v for k, v in record.items() if k != SEARCH_RANK_COLUMN}
+            for record in records[:limit]
+        ]
+
+    def aggregate(
+        self,
+        group_by: list[str] = None,
+        metrics: dict[str, str | tuple[str, str]] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        limit: int = None,
+        layout: str = "rows",
+    ):
+        """Same as `Table.aggregate`. Each shard computes its groups in parallel and the groups are combined:
+        counts and sums are added, minimums and maximums are compared, averages are computed from the sums and the counts of the shards.
+        `count_distinct` and `group_concat` can not be combined, they are not supported
+        """
+        self.refresh()
+        group_by = list(group_by or [])
+        metrics = metrics or {"count": "count"}
+        # metric name -> (function combining the values of the shards, names of the partial metrics)
+        combiners = {}
+        partials = {}
+        try:
+            for name, metric in metrics.items():
+                function, column = (metric, None) if isinstance(metric, str) else metric
+                function = str(function).lower()
+                name = Sanitizer.as_identifier(name)
+                if function in ("count_distinct", "group_concat"):
+                    raise ValueError(
+                        f"aggregate function [{function}] is not supported on sharded table [{self.name}]",
+                        "use count, sum, total, avg, min or max",
+                    )
+                if function == "avg":
+                    parts = [f"{name}__sum", f"{name}__count"]
+                    partials[parts[0]] = ("total", column)
+                    partials[parts[1]] = ("count", column)
+                else:
+                    parts = [name]
+                    partials[name] = metric
+                combiners[name] = (function, parts)
+            for column, _ in order_by or []:
+                if column not in group_by and column not in combiners:
+                    raise ValueError(
+                        f"sort key [{column}] is not a group column or a metric",
+                        f"use one of {group_by + list(combiners)}",
+                    )
+        except ValueError as error:
+            self.on_error(error)
+            return ColumnSet({}) if layout == "columns" else []
+
+        results = self.fan_out(
+            lambda shard: shard.aggregate(group_by, partials, condition)
+        )
+        self.keep_errors()
+        if self.errors:
+            return ColumnSet({}) if layout == "columns" else []
+        groups: dict[tuple, list[dict]] = {}
+        for record in (record for result in results for record in result):
+            groups.setdefault(tuple(record[c] for c in group_by), []).append(record)
+        records = []
+        for key, parts in groups.items():
+            record = dict(zip(group_by, key))
+            for name, (function, names) in combiners.items():
+                values = [[part[n] for part in parts] for n in names]
+                record[name] = ShardedTable.combine(function, *values)
+            records.append(record)
+        keys = order_by or [(c, SQLOrderByDirection.ASC) for c in group_by]
+        records = sorted(records, key=lambda record: SortKey(record, keys))[:limit]
+
+        if layout == "columns":
+            dtypes = self.table_meta.columns_dtypes
+            names = group_by + list(combiners)
+            return ColumnSet(
+                {
+                    name: ColumnSet.as_column(
+                        [record[name] for record in records],
+                        dtypes.get(name) if name in group_by else None,
+                    )
+                    for name in names
+                }
+            )
+        return records
+
+    @staticmethod
+    def combine(function: str, values: list, counts: list = None):
+        """Combine the values of a metric computed by the shards (NULL values are ignored, like SQLite does)
+
+        Args:
+            function (str): Aggregate function of the metric, see `AGGREGATE_FUNCTIONS`
+            values (list): Values of the shards. For `avg`, their sums
+            counts (list, optional): For `avg`, the numbers of values of the shards. Defaults to None.
+        """
+        values = [value for value in values if value is not None]
+        if function == "avg":
+            count = sum(counts)
+            return sum(values) / count if count else None
+        if function in ("count", "total"):
+            return sum(values)
+        if not values:
+            return None
+        if function == "min":
+            return min(values)
+        if function == "max":
+            return max(values)
+        return sum(values)
+
+    def _check_expand(self, expand):
+        if expand:
+            raise ValueError(
+                f"relations of sharded table [{self.name}] can not be expanded",
+                "query the related tables separately",
+            )
+
+    def _merge_options(self, columns, order_by, after):
+        """Get the columns to query on each shard (with the sort keys, to merge the results) and the sort keys"""
+        if after is not None:
+            keys = Table.keyset_order(order_by)
+        else:
+            keys = list(order_by or [])
+            if COLUMN_ID not in [column for column, _ in keys]:
+                keys.append((COLUMN_ID, SQLOrderByDirection.ASC))
+        selected = self.table_meta.filter_columns(columns)
+        extras = []
+        if selected:
+            extras = [c for c, _ in keys if c not in selected]
+            selected += extras
+        return selected or None, keys, extras
+
+    def query(
+        self,
+        columns: str | list[str] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        page_size: int = None,
+        page_index: int = 1,
+        after: str = None,
+        layout: str = "rows",
+        expand: bool | list[str] = False,
+    ):
+        """Same as `Table.query`. Records of the shards are merged by `order_by` (then by ID). For a page, each shard returns its records until the end of the page.
+        Relations are not expanded: the related tables are not in the shards"""
+        self.refresh()
+        try:
+            self._check_expand(expand)
+            selected, keys, extras = self._merge_options(columns, order_by, after)
+        except ValueError as error:
+            self.on_error(error)
+            return ColumnSet({}) if layout == "columns" else []
+
+        paged = page_size is not None and int(page_size) > 0
+        offset = 0 if not paged or after is not None else page_size * (page_index - 1)
+        limit = offset + page_size if paged else None
+        results = self.fan_out(
+            lambda shard: shard.query(
+                selected, condition, keys, page_size=limit, page_index=1, after=after
+            )
+        )
+        records = sorted(
+            (record for result in results for record in result),
+            key=lambda record: SortKey(record, keys),
+        )
+        records = records[offset:limit]
+        if extras:
+            records = [
+                {k: v for k, v in record.items() if k not in extras}
+                for record in records
+            ]
+
+        if layout == "columns":
+            names = list(records[0]) if records else []
+            dtypes = self.table_meta.columns_dtypes
+            return ColumnSet(
+                {
+                    name: ColumnSet.as_column(
+                        [record[name] for record in records], dtypes.get(name)
+                    )
+                    for name in names
+                }
+            )
+        return records
+
+    def iter_query(
+        self,
+        columns: str | list[str] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        page_size: int = None,
+        page_index: int = 1,
+        after: str = None,
+        chunk_size: int = None,
+        expand: bool | list[str] = False,
+    ):
+        """Same as `Table.iter_query`. The streams of the shards are merged lazily by `order_by` (then by ID)"""
+        self.refresh()
+        try:
+            self._check_expand(expand)
+            selected, keys, extras = self._merge_options(columns, order_by, after)
+        except ValueError as error:
+            self.on_error(error)
+            return iter([])
+
+        paged = page_size is not None and int(page_size) > 0
+        offset = 0 if not paged or after is not None else page_size * (page_index - 1)
+        limit = offset + page_size if paged else None
+        streams = self.fan_out(
+            lambda shard: shard.iter_query(
+                selected,
+                condition,
+                keys,
+                page_size=limit,
+                page_index=1,
+                after=after,
+                chunk_size=chunk_size,
+            )
+        )
+        records = islice(
+            heapq.merge(*streams, key=lambda record: SortKey(record, keys)),
+            offset,
+            limit,
+        )
+        if not extras:
+            return records
+        return (
+            {k: v for k, v in record.items() if k not in extras} for record in records
+        )
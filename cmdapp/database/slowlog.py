@@ -0,0 +1,127 @@
+import logging
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from ..utils import Json
+
+# Literals in SQL replaced by `?` on normalizing. Strings first, so numbers inside strings are not touched
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+MAX_PARAM_LENGTH = 100
+
+
+class SlowQueryLog:
+    """Record statements that run longer than a threshold, with their normalized SQL, parameters and query plan.
+
+    Records are kept in memory (the most recent ones) and optionally appended as JSON lines into a rotating file.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 100,
+        path: str = None,
+        *,
+        max_bytes: int = 1_000_000,
+        backups: int = 3,
+        capacity: int = 100,
+        explain: bool = True,
+    ):
+        """Create a slow query log
+
+        Args:
+            threshold (float, optional): Minimum duration (milliseconds) of a statement to record. Defaults to 100.
+            path (str, optional): Path to the JSON lines file to append records. Defaults to None (only keep in memory).
+            max_bytes (int, optional): Size of the file to rotate it. Defaults to 1_000_000.
+            backups (int, optional): Number of rotated files to keep (`path.1`, `path.2`...). Defaults to 3.
+            capacity (int, optional): Number of recent records to keep in memory. Defaults to 100.
+            explain (bool, optional): Set to capture the `EXPLAIN QUERY PLAN` of recorded statements. Defaults to True.
+        """
+        self.threshold = threshold
+        self.path = path
+        self.explain = explain
+        self.records = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.logger = None
+        if path:
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            self.logger.addHandler(handler)
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """Collapse whitespaces and replace literals by `?`, so same statements with different values look the same"""
+        return " ".join(SQL_LITERALS.sub("?", sql).split())
+
+    @staticmethod
+    def is_full_scan(detail: str) -> bool:
+        """Check a line of the query plan is a scan over the whole table (not using any index)"""
+        return detail.startswith("SCAN") and "USING" not in detail
+
+    @staticmethod
+    def summarize_params(data):
+        if isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
+            return {"rows": len(data), "first": SlowQueryLog.summarize_params(data[0])}
+        if isinstance(data, dict):
+            return {k: SlowQueryLog.summarize_params(v) for k, v in data.items()}
+        if isinstance(data, (str, bytes)) and len(data) > MAX_PARAM_LENGTH:
+            return f"{data[:MAX_PARAM_LENGTH]}...({len(data)})"
+        if data is None or isinstance(data, (int, float, str)):
+            return data
+        return str(data)
+
+    def query_plan(self, conn: sqlite3.Connection, sql: str, data) -> list[str]:
+        if isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
+            data = data[0]
+        try:
+            # plain tuples whatever the row factory of the connection: (id, parent, notused, detail)
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", data or {})
+            return [row[-1] for row in cursor.fetchall()]
+        except sqlite3.Error:
+            return []
+
+    def track(self, conn: sqlite3.Connection, sql: str, data, duration: float):
+        """Record the statement if its duration (seconds) is over the threshold"""
+        if duration * 1000 < self.threshold:
+            return None
+        plan = self.query_plan(conn, sql, data) if self.explain else []
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "duration": round(duration * 1000, 3),
+            "sql": SlowQueryLog.normalize(sql),
+            "params": SlowQueryLog.summarize_params(data),
+            "plan": plan,
+            "full_scan": any(SlowQueryLog.is_full_scan(line) for line in plan),
+        }
+        with self.lock:
+            self.records.append(record)
+        if self.logger:
+            self.logger.info(Json.dump(record))
+        return record
+
+    def get_records(self, limit: int = None, full_scan_only: bool = False):
+        """Get the recent records, the latest first"""
+        with self.lock:
+            records = list(reversed(self.records))
+        if full_scan_only:
+            records = [record for record in records if record["full_scan"]]
+        return records[:limit] if limit else records
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def close(self):
+        if self.logger:
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
@@ -1,11 +1,19 @@
 from .constants import *
-from .condition import SQLCondition
+from .condition import SQLCondition, PARAMETER_PREFIX
 
 from ..types import DTypes
 from ..parser import TableMeta, FieldMeta, COLUMN_ID
 from ..utils import Array, Hash, Sanitizer
 
 
+def _bind_clause(keyword: str, value: int, params: dict) -> str:
+    if not isinstance(value, int):
+        return ""
+    name = f"{PARAMETER_PREFIX}{keyword.lower()}"
+    params[name] = value
+    return f" {keyword} :{name}"
+
+
 class SQLBuilder:
     @staticmethod
     def create_column(field: FieldMeta) -> str:
@@ -29,39 +37,223 @@ class SQLBuilder:
         constraints = [c.strip() for c in table.constraints if c and not c.isspace()]
         constraints = (",\n" if constraints else "") + ",\n".join(constraints)
 
-        commands = ",\n".join(
-            [SQLBuilder.create_column(field) for field in table.columns.values()]
-        )
+        columns = [SQLBuilder.create_column(field) for field in table.columns.values()]
+        columns += [f"{shadow} TEXT" for shadow in table.folded_columns.values()]
+        commands = ",\n".join(columns)
         return f"CREATE TABLE IF NOT EXISTS {name} (\n{commands}{constraints}\n)"
 
     @staticmethod
-    def insert(table: str, data: dict | list[dict]):
+    def create_index(table: str, index: dict):
+        unique = "UNIQUE " if index.get("unique", False) else ""
+        where = f" WHERE {index['where']}" if index.get("where", None) else ""
+        columns = ", ".join(index["columns"])
+        return f"CREATE {unique}INDEX IF NOT EXISTS {index['name']} ON {table} ({columns}){where}"
+
+    @staticmethod
+    def create_counters() -> str:
+        return f"CREATE TABLE IF NOT EXISTS {COUNTERS_TABLE} (name TEXT PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0, alive INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"
+
+    @staticmethod
+    def create_count_triggers(table: str, deleted_column: str = None) -> list[str]:
+        """Build the triggers that keep the counts of `table` in the counters table: `total` records and `alive` records (`deleted_column` is NULL, or all records without it)"""
+        alive = lambda row: f"({row}.{deleted_column} IS NULL)" if deleted_column else "1"
+        where = f"WHERE name = '{table}'"
+        triggers = [
+            f"CREATE TRIGGER IF NOT EXISTS {table}__count_insert AFTER INSERT ON {table} BEGIN "
+            f"UPDATE {COUNTERS_TABLE} SET total = total + 1, alive = alive + {alive('NEW')} {where}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}__count_delete AFTER DELETE ON {table} BEGIN "
+            f"UPDATE {COUNTERS_TABLE} SET total = total - 1, alive = alive - {alive('OLD')} {where}; END",
+        ]
+        if deleted_column:
+            triggers.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}__count_update AFTER UPDATE OF {deleted_column} ON {table} BEGIN "
+                f"UPDATE {COUNTERS_TABLE} SET alive = alive + {alive('NEW')} - {alive('OLD')} {where}; END"
+            )
+        return triggers
+
+    @staticmethod
+    def recount(table: str, deleted_column: str = None, replace: bool = True) -> str:
+        """Build the statement that counts the records of `table` by scanning it and saves the counts into the counters table
+
+        Args:
+            replace (bool, optional): False to keep the existing counts of the table. Defaults to True.
+        """
+        alive = f"COUNT(*) - COUNT({deleted_column})" if deleted_column else "COUNT(*)"
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        return f"{verb} INTO {COUNTERS_TABLE} (name, total, alive) SELECT '{table}', COUNT(*), {alive} FROM {table}"
+
+    @staticmethod
+    def create_search_table(table: str, columns: list[str], tokenizer: str = None):
+        """Build an external-content FTS5 table over `columns` of `table`: the text is read from `table`, only the index is stored"""
+        tokenize = f", tokenize = '{tokenizer}'" if tokenizer else ""
+        return (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}{SEARCH_TABLE_SUFFIX} USING fts5("
+            f"{', '.join(columns)}, content = '{table}', content_rowid = '{COLUMN_ID}'{tokenize})"
+        )
+
+    @staticmethod
+    def create_search_triggers(table: str, columns: list[str]) -> list[str]:
+        """Build the triggers that keep the FTS5 table of `table` in sync with its records"""
+        fts = f"{table}{SEARCH_TABLE_SUFFIX}"
+        names = ", ".join(columns)
+        values = lambda row: ", ".join([f"{row}.{column}" for column in columns])
+        insert = f"INSERT INTO {fts} (rowid, {names}) VALUES (NEW.{COLUMN_ID}, {values('NEW')});"
+        delete = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', OLD.{COLUMN_ID}, {values('OLD')});"
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS {table}__search_insert AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}__search_delete AFTER DELETE ON {table} BEGIN {delete} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}__search_update AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+        ]
+
+    @staticmethod
+    def search(
+        table: str,
+        columns: str | list[str] = None,
+        condition: SQLCondition = None,
+        limit: int = None,
+        rank: str = None,
+    ):
+        """Build a compiled SELECT statement on records of `table` matched the full-text query `:__pquery`, the best matched first
+
+        Args:
+            rank (str, optional): Name of a column to also select the BM25 rank of each record (lower is better). Defaults to None.
+
+        Returns:
+            tuple: SQL string and its parameters (except the query)
+        """
+        fts = f"{table}{SEARCH_TABLE_SUFFIX}"
+        columns = columns or ["*"]
+        if isinstance(columns, str):
+            columns = [columns]
+        columns = ", ".join([f"{table}.{column}" for column in columns])
+        if rank:
+            columns += f", bm25({fts}) AS {rank}"
+        params = {}
+        where_clause = f"{fts} MATCH :{PARAMETER_PREFIX}query"
+        if condition:
+            where_clause += f" AND ({condition.build(params=params)[0]})"
+        return (
+            f"SELECT {columns} FROM {fts} JOIN {table} ON {table}.{COLUMN_ID} = {fts}.rowid"
+            f" WHERE {where_clause} ORDER BY bm25({fts}){_bind_clause('LIMIT', limit, params)}",
+            params,
+        )
+
+    @staticmethod
+    def aggregate_expression(metric: str | tuple[str, str]) -> str:
+        """Build the expression of a metric: a function name (on all records, like `count`) or a tuple of function and column (like `("avg", "age")`)
+
+        Raises:
+            ValueError: The function is not in `AGGREGATE_FUNCTIONS`, or requires a column
+        """
+        function, column = (metric, None) if isinstance(metric, str) else metric
+        function = str(function).lower()
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(
+                f"aggregate function [{function}] is not supported",
+                f"use one of {list(AGGREGATE_FUNCTIONS)}",
+            )
+        if column is None:
+            if function != "count":
+                raise ValueError(f"aggregate function [{function}] requires a column")
+            return "COUNT(*)"
+        distinct = "DISTINCT " if function == "count_distinct" else ""
+        return f"{AGGREGATE_FUNCTIONS[function]}({distinct}{column})"
+
+    @staticmethod
+    def insert(table: str, data: dict | list[dict], with_id: bool = False):
         if not isinstance(data, (list, tuple)):
             data = [data]
-        columns = [col for col in data[0] if col != COLUMN_ID]
+        columns = [col for col in data[0] if with_id or col != COLUMN_ID]
         return (
             f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([f':{col}' for col in columns])})",
             Array.unpack_one(data),
         )
 
     @staticmethod
-    def update(table: str, data: dict, condition: SQLCondition = None):
+    def insert_values(table: str, columns: list[str], rows: int = 1):
+        """Build an INSERT statement with `rows` rows of positional parameters in its VALUES clause"""
+        placeholders = f"({', '.join(['?'] * len(columns))})"
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * rows)}"
+
+    @staticmethod
+    def upsert(
+        table: str,
+        data: dict,
+        conflict_columns: list[str],
+        update_columns: list[str] = None,
+        update_values: dict = None,
+        with_id: bool = False,
+    ):
+        """Build an INSERT statement which updates the existing record on conflict
+
+        Args:
+            table (str): Table name
+            data (dict): Record to insert. ID column is only inserted if it is a conflict column or `with_id`
+            conflict_columns (list[str]): Columns of an unique constraint that identify the existing record
+            update_columns (list[str], optional): Columns updated from the new record. Defaults to None (all inserted columns except the conflict columns).
+            update_values (dict, optional): Values only set on update (like the update time). Defaults to None.
+            with_id (bool, optional): True to insert the ID column of the record (assigned by the caller). Defaults to False.
+
+        Returns:
+            tuple[str, dict]: SQL and its parameters
+        """
+        columns = [
+            col
+            for col in data
+            if col != COLUMN_ID or with_id or col in conflict_columns
+        ]
+        if update_columns is None:
+            update_columns = [col for col in columns if col not in conflict_columns]
+        set_clauses = [
+            f"{col} = excluded.{col}" for col in update_columns if col != COLUMN_ID
+        ]
+        params = {}
+        for col, value in (update_values or {}).items():
+            params[f"{PARAMETER_PREFIX}{col}"] = value
+            set_clauses.append(f"{col} = :{PARAMETER_PREFIX}{col}")
+        action = f"UPDATE SET {', '.join(set_clauses)}" if set_clauses else "NOTHING"
+
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([f':{col}' for col in columns])})"
+            f" ON CONFLICT ({', '.join(conflict_columns)}) DO {action}",
+            data | params,
+        )
+
+    @staticmethod
+    def update(
+        table: str, data: dict, condition: SQLCondition = None, compiled: bool = False
+    ):
         if condition is None:
             condition = SQLCondition.with_id()
 
         set_clause = ", ".join([f"{col} = :{col}" for col in data if col != COLUMN_ID])
+        if compiled:
+            where_clause, params = condition.build(compiled=True)
+            data = data | params
+        else:
+            where_clause = condition.build()
 
         return (
-            f"UPDATE {table} SET {set_clause} WHERE {condition.build()}",
+            f"UPDATE {table} SET {set_clause} WHERE {where_clause}",
             data,
         )
 
     @staticmethod
-    def delete(table: str, condition: SQLCondition = None, data: dict = None):
+    def delete(
+        table: str,
+        condition: SQLCondition = None,
+        data: dict = None,
+        compiled: bool = False,
+    ):
         if condition is None:
             return f"TRUNCATE TABLE {table}", data
-        where_clause = f" WHERE {condition.build()}"
-        return f"DELETE FROM {table}{where_clause}", data
+        if compiled:
+            where_clause, params = condition.build(compiled=True)
+            if params:
+                data = (data or {}) | params
+        else:
+            where_clause = condition.build()
+        return f"DELETE FROM {table} WHERE {where_clause}", data
 
     @staticmethod
     def join(
@@ -72,8 +264,14 @@ class SQLBuilder:
         alias=None,
         join_type: str = None,
     ):
+        """Build a JOIN clause matching `table.column` with `to_table.to_column`
+
+        Args:
+            alias (str, optional): Alias of the joined table. Defaults to None (`to_table`).
+            join_type (str, optional): Type of the join, like "left". Defaults to None ("inner").
+        """
         alias = alias or to_table
-        join_type = (str(join_type) or "inner").upper()
+        join_type = (join_type or "inner").upper()
         return f"{join_type} JOIN {to_table} AS {alias} ON {table}.{column} = {alias}.{to_column}"
 
     @staticmethod
@@ -86,17 +284,35 @@ class SQLBuilder:
         order_by: list[tuple[str, SQLOrderByDirection]] = None,
         limit: int = None,
         offset: int = None,
+        compiled: bool = False,
     ):
+        """Build a SELECT statement
+
+        Args:
+            compiled (bool, optional): True to bind condition values, limit and offset as named parameters, so the same query shape always produces the same SQL string (reusable by the sqlite3 statement cache). Defaults to False.
+
+        Returns:
+            str | tuple: SQL string, or a tuple of (SQL string, parameters) if compiled
+        """
         columns = columns or "*"
         if isinstance(columns, (list, tuple)):
             columns = ", ".join(columns)
 
         orders = [f"{item[0]} {item[1]}" for item in order_by] if order_by else []
+        params = {} if compiled else None
 
         join_clause = " " + " ".join(joins) if joins else ""
-        where_clause = f" WHERE {condition.build()}" if condition else ""
+        if condition and compiled:
+            where_clause = f" WHERE {condition.build(params=params)[0]}"
+        else:
+            where_clause = f" WHERE {condition.build()}" if condition else ""
         group_clause = f" GROUP BY {', '.join(group_by)}" if group_by else ""
         order_clause = f" ORDER BY {', '.join(orders)}" if orders else ""
-        limit_clause = f" LIMIT {limit}" if isinstance(limit, int) else ""
-        offset_clause = f" OFFSET {offset}" if isinstance(offset, int) else ""
-        return f"SELECT {columns} FROM {table}{join_clause}{where_clause}{group_clause}{order_clause}{limit_clause}{offset_clause}"
+        if compiled:
+            limit_clause = _bind_clause("LIMIT", limit, params)
+            offset_clause = _bind_clause("OFFSET", offset, params)
+        else:
+            limit_clause = f" LIMIT {limit}" if isinstance(limit, int) else ""
+            offset_clause = f" OFFSET {offset}" if isinstance(offset, int) else ""
+        sql = f"SELECT {columns} FROM {table}{join_clause}{where_clause}{group_clause}{order_clause}{limit_clause}{offset_clause}"
+        return (sql, params) if compiled else sql
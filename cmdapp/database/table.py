@@ -1,10 +1,15 @@
 import sqlite3
+from itertools import islice
+from typing import Callable, Iterable
 
 from .connection import DbConnection
-from .helper import CursorHelper, parse_error
+from .cache import QueryCache
+from .errors import ErrorStore
+from .helper import CursorHelper, parse_error, encode_page_token, decode_page_token
 from .sql import SQLBuilder
-from .condition import SQLCondition
+from .condition import SQLCondition, PARAMETER_PREFIX
 from .constants import *
+from ..types import DTypes
 from ..utils import Sanitizer
 
 from ..parser import (
@@ -15,34 +20,94 @@ from ..parser import (
 
 
 class Table:
-    def __init__(self, connection: DbConnection, table_meta: TableMeta) -> None:
+    def __init__(
+        self,
+        connection: DbConnection,
+        table_meta: TableMeta,
+        *,
+        with_id: bool = False,
+        cache: QueryCache = None,
+    ) -> None:
+        """Create a Table that performs operations on the database
+
+        Args:
+            connection (DbConnection): Connection to the database
+            table_meta (TableMeta): Description of the table
+            with_id (bool, optional): Set to insert records with their provided ID (assigned by the caller, like `ShardedTable`), instead of letting SQLite assign it. Defaults to False.
+            cache (QueryCache, optional): Cache for the results of `query`, `get` and `count`. Writes through the table invalidate it. Defaults to None (disabled).
+        """
         self.conn = connection
         self.table_meta = table_meta
         self.name = Sanitizer.as_identifier(table_meta.name)
-        self.errors = []
+        self.with_id = with_id
+        self.cache = cache
+        # number of writes through the table, to detect its changes (like `Alias` does)
+        self.writes = 0
+        # tables split across other database files, relations to them can not be joined (set by `Database`)
+        self.sharded_tables: set[str] = set()
+        self.errors = ErrorStore()
 
     def execute(self, sql: str, data=None):
-        return self.conn.execute(sql, data=data, on_error=self.on_error)
+        cursor = self.conn.execute(sql, data=data, on_error=self.on_error)
+        if not DbConnection.is_read_statement(sql):
+            self.on_write()
+        return cursor
 
-    def batch_execute(self, sql: str, data: list[dict], batch_size: int = 10):
-        return self.conn.batch_execute(
-            sql, data=data, batch_size=batch_size, on_error=self.on_error
-        )
+    def batch_execute(self, batches: Iterable[list[tuple[str, list]]], **kwargs):
+        try:
+            return self.conn.batch_execute(batches, on_error=self.on_error, **kwargs)
+        finally:
+            self.on_write()
+
+    def on_write(self):
+        self.writes += 1
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        if self.cache is not None:
+            self.cache.invalidate(self.name)
+
+    def cached_read(
+        self,
+        sql: str,
+        data,
+        convert: Callable[[sqlite3.Cursor], object],
+        related: list[str] = None,
+    ):
+        """Execute a read statement and convert its cursor to the result, or get the result from the cache
+
+        Args:
+            sql (str): SQL statement
+            data: Parameters of the statement
+            convert (Callable[[sqlite3.Cursor], object]): Get the result from the executed cursor
+            related (list[str], optional): Other tables read by the statement (joined), writes to them also invalidate the result. Defaults to None.
+        """
+        # results inside a transaction may be rolled back
+        if self.cache is None or self.conn.in_transaction():
+            return convert(self.execute(sql, data))
+        key = QueryCache.make_key(self.name, sql, data)
+        try:
+            hash(key)
+        except TypeError:
+            return convert(self.execute(sql, data))
+
+        self.cache.sync(self.conn.data_version())
+        found, result = self.cache.get(key)
+        if found:
+            return result
+        related = list(related or [])
+        generation = self.cache.generation(self.name, *related)
+        result = convert(self.execute(sql, data))
+        if not self.errors:
+            self.cache.put(key, result, generation, related)
+        return result
 
     def on_error(self, error: sqlite3.Error | Exception, sql=None, data=None):
         error_name, message = parse_error(error)
-        self.errors.append(
-            {
-                "table": self.name,
-                "type": error_name,
-                "message": message,
-                "sql": sql,
-                "data": data,
-            }
-        )
+        self.errors.add(self.name, error_name, message, sql, data)
 
     def refresh(self):
-        self.errors = []
+        self.errors = ErrorStore()
 
     def __getattr__(self, name):
         return getattr(self.table_meta, name)
@@ -54,7 +119,81 @@ class Table:
         self.refresh()
         sql = SQLBuilder.create_table(self.name, self.table_meta)
         cursor = self.execute(sql)
-        return CursorHelper.as_status(cursor, on_rowcount=False)
+        status = CursorHelper.as_status(cursor, on_rowcount=False)
+        for index in self.table_meta.indexes:
+            cursor = self.execute(SQLBuilder.create_index(self.name, index))
+            status &= CursorHelper.as_status(cursor, on_rowcount=False)
+        if self.table_meta.folded_columns:
+            status &= self._prepare_folded()
+        if self.table_meta.counted:
+            status &= self._prepare_counters()
+        if self.table_meta.searchable_columns:
+            status &= self._prepare_search()
+        return status
+
+    def _prepare_counters(self):
+        deleted_column = self.deleted_column()
+        statements = [SQLBuilder.create_counters()]
+        statements += SQLBuilder.create_count_triggers(self.name, deleted_column)
+        # counts the existing records only once, later changes are counted by the triggers
+        statements.append(SQLBuilder.recount(self.name, deleted_column, replace=False))
+
+        def _handler(conn):
+            for sql in statements:
+                conn.execute(sql)
+            return True
+
+        return bool(self.conn.with_transaction(_handler, on_error=self.on_error))
+
+    def _prepare_folded(self):
+        folded_columns = self.table_meta.folded_columns
+
+        def _handler(conn):
+            cursor = conn.execute(f"PRAGMA table_info({self.name})")
+            existing = [CursorHelper.row_values(row)[1] for row in cursor]
+            for name, shadow in folded_columns.items():
+                if shadow not in existing:
+                    # the table was created before the column is folded: add and fill its shadow column
+                    conn.execute(f"ALTER TABLE {self.name} ADD COLUMN {shadow} TEXT")
+                    cursor = conn.execute(f"SELECT {COLUMN_ID}, {name} FROM {self.name}")
+                    rows = [
+                        (TableMeta.fold(value), item_id)
+                        for item_id, value in map(CursorHelper.row_values, cursor)
+                    ]
+                    conn.executemany(
+                        f"UPDATE {self.name} SET {shadow} = ? WHERE {COLUMN_ID} = ?",
+                        rows,
+                    )
+                index = {"name": f"idx_{self.name}_{shadow}", "columns": [shadow]}
+                conn.execute(SQLBuilder.create_index(self.name, index))
+            return True
+
+        return bool(self.conn.with_transaction(_handler, on_error=self.on_error))
+
+    def _prepare_search(self):
+        columns = self.table_meta.searchable_columns
+        fts = f"{self.name}{SEARCH_TABLE_SUFFIX}"
+        statements = [
+            SQLBuilder.create_search_table(
+                self.name, columns, self.table_meta.search_tokenizer
+            )
+        ]
+        statements += SQLBuilder.create_search_triggers(self.name, columns)
+
+        def _handler(conn):
+            sql = "SELECT 1 FROM sqlite_master WHERE name = ?"
+            existed = conn.execute(sql, (fts,)).fetchone() is not None
+            for sql in statements:
+                conn.execute(sql)
+            if not existed:
+                # index the existing records, later changes are synced by the triggers
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+            return True
+
+        return bool(self.conn.with_transaction(_handler, on_error=self.on_error))
+
+    def deleted_column(self):
+        return COLUMN_DELETE if COLUMN_DELETE in self.table_meta else None
 
     # ######### DML #########
 
@@ -63,7 +202,9 @@ class Table:
         values = self.table_meta.sanitize_data(item)
         meta_values = self.table_meta.action_callback("create")
 
-        sql, data = SQLBuilder.insert(self.name, values | meta_values)
+        sql, data = SQLBuilder.insert(
+            self.name, values | meta_values, with_id=self.with_id
+        )
         cursor = self.execute(sql, data)
         return CursorHelper.as_id(cursor)
 
@@ -74,7 +215,7 @@ class Table:
         meta_values = self.table_meta.action_callback("update")
 
         sql, data = SQLBuilder.update(
-            self.name, values | meta_values | none_values, condition
+            self.name, values | meta_values | none_values, condition, compiled=True
         )
 
         if none_values or len(values) > int(COLUMN_ID in values):
@@ -91,6 +232,67 @@ class Table:
 
         return CursorHelper.as_rowcount(cursor)
 
+    def _execute_rows(self, conn, sql: str, rows: list[dict]) -> int:
+        """Run `sql` on all rows with `executemany`. If it fails, run row by row to capture the error of each failed row"""
+        conn.execute("SAVEPOINT rows")
+        try:
+            rowcount = conn.executemany(sql, rows).rowcount
+            conn.execute("RELEASE rows")
+            return rowcount
+        except sqlite3.Error:
+            conn.execute("ROLLBACK TO rows")
+            conn.execute("RELEASE rows")
+
+        rowcount = 0
+        for row in rows:
+            try:
+                rowcount += conn.execute(sql, row).rowcount
+            except sqlite3.Error as error:
+                self.on_error(error, sql=sql, data=row)
+        return rowcount
+
+    def update_batch(self, items: Iterable[dict]):
+        """Update records by their ID in one transaction.
+
+        Records are grouped by their set of changed columns and each group is run as one prepared statement with `executemany`.
+        Errors are captured per record, the other records are still updated.
+
+        Args:
+            items (Iterable[dict]): Records to update, each must contain the ID column
+
+        Returns:
+            int: Number of updated records
+        """
+        self.refresh()
+        meta_values = self.table_meta.action_callback("update")
+        groups: dict[frozenset, list[dict]] = {}
+        for item in items:
+            none_values = {k: v for k, v in item.items() if v is None}
+            values = self.table_meta.sanitize_data(item) | none_values
+            if COLUMN_ID not in values or len(values) == 1:
+                self.on_error(
+                    ValueError(
+                        "Missing ID or attributes to update or all provided attributes are invalid"
+                    ),
+                    data=item,
+                )
+                continue
+            data = values | meta_values
+            groups.setdefault(frozenset(data), []).append(data)
+
+        def _handler(conn):
+            count = 0
+            for rows in groups.values():
+                sql, _ = SQLBuilder.update(self.name, rows[0], compiled=True)
+                count += self._execute_rows(conn, sql, rows)
+            return count
+
+        if not groups:
+            return 0
+        count = self.conn.with_transaction(_handler, on_error=self.on_error) or 0
+        self.on_write()
+        return count
+
     def delete(self, condition: SQLCondition = None, permanent: bool = False):
         self.refresh()
         if condition is None:
@@ -103,9 +305,11 @@ class Table:
 
         meta_values = self.table_meta.action_callback("delete")
         if permanent or not meta_values:
-            sql, data = SQLBuilder.delete(self.name, condition)
+            sql, data = SQLBuilder.delete(self.name, condition, compiled=True)
         else:
-            sql, data = SQLBuilder.update(self.name, meta_values, condition)
+            sql, data = SQLBuilder.update(
+                self.name, meta_values, condition, compiled=True
+            )
 
         cursor = self.execute(sql, data)
 
@@ -113,7 +317,7 @@ class Table:
 
     def insert_all(self, items: list[dict]):
         self.refresh()
-        errors = []
+        errors = ErrorStore()
         count = 0
         for item in items:
             new_id = self.insert(item)
@@ -122,47 +326,203 @@ class Table:
         self.errors = errors
         return count
 
-    def insert_batch(self, items: list[dict], batch_size: int = 10):
+    def _sanitized_batches(self, items: Iterable[dict], batch_size: int):
+        iterator = iter(items)
+        while chunk := list(islice(iterator, batch_size)):
+            meta_values = self.table_meta.action_callback("create")
+            yield [self.table_meta.sanitize_data(item) | meta_values for item in chunk]
+
+    def _insert_statements(
+        self, items: Iterable[dict], batch_size: int, multi_values: bool
+    ):
+        for values in self._sanitized_batches(items, batch_size):
+            if not multi_values:
+                sql, _ = SQLBuilder.insert(self.name, values[0], with_id=self.with_id)
+                yield [(sql, values)]
+                continue
+
+            groups: dict[tuple, list[dict]] = {}
+            for value in values:
+                columns = tuple(
+                    col for col in value if self.with_id or col != COLUMN_ID
+                )
+                groups.setdefault(columns, []).append(value)
+            statements = []
+            for columns, rows in groups.items():
+                size = max(1, self.conn.max_variables() // max(len(columns), 1))
+                for start in range(0, len(rows), size):
+                    part = rows[start : start + size]
+                    sql = SQLBuilder.insert_values(self.name, list(columns), len(part))
+                    params = [row[col] for row in part for col in columns]
+                    statements.append((sql, [params]))
+            yield statements
+
+    def insert_batch(
+        self,
+        items: Iterable[dict],
+        batch_size: int = 1000,
+        *,
+        commit_rows: int = None,
+        commit_interval: float = None,
+        multi_values: bool = False,
+        on_progress: Callable[[int, float], None] = None,
+    ):
+        """Insert records batch by batch. A batch is all or nothing: if one of its records fails, the batch is skipped and the error is captured.
+
+        Records are sanitized when their batch is sent, so `items` can be a generator of any size.
+
+        Args:
+            items (Iterable[dict]): Records to insert
+            batch_size (int, optional): Number of records in a batch. Defaults to 1000.
+            commit_rows (int, optional): Commit after at least this number of inserted records, 0 to commit once at the end. Defaults to None (commit after each batch).
+            commit_interval (float, optional): Commit after at least this number of milliseconds. Defaults to None.
+            multi_values (bool, optional): Insert records of a batch with multi-row VALUES statements (as many rows as the limit of parameters allows) instead of one statement per record. Records are grouped by their columns. Defaults to False.
+            on_progress (Callable[[int, float], None], optional): Called after each batch with the number of inserted records and the rate (records/second). Defaults to None.
+
+        Returns:
+            int: Number of inserted records
+        """
         self.refresh()
-        values = self.table_meta.sanitize_data(*items)
+        batches = self._insert_statements(items, batch_size, multi_values)
+        return self.batch_execute(
+            batches,
+            commit_rows=commit_rows,
+            commit_interval=commit_interval,
+            on_progress=on_progress,
+        )
+
+    def _upsert_statement(
+        self, data: dict, conflict_columns: list[str], update_columns: list[str]
+    ):
+        if update_columns is None:
+            # keep the values set on creation (like the creation time) of the existing record
+            create_columns = self.table_meta.action_callback("create")
+            update_columns = [
+                col
+                for col in data
+                if col not in conflict_columns and col not in create_columns
+            ]
+        else:
+            # shadow columns follow their folded columns
+            folded_columns = self.table_meta.folded_columns
+            update_columns = list(update_columns) + [
+                folded_columns[col]
+                for col in update_columns
+                if col in folded_columns and folded_columns[col] in data
+            ]
+        update_values = self.table_meta.action_callback("update")
+        return SQLBuilder.upsert(
+            self.name,
+            data,
+            conflict_columns,
+            update_columns,
+            update_values,
+            with_id=self.with_id,
+        )
+
+    def upsert(
+        self,
+        item: dict,
+        conflict_columns: list[str],
+        update_columns: list[str] = None,
+    ):
+        """Insert a record, or update the existing record which has same values on `conflict_columns`
+
+        Args:
+            item (dict): Record to insert or update
+            conflict_columns (list[str]): Columns of an unique constraint that identify the existing record
+            update_columns (list[str], optional): Columns to update on the existing record. Defaults to None (all provided columns except `conflict_columns`).
+
+        Returns:
+            int: Number of inserted or updated records
+        """
+        self.refresh()
+        values = self.table_meta.sanitize_data(item)
         meta_values = self.table_meta.action_callback("create")
+        sql, data = self._upsert_statement(
+            values | meta_values, conflict_columns, update_columns
+        )
+        cursor = self.execute(sql, data)
+        return CursorHelper.as_rowcount(cursor)
 
-        sql, data = SQLBuilder.insert(self.name, [v | meta_values for v in values])
-        batched_results = self.batch_execute(sql, data, batch_size=batch_size)
-        count = 0
-        for cursor in batched_results:
-            count += CursorHelper.as_rowcount(cursor)
-        return count
+    def upsert_batch(
+        self,
+        items: Iterable[dict],
+        conflict_columns: list[str],
+        update_columns: list[str] = None,
+        batch_size: int = 1000,
+        **kwargs,
+    ):
+        """Insert or update records batch by batch, each batch is one prepared statement run by `executemany`. See `upsert` and `insert_batch`
+
+        Returns:
+            int: Number of inserted or updated records
+        """
+        self.refresh()
+
+        def _statements():
+            for values in self._sanitized_batches(items, batch_size):
+                sql, data = self._upsert_statement(
+                    values[0], conflict_columns, update_columns
+                )
+                params = {
+                    k: v for k, v in data.items() if k.startswith(PARAMETER_PREFIX)
+                }
+                yield [(sql, [value | params for value in values])]
+
+        return self.batch_execute(_statements(), **kwargs)
 
     def delete_by_id(self, *item_id: int, permanent: bool = False):
-        condition = SQLCondition(COLUMN_ID, SQLOperators.IN, list(item_id))
-        return self.delete(condition, permanent=permanent)
+        """Delete records by their IDs. Many IDs are deleted by chunks of `IN_LIST_CHUNK_SIZE` in one transaction"""
+        item_ids = list(dict.fromkeys(item_id))
+        if len(item_ids) <= IN_LIST_CHUNK_SIZE:
+            condition = SQLCondition(COLUMN_ID, SQLOperators.IN, item_ids)
+            return self.delete(condition, permanent=permanent)
+
+        self.refresh()
+        meta_values = self.table_meta.action_callback("delete")
+
+        def _handler(conn):
+            count = 0
+            for start in range(0, len(item_ids), IN_LIST_CHUNK_SIZE):
+                chunk = item_ids[start : start + IN_LIST_CHUNK_SIZE]
+                condition = SQLCondition(COLUMN_ID, SQLOperators.IN, chunk)
+                if permanent or not meta_values:
+                    sql, data = SQLBuilder.delete(self.name, condition, compiled=True)
+                else:
+                    sql, data = SQLBuilder.update(
+                        self.name, meta_values, condition, compiled=True
+                    )
+                count += self.conn.run(conn, sql, data).rowcount
+            return count
+
+        count = self.conn.with_transaction(_handler, on_error=self.on_error)
+        self.on_write()
+        return count if count is not None else CursorHelper.as_rowcount(None)
 
     # ######### Query #########
 
     def get(self, item_id: int):
         self.refresh()
-        sql = SQLBuilder.select(
+        sql, data = SQLBuilder.select(
             self.name,
+            columns=self.selected_columns(),
             condition=SQLCondition.with_id(item_id),
+            compiled=True,
         )
-        cursor = self.execute(sql)
-        return CursorHelper.as_object(cursor)
+        return self.cached_read(sql, data, CursorHelper.as_object)
 
     def get_columns(self, columns: list[str], item_ids: list[int] = None):
         if not columns:
             return {}
         self.refresh()
-        sql = SQLBuilder.select(
-            self.name,
-            columns=columns + [COLUMN_ID],
-            condition=(
-                SQLCondition(COLUMN_ID, SQLOperators.IN, item_ids) if item_ids else None
-            ),
-        )
-        cursor = self.execute(sql)
-
-        records = CursorHelper.as_objects(cursor)
+        if item_ids:
+            records = self.select_in(COLUMN_ID, item_ids, columns + [COLUMN_ID])
+        else:
+            sql, data = SQLBuilder.select(
+                self.name, columns=columns + [COLUMN_ID], compiled=True
+            )
+            records = CursorHelper.as_objects(self.execute(sql, data))
         return {
             record.pop(COLUMN_ID): (record[columns[0]] if len(columns) == 1 else record)
             for record in records
@@ -170,24 +530,197 @@ class Table:
 
     def which_exists(self, *item_id: int, with_deleted=True):
         self.refresh()
-        condition = SQLCondition(COLUMN_ID, SQLOperators.IN, list(item_id))
+        condition = None
         if not with_deleted and COLUMN_DELETE in self.table_meta:
-            condition = condition.AND(COLUMN_DELETE, SQLOperators.IS_NULL)
+            condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+        records = self.select_in(COLUMN_ID, item_id, [COLUMN_ID], condition)
+        if self.errors:
+            return None
+        return sorted(record[COLUMN_ID] for record in records)
 
-        sql = SQLBuilder.select(self.name, columns=COLUMN_ID, condition=condition)
-        cursor = self.execute(sql)
-        return CursorHelper.as_values(cursor)
+    def select_in(
+        self,
+        column: str,
+        values: Iterable,
+        columns: list[str] = None,
+        condition: SQLCondition = None,
+        *,
+        chunk_size: int = None,
+        temp_table_threshold: int = None,
+    ) -> list:
+        """Select the records with `column` in `values` (and matched `condition`). Long lists are not bound into one `IN (...)`, which hits the limit of SQL parameters:
+        - Up to `chunk_size` values: one statement
+        - Up to `temp_table_threshold` values: one statement per chunk of `chunk_size` values, the results are concatenated
+        - More: the values are loaded into a temporary table and joined in one statement
 
-    def query(
+        Args:
+            column (str): Column to match
+            values (Iterable): Values to match, duplicates are ignored
+            columns (list[str], optional): Columns to select. Defaults to None (all columns).
+            condition (SQLCondition, optional): Other condition on the records. Defaults to None.
+            chunk_size (int, optional): Defaults to `IN_LIST_CHUNK_SIZE`.
+            temp_table_threshold (int, optional): Defaults to `IN_LIST_TEMP_TABLE_THRESHOLD`.
+
+        Returns:
+            list: Matched records, in no specific order
+        """
+        values = list(dict.fromkeys(values))
+        columns = columns or self.selected_columns()
+        chunk_size = min(
+            chunk_size or IN_LIST_CHUNK_SIZE, self.conn.max_variables() // 2
+        )
+        if temp_table_threshold is None:
+            temp_table_threshold = IN_LIST_TEMP_TABLE_THRESHOLD
+        if not values:
+            return []
+        if len(values) > max(temp_table_threshold, chunk_size):
+            return self._select_in_temp_table(column, values, columns, condition)
+
+        records = []
+        for start in range(0, len(values), chunk_size):
+            part = SQLCondition(
+                column, SQLOperators.IN, values[start : start + chunk_size]
+            )
+            if condition:
+                part.AND_GROUP(condition)
+            sql, data = SQLBuilder.select(
+                self.name, columns=columns, condition=part, compiled=True
+            )
+            records.extend(CursorHelper.as_objects(self.execute(sql, data)))
+        return records
+
+    def _select_in_temp_table(
+        self,
+        column: str,
+        values: list,
+        columns: list[str] = None,
+        condition: SQLCondition = None,
+    ) -> list:
+        temp_table = f"temp.{IN_LIST_TEMP_TABLE}"
+        table_columns = self.table_meta.columns
+        # qualify the columns of this table, the temporary table has a `value` column
+        selected = [f"{self.name}.{c}" for c in columns]
+        if condition:
+            condition = condition.qualify(self.name, table_columns)
+        sql, data = SQLBuilder.select(
+            self.name,
+            columns=selected,
+            condition=condition,
+            joins=[SQLBuilder.join(self.name, column, temp_table, "value", alias="v")],
+            compiled=True,
+        )
+
+        def _handler(conn):
+            # the temporary table is private to the connection, so it is filled on the reader without taking the writer
+            conn.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {IN_LIST_TEMP_TABLE} (value PRIMARY KEY) WITHOUT ROWID"
+            )
+            try:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {temp_table} (value) VALUES (?)",
+                    ((value,) for value in values),
+                )
+                return self.conn.run(conn, sql, data).fetchall()
+            finally:
+                conn.execute(f"DELETE FROM {temp_table}")
+
+        return (
+            self.conn.with_reader(
+                _handler, on_error=lambda e: self.on_error(e, sql, data)
+            )
+            or []
+        )
+
+    @staticmethod
+    def keyset_order(
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+    ) -> list[tuple[str, SQLOrderByDirection]]:
+        """Get the sort keys used for keyset pagination: the `order_by` columns followed by the ID column (as tie-breaker)
+
+        Raises:
+            ValueError: The columns are not sorted in same direction
+        """
+        order_by = list(order_by or [])
+        directions = {direction.upper() for _, direction in order_by}
+        if len(directions) > 1:
+            raise ValueError(
+                f"keyset pagination requires all columns in [order_by] are sorted in same direction",
+                f"got [{order_by}]",
+            )
+        direction = directions.pop() if directions else SQLOrderByDirection.ASC
+        if COLUMN_ID not in [column for column, _ in order_by]:
+            order_by.append((COLUMN_ID, direction))
+        return order_by
+
+    @staticmethod
+    def next_page_token(
+        record: dict, order_by: list[tuple[str, SQLOrderByDirection]] = None
+    ) -> str | None:
+        """Create the token to query the page after the one ends with `record` (see `after` in `query`)
+
+        Args:
+            record (dict): Last record of the current page, it must contain the sort keys (the `order_by` columns and the ID column)
+            order_by (list[tuple[str, SQLOrderByDirection]], optional): Same as `order_by` passed to `query`. Defaults to None (by ID).
+
+        Raises:
+            ValueError: The record misses some sort keys
+
+        Returns:
+            str | None: The token, None if no record
+        """
+        if not record:
+            return None
+        keys = [column for column, _ in Table.keyset_order(order_by)]
+        missing = [column for column in keys if column not in record]
+        if missing:
+            raise ValueError(
+                f"missing sort keys {missing} on the record to create page token",
+                "include them in the queried columns",
+            )
+        return encode_page_token([record[column] for column in keys])
+
+    def _keyset_condition(
+        self,
+        after: str,
+        condition: SQLCondition,
+        keys: list[tuple[str, SQLOrderByDirection]],
+    ) -> SQLCondition:
+        values = decode_page_token(after)
+        columns = [column for column, _ in keys]
+        if len(values) != len(columns):
+            raise ValueError(
+                f"page token [{after}] does not match the sort keys {columns}",
+                "query the next page with same [order_by] as the previous page",
+            )
+        operator = (
+            SQLOperators.LESS_THAN
+            if keys[0][1].upper() == SQLOrderByDirection.DESC
+            else SQLOperators.GREATER_THAN
+        )
+        if len(columns) == 1:
+            columns, values = columns[0], values[0]
+        keyset_condition = SQLCondition(columns, operator, values)
+        if condition:
+            keyset_condition.AND_GROUP(condition)
+        return keyset_condition
+
+    def selected_columns(self, columns: str | list[str] = None) -> list[str]:
+        """Get the columns to select: the filtered `columns` (see `TableMeta.filter_columns`) or all columns of the table.
+        Shadow columns of `folded` columns are never selected, they are only used to match values
+        """
+        return self.table_meta.filter_columns(columns) or list(self.table_meta.columns)
+
+    def _select_query(
         self,
         columns: str | list[str] = None,
         condition: SQLCondition = None,
         order_by: list[tuple[str, SQLOrderByDirection]] = None,
         page_size: int = None,
         page_index: int = 1,
+        after: str = None,
+        expand: bool | list[str] = False,
     ):
-        self.refresh()
-        columns = self.table_meta.filter_columns(columns)
+        columns = self.selected_columns(columns)
         if page_size is not None and int(page_size) > 0:
             limit = page_size
             offset = page_size * (page_index - 1)
@@ -195,21 +728,280 @@ class Table:
             limit = None
             offset = None
 
-        sql = SQLBuilder.select(
+        if after is not None:
+            # keyset (seek) pagination: start right after the sort keys in the token
+            order_by = Table.keyset_order(order_by)
+            condition = self._keyset_condition(after, condition, order_by)
+            offset = None
+            columns += [c for c, _ in order_by if c not in columns]
+
+        relations = self.expanded_relations(expand)
+        joins = None
+        if relations:
+            # qualify the columns of this table, they may also be in the related tables
+            table_columns = self.table_meta.columns
+            columns = [f"{self.name}.{c}" for c in columns]
+            joins = []
+            for column, relation in relations.items():
+                alias = f"{relation['table']}_{column}"
+                columns.append(f"{alias}.{relation['display']} AS {relation['name']}")
+                joins.append(
+                    SQLBuilder.join(
+                        self.name,
+                        column,
+                        relation["table"],
+                        relation["column"],
+                        alias=alias,
+                        join_type="left",
+                    )
+                )
+            if condition:
+                condition = condition.qualify(self.name, table_columns)
+            order_by = [
+                (f"{self.name}.{c}" if c in table_columns else c, direction)
+                for c, direction in order_by or []
+            ]
+
+        return SQLBuilder.select(
             self.name,
             columns=columns,
             condition=condition,
+            joins=joins,
             order_by=order_by,
             limit=limit,
             offset=offset,
+            compiled=True,
         )
-        cursor = self.execute(sql)
 
-        return CursorHelper.as_objects(cursor)
+    def expanded_relations(self, expand: bool | list[str] = False) -> dict[str, dict]:
+        """Get the relations to join in a query
+
+        Args:
+            expand (bool | list[str], optional): True for all relations of the table, or the foreign key columns (or the displayed names) of some relations. Defaults to False.
+
+        Raises:
+            ValueError: Some columns are not in the relations, or their related tables are sharded
+        """
+        relations = self.table_meta.relations
+        if not expand:
+            return {}
+        if expand is True:
+            result = dict(relations)
+        else:
+            if isinstance(expand, str):
+                expand = [expand]
+            names = {r["name"]: column for column, r in relations.items()}
+            result = {}
+            for key in expand:
+                column = key if key in relations else names.get(key, None)
+                if column is None:
+                    raise ValueError(
+                        f"column [{key}] has no relation in table [{self.name}]",
+                        f"use one of {list(relations)}",
+                    )
+                result[column] = relations[column]
+        for column, relation in result.items():
+            if relation["table"] in self.sharded_tables:
+                raise ValueError(
+                    f"relation [{column}] can not be expanded, table [{relation['table']}] is sharded",
+                    "query the related table separately",
+                )
+        return result
+
+    def query(
+        self,
+        columns: str | list[str] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        page_size: int = None,
+        page_index: int = 1,
+        after: str = None,
+        layout: str = "rows",
+        expand: bool | list[str] = False,
+    ):
+        """Query records
+
+        Args:
+            columns (str | list[str], optional): Column filters, see `TableMeta.filter_columns`. Defaults to None (all columns).
+            condition (SQLCondition, optional): Condition to filter records. Defaults to None.
+            order_by (list[tuple[str, SQLOrderByDirection]], optional): Columns to sort records. Defaults to None.
+            page_size (int, optional): Number of records per page. Defaults to None (no paging).
+            page_index (int, optional): Page index (based 1), used with `page_size`. Slow on far pages because skipped records are still scanned. Defaults to 1.
+            after (str, optional): Token from `Table.next_page_token` on the last record of the previous page. If provided, query the records right after it by their sort keys (keyset pagination) and ignore `page_index`, so every page costs the same. Defaults to None.
+            layout (str, optional): "rows" for a list of records or "columns" for a `ColumnSet` (values stored column by column). Defaults to "rows".
+            expand (bool | list[str], optional): Relations to join, see `expanded_relations`. Each record gets the displayed value of its related record (like `team_name`) in the same query, instead of one lookup per record. Defaults to False.
+
+        Returns:
+            list | ColumnSet: Matched records
+        """
+        self.refresh()
+        try:
+            sql, data = self._select_query(
+                columns, condition, order_by, page_size, page_index, after, expand
+            )
+            related = [r["table"] for r in self.expanded_relations(expand).values()]
+        except ValueError as error:
+            self.on_error(error)
+            sql, data = None, None
+
+        if layout == "columns":
+            convert = lambda cursor: CursorHelper.as_columns(
+                cursor, self.table_meta.columns_dtypes
+            )
+        else:
+            convert = CursorHelper.as_objects
+        if sql is None:
+            return convert(None)
+        return self.cached_read(sql, data, convert, related)
+
+    def aggregate(
+        self,
+        group_by: list[str] = None,
+        metrics: dict[str, str | tuple[str, str]] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        limit: int = None,
+        layout: str = "rows",
+    ):
+        """Group records and compute metrics of each group in SQLite, without fetching the records
+
+        Args:
+            group_by (list[str], optional): Columns to group records by. Defaults to None (one group of all records).
+            metrics (dict[str, str | tuple[str, str]], optional): Map each metric name to a function (`count`) or a tuple of function and column (`("avg", "age")`), see `AGGREGATE_FUNCTIONS`. Defaults to None (`{"count": "count"}`).
+            condition (SQLCondition, optional): Condition to filter records before grouping. Defaults to None.
+            order_by (list[tuple[str, SQLOrderByDirection]], optional): Group columns or metric names to sort the groups. Defaults to None (by the group columns).
+            limit (int, optional): Maximum number of groups. Defaults to None.
+            layout (str, optional): "rows" for a list of groups or "columns" for a `ColumnSet`. Defaults to "rows".
+
+        Returns:
+            list | ColumnSet: One record per group, with the group columns and the metrics
+        """
+        self.refresh()
+        group_by = list(group_by or [])
+        metrics = metrics or {"count": "count"}
+        try:
+            for column in group_by + [
+                m[1] for m in metrics.values() if not isinstance(m, str)
+            ]:
+                if column not in self.table_meta:
+                    raise ValueError(
+                        f"column [{column}] is not in table [{self.name}]",
+                        f"use one of {list(self.table_meta.columns)}",
+                    )
+            names = {
+                Sanitizer.as_identifier(name): SQLBuilder.aggregate_expression(metric)
+                for name, metric in metrics.items()
+            }
+            for column, _ in order_by or []:
+                if column not in group_by and column not in names:
+                    raise ValueError(
+                        f"sort key [{column}] is not a group column or a metric",
+                        f"use one of {group_by + list(names)}",
+                    )
+            sql, data = SQLBuilder.select(
+                self.name,
+                columns=group_by
+                + [f"{expression} AS {name}" for name, expression in names.items()],
+                condition=condition,
+                group_by=group_by,
+                order_by=order_by
+                or [(column, SQLOrderByDirection.ASC) for column in group_by],
+                limit=limit,
+                compiled=True,
+            )
+        except ValueError as error:
+            self.on_error(error)
+            sql, data = None, None
+
+        if layout == "columns":
+            dtypes = {c: self.table_meta.columns_dtypes[c] for c in group_by}
+            convert = lambda cursor: CursorHelper.as_columns(cursor, dtypes)
+        else:
+            convert = CursorHelper.as_objects
+        if sql is None:
+            return convert(None)
+        return self.cached_read(sql, data, convert)
+
+    def iter_query(
+        self,
+        columns: str | list[str] = None,
+        condition: SQLCondition = None,
+        order_by: list[tuple[str, SQLOrderByDirection]] = None,
+        page_size: int = None,
+        page_index: int = 1,
+        after: str = None,
+        chunk_size: int = None,
+        expand: bool | list[str] = False,
+    ):
+        """Same as `query` but return a generator over the records. Records are fetched `chunk_size` at a time, so the memory usage does not depend on the number of records
+
+        Args:
+            chunk_size (int, optional): Number of records fetched each time. Defaults to `DEFAULT_CHUNK_SIZE`.
+        """
+        self.refresh()
+        try:
+            sql, data = self._select_query(
+                columns, condition, order_by, page_size, page_index, after, expand
+            )
+            cursor = self.execute(sql, data)
+        except ValueError as error:
+            self.on_error(error)
+            cursor = None
+
+        return CursorHelper.as_stream(cursor, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    @staticmethod
+    def search_query(text: str) -> str:
+        """Convert text into a FTS5 query that matches records containing all of its words. Words are quoted, so FTS5 operators and punctuation are matched as is"""
+        words = str(text).split()
+        return " ".join(['"' + word.replace('"', '""') + '"' for word in words])
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        columns: str | list[str] = None,
+        with_deleted: bool = False,
+        raw: bool = False,
+        rank: str = None,
+    ):
+        """Full-text search on the `searchable` columns, see `TableMeta.searchable_columns`
+
+        Args:
+            query (str): Words to search. See `search_query`
+            limit (int, optional): Maximum number of records. Defaults to 20.
+            columns (str | list[str], optional): Column filters, see `TableMeta.filter_columns`. Defaults to None (all columns).
+            with_deleted (bool, optional): Set to also search on deleted records. Defaults to False.
+            raw (bool, optional): Set to pass `query` to FTS5 as is, to use its query syntax (`OR`, `NOT`, `prefix*`, `column: word`...). Defaults to False.
+            rank (str, optional): Name of a column to add the BM25 rank of each record (lower is better). Defaults to None.
+
+        Returns:
+            list: Matched records, the best matched (by BM25) first
+        """
+        self.refresh()
+        if not self.table_meta.searchable_columns:
+            self.on_error(
+                ValueError(
+                    f"table [{self.name}] has no searchable columns",
+                    "declare columns with `searchable`",
+                )
+            )
+            return []
+        query = query if raw else Table.search_query(query)
+        if not query:
+            return []
+        condition = None
+        if not with_deleted and COLUMN_DELETE in self.table_meta:
+            condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+        sql, data = SQLBuilder.search(
+            self.name, self.selected_columns(columns), condition, limit, rank
+        )
+        data[f"{PARAMETER_PREFIX}query"] = query
+        return self.cached_read(sql, data, CursorHelper.as_objects)
 
     def first(self):
         self.refresh()
-        sql = SQLBuilder.select(self.name, columns="*", limit=1)
+        sql = SQLBuilder.select(self.name, columns=self.selected_columns(), limit=1)
         cursor = self.execute(sql)
         return CursorHelper.as_object(cursor)
 
@@ -217,21 +1009,97 @@ class Table:
         self.refresh()
         sql = SQLBuilder.select(
             self.name,
-            columns="*",
+            columns=self.selected_columns(),
             order_by=[("ROWID", SQLOrderByDirection.DESC)],
             limit=1,
         )
         cursor = self.execute(sql)
         return CursorHelper.as_object(cursor)
 
+    def counter_column(self, condition: SQLCondition = None) -> str | None:
+        """Get the column of the counters table that holds the count for `condition`: `total` for no condition, `alive` for the not deleted filter, None if the count is not maintained"""
+        if not self.table_meta.counted:
+            return None
+        if condition is None:
+            return "total"
+        deleted_column = self.deleted_column()
+        if deleted_column and (
+            condition.build()
+            == SQLCondition(deleted_column, SQLOperators.IS_NULL).build()
+        ):
+            return "alive"
+        return None
+
     def count(self, condition: SQLCondition = None):
+        """Count the records matched `condition`. With `TableMeta.counted`, counting all (or all not deleted) records reads the maintained count instead of scanning the table"""
         self.refresh()
-        sql = SQLBuilder.select(self.name, columns="COUNT(*)", condition=condition)
-        cursor = self.execute(sql)
-        return CursorHelper.as_value(cursor)
+        column = self.counter_column(condition)
+        if column:
+            sql, data = SQLBuilder.select(
+                COUNTERS_TABLE,
+                columns=column,
+                condition=SQLCondition("name", SQLOperators.EQUAL, self.name),
+                compiled=True,
+            )
+        else:
+            sql, data = SQLBuilder.select(
+                self.name, columns="COUNT(*)", condition=condition, compiled=True
+            )
+        return self.cached_read(sql, data, CursorHelper.as_value)
+
+    def recount(self):
+        """Count the records by scanning the table and overwrite the maintained counts, e.g. after the table was changed with the triggers dropped
+
+        Returns:
+            dict: `total` and `alive` counts, or None if the counts are not maintained (see `TableMeta.counted`) or on errors
+        """
+        self.refresh()
+        if not self.table_meta.counted:
+            return None
+        deleted_column = self.deleted_column()
+        cursor = self.execute(SQLBuilder.recount(self.name, deleted_column))
+        if cursor is None:
+            return None
+        sql, data = SQLBuilder.select(
+            COUNTERS_TABLE,
+            columns=["total", "alive"],
+            condition=SQLCondition("name", SQLOperators.EQUAL, self.name),
+            compiled=True,
+        )
+        return CursorHelper.as_object(self.execute(sql, data))
+
+    def match_condition(
+        self, filters: dict, condition: SQLCondition = None
+    ) -> SQLCondition | None:
+        """Build a condition that matches records with the values in `filters`, added to `condition`.
+        `folded` columns are matched accent-insensitively on their (indexed) shadow columns
+
+        Args:
+            filters (dict): Map each column to its value
+            condition (SQLCondition, optional): Condition to add to. Defaults to None.
+
+        Raises:
+            ValueError: A column is not in the table
+        """
+        for column_name, value in (filters or {}).items():
+            if column_name not in self.table_meta:
+                raise ValueError(
+                    f"column [{column_name}] is not in table [{self.name}]",
+                    f"use one of {list(self.table_meta.columns)}",
+                )
+            shadow = self.table_meta.folded_columns.get(column_name, None)
+            if shadow:
+                part = (shadow, SQLOperators.EQUAL, TableMeta.fold(value))
+            else:
+                dtype = self.table_meta.columns_dtypes[column_name]
+                value = DTypes.cast(value, dtype, value)
+                part = (column_name, SQLOperators.EQUAL, value)
+            condition = condition.AND(*part) if condition else SQLCondition(*part)
+        return condition
 
     def translate(self, column_name: str, *values, full_record: bool = False) -> dict:
-        """From values on a column, get the ID of matched records. This method is best to call with a UNIQUE column
+        """From values on a column, get the ID of matched records. This method is best to call with a UNIQUE column.
+        On a `folded` column, values are matched accent-insensitively through its shadow column
 
         Args:
             column_name (str): Name of column to matched values
@@ -244,19 +1112,29 @@ class Table:
         if not values:
             return {}
         self.refresh()
-        condition = SQLCondition(column_name, SQLOperators.IN, values)
-        sql = SQLBuilder.select(
-            self.name,
-            columns=None if full_record else [COLUMN_ID, column_name],
-            condition=condition,
+        shadow = self.table_meta.folded_columns.get(column_name, None)
+        if shadow:
+            # accent-insensitive: match the folded values on the (indexed) shadow column
+            lookup = {}
+            for value in values:
+                lookup.setdefault(TableMeta.fold(value), []).append(value)
+            key_column = shadow
+            # shadow columns are not selected, fold the matched values again
+            get_key = lambda record: TableMeta.fold(record[column_name])
+        else:
+            lookup = {value: [value] for value in values}
+            key_column = column_name
+            get_key = lambda record: record[column_name]
+        match_records = self.select_in(
+            key_column, list(lookup), None if full_record else [COLUMN_ID, column_name]
         )
-        cursor = self.execute(sql)
-        match_records = CursorHelper.as_objects(cursor)
         if not match_records:
             return {}
         dictionary = {}
         for record in match_records:
-            dictionary.setdefault(record[column_name], []).append(
-                record if full_record else record[COLUMN_ID]
-            )
+            key = get_key(record)
+            for value in lookup.get(key, [key]):
+                dictionary.setdefault(value, []).append(
+                    record if full_record else record[COLUMN_ID]
+                )
         return dictionary
@@ -1,6 +1,6 @@
 from cmdapp.base import *
 from cmdapp.core import start_app
-from cmdapp.database import Database
+from cmdapp.database import Database, QueryCache
 from cmdapp.parser.table import TableMeta
 from cmdapp.render import Template, ResponseFormatter
 
@@ -9,7 +9,11 @@ DATABASE_SCHEMA = [
         name="person",
         plural="people",
         columns={
-            "name": "n (*str[telex]): name of the record",
+            "name": {
+                "annotation": "n (*str[telex]): name of the record",
+                "searchable": True,
+                "folded": True,
+            },
             "team_id": "t, team (*int): id of the team that the record belongs to",
             "gender": 'g (str: ["male", "female", "other"]): gender',
             "dob": {
@@ -19,6 +23,10 @@ DATABASE_SCHEMA = [
         },
         meta_columns=["created_at", "updated_at", "deleted_at"],
         constraints=["UNIQUE(name, team_id)"],
+        indexes=[{"columns": ["team_id"], "where": "deleted_at IS NULL"}],
+        counted=True,
+        relations={"team_id": "team.name"},
+        search_tokenizer="trigram",
     ),
     TableMeta(
         name="team",
@@ -46,7 +54,7 @@ TEMPLATES = {
 
 
 def prepare_sample_database():
-    database = Database(":memory:", DATABASE_SCHEMA)
+    database = Database(":memory:", DATABASE_SCHEMA, cache=QueryCache())
     good = database.prepare()
     if not good:
         errors = database.get_errors()
@@ -3,6 +3,9 @@ COLUMN_CREATE = "created_at"
 COLUMN_UPDATE = "updated_at"
 COLUMN_DELETE = "deleted_at"
 
+# Suffix of the shadow column that keeps the ascii-folded values of a `folded` column
+FOLDED_COLUMN_SUFFIX = "__ascii"
+
 EXCLUDE_LITERAL = "^"
 ALL_LITERAL = "*"
 META_COLUMN_LITERAL = "meta"
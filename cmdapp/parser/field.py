@@ -17,6 +17,9 @@ FIELD_ATTRIBUTES_TYPES = dict(
     nargs=(int, str),
     action=str,
     metavar=str,  # display object name on help message like --path PATH
+    searchable=bool,  # full-text search on the column, see `TableMeta.searchable_columns`
+    folded=bool,  # accent-insensitive lookups on the column, see `TableMeta.folded_columns`
+    completer=None,  # tab completion function of the argument, see `completer` of `Cmd2ArgumentParser.add_argument`
     # const=None,  # depend on dtype
 )
 
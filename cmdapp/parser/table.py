@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Callable
 
 from ..types import DTypes
-from ..utils import Hash, Array
+from ..utils import Hash, Array, Sanitizer, Text
 
 from .constants import *
 from .field import FieldMeta
@@ -43,6 +43,80 @@ class TableHelper:
         # TODO
         return constraints or []
 
+    @staticmethod
+    def parse_indexes(
+        indexes: list[str | list | dict], table_name: str
+    ) -> list[dict]:
+        """Parse the declared indexes of a table into dicts with keys:
+        - `name`: Name of the index. Defaults to `idx_<table>_<columns>`
+        - `columns`: Columns or expressions (like `lower(name)`) of the index
+        - `unique` (optional): Whether the index is unique
+        - `where` (optional): Condition of a partial index (like `deleted_at IS NULL`)
+
+        An index is declared by a column name, a list of columns (composite index) or a dict with above keys.
+        """
+        result = []
+        for index in indexes or []:
+            if not isinstance(index, dict):
+                index = {"columns": index}
+            columns = index.get("columns", None)
+            if isinstance(columns, str):
+                columns = [columns]
+            if not columns:
+                raise ValueError(
+                    f"index {index} on table [{table_name}] has no columns",
+                    "declare an index by a column, a list of columns or a dict with `columns` key",
+                )
+            name = index.get("name", None) or "_".join(
+                ["idx", table_name] + [col.strip() for col in columns]
+            )
+            parsed = dict(name=Sanitizer.as_identifier(name), columns=list(columns))
+            if index.get("unique", False):
+                parsed["unique"] = True
+            if index.get("where", None):
+                parsed["where"] = index["where"]
+            result.append(parsed)
+        return result
+
+    @staticmethod
+    def parse_relations(
+        relations: dict[str, str | dict], columns: dict[str, FieldMeta], table_name: str
+    ) -> dict[str, dict]:
+        """Parse the declared relations of a table: each maps a column (foreign key) to the ID of another table. Result maps the column to a dict with keys:
+        - `table`: Name of the related table
+        - `column`: Column of the related table matched by the foreign key. Defaults to `id`
+        - `display`: Column of the related table to show with the records. Defaults to `name`
+        - `name`: Name of the displayed value in the records. Defaults to the foreign key without `_id` suffix, then `_` and `display` (like `team_id` -> `team_name`)
+
+        A relation is declared by `<table>` or `<table>.<display>` or a dict with above keys.
+        """
+        result = {}
+        for column, relation in (relations or {}).items():
+            if column not in columns:
+                raise ValueError(
+                    f"relation on column [{column}] of table [{table_name}] is not declared in its columns",
+                    f"use one of {list(columns)}",
+                )
+            if not isinstance(relation, dict):
+                to_table, _, display = str(relation).partition(".")
+                relation = {"table": to_table, "display": display}
+            if not relation.get("table", None):
+                raise ValueError(
+                    f"relation on column [{column}] of table [{table_name}] has no related table",
+                    "declare a relation by `<table>`, `<table>.<display>` or a dict with `table` key",
+                )
+            display = relation.get("display", None) or "name"
+            base = column[: -len("_id")] if column.endswith("_id") else column
+            result[column] = dict(
+                table=Sanitizer.as_identifier(relation["table"]),
+                column=relation.get("column", None) or COLUMN_ID,
+                display=display,
+                name=Sanitizer.as_identifier(
+                    relation.get("name", None) or f"{base}_{display}"
+                ),
+            )
+        return result
+
 
 class TableMeta:
     def __init__(
@@ -51,10 +125,14 @@ class TableMeta:
         columns: dict[str, str | dict],
         meta_columns: list[str] = None,
         constraints: list[str] = None,
+        indexes: list[str | list | dict] = None,
         *,
         singular: str = None,
         plural: str = None,
         action_callback: Callable = None,
+        counted: bool = False,
+        search_tokenizer: str = None,
+        relations: dict[str, str | dict] = None,
     ):
         """Create a Table Meta object that describe the Database Table
 
@@ -64,8 +142,12 @@ class TableMeta:
             action_callback (Callable): A function to call when an action `create`, `update` or `delete` performed on the `Table`. The function receive the action name and the record data (dict), its can perform transformations on the data and expect to return new data for the records
             meta_columns (list[str], optional): _description_. Defaults to None.
             constraints (list[str], optional): _description_. Defaults to None.
+            indexes (list[str | list | dict], optional): Indexes of the table, each is a column, a list of columns or a dict with `columns` (columns or expressions), `unique`, `where` (partial index) and `name` keys. Defaults to None.
             singular (str, optional): _description_. Defaults to None.
             plural (str, optional): _description_. Defaults to None.
+            counted (bool, optional): Set to maintain the number of records in a counters table by triggers, so counting all (or all not deleted) records is a single-row lookup. Defaults to False.
+            search_tokenizer (str, optional): FTS5 tokenizer for the full-text index of the `searchable` columns, e.g. "trigram" to match any substring (3 characters or more). Defaults to None ("unicode61": match whole words).
+            relations (dict[str, str | dict], optional): Map foreign key columns to the related tables, like `{"team_id": "team.name"}`, so queries can join them to show the related values (see `TableHelper.parse_relations`). Defaults to None.
         """
         # print(f"Create TableMeta with name = {name}, columns = {columns}")
         self.name = name
@@ -74,6 +156,9 @@ class TableMeta:
         self._human_name = (singular_name, plural_name)
 
         self.constraints = TableHelper.parse_constraints(constraints)
+        self.indexes = TableHelper.parse_indexes(indexes, self.name)
+        self.counted = counted
+        self.search_tokenizer = search_tokenizer
 
         parsed_columns = TableHelper.parse_columns(columns, meta_columns)
         self.columns = parsed_columns
@@ -82,6 +167,18 @@ class TableMeta:
         }
 
         self.meta_column_names = [c for c in META_COLUMNS if c in parsed_columns]
+        self.searchable_columns = [
+            name for name, field in parsed_columns.items() if field["searchable"]
+        ]
+        # each `folded` column has a shadow column of its folded values, see `fold`
+        self.folded_columns = {
+            name: f"{name}{FOLDED_COLUMN_SUFFIX}"
+            for name, field in parsed_columns.items()
+            if field["folded"]
+        }
+        self.relations = TableHelper.parse_relations(
+            relations, parsed_columns, self.name
+        )
         self.action_callback = action_callback or self.default_callback
 
     def human_name(self, number=1):
@@ -107,13 +204,35 @@ class TableMeta:
             return data
         return data | {column_name: DTypes.cast_to_sqlite(datetime.now(), "datetime")}
 
+    @staticmethod
+    def fold(value):
+        """Fold a text for accent-insensitive (and case-insensitive) matching: `Nguyễn Văn A` -> `nguyen van a`"""
+        if value is None:
+            return None
+        value = str(value)
+        if value.isascii():
+            # nothing to convert, skip the substitutions
+            return value.lower()
+        # lower first: only the lowercase forms of some accented letters are converted
+        return Text.convert_to_ascii(value.lower())
+
+    def fold_data(self, data: dict) -> dict:
+        """Get the values of the shadow columns for the `folded` columns in `data`"""
+        return {
+            shadow: TableMeta.fold(data[name])
+            for name, shadow in self.folded_columns.items()
+            if name in data
+        }
+
     def sanitize_data(self, *data: dict):
         if len(data) == 1:
-            return DTypes.cast_heterogeneous(data[0], **self.columns_dtypes)
-        return [
-            DTypes.cast_heterogeneous(data_item, **self.columns_dtypes)
-            for data_item in data
-        ]
+            values = DTypes.cast_heterogeneous(data[0], **self.columns_dtypes)
+            if not self.folded_columns:
+                return values
+            # columns set to NULL also clear their shadow columns
+            none_values = {k: v for k, v in data[0].items() if v is None}
+            return values | self.fold_data(none_values | values)
+        return [self.sanitize_data(data_item) for data_item in data]
 
     def get_columns_by_name(self, column: str) -> list[str]:
         if column == ALL_LITERAL:
@@ -157,4 +276,8 @@ class TableMeta:
             columns={k: v.metadata for k, v in self.columns.items()},
             meta_columns=self.meta_column_names,
             constraints=self.constraints,
+            indexes=self.indexes,
+            counted=self.counted,
+            search_tokenizer=self.search_tokenizer,
+            relations=self.relations,
         )
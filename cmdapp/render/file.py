@@ -1,18 +1,37 @@
 import io, re
 import csv, json, yaml
+from itertools import chain
+from typing import Iterable
 
 from ..utils import Json, Hash, Platform
 
 
 class FileFormat:
-    def rename_records(data: list[dict], fieldnames: dict[str, str]):
-        renamed_data = []
-        for record in data:
-            renamed_data.append(
-                {rename: record.get(key) for key, rename in fieldnames.items()}
-                | {k: v for k, v in record.items() if k not in fieldnames}
-            )
-        return renamed_data
+    """Writers receive the data as a list of dict or any iterable of dict (like a generator over query results). For a non-list iterable, records are consumed and written one by one.
+    Columnar data (like `ColumnSet`, which has `names` and `rows()`) is an iterable of dict too, CSV writes its rows directly
+    """
+
+    def rename_record(record: dict, fieldnames: dict[str, str]):
+        return {rename: record.get(key) for key, rename in fieldnames.items()} | {
+            k: v for k, v in record.items() if k not in fieldnames
+        }
+
+    def rename_records(data: Iterable[dict], fieldnames: dict[str, str]):
+        if not isinstance(data, (list, tuple)):
+            return (FileFormat.rename_record(record, fieldnames) for record in data)
+        return [FileFormat.rename_record(record, fieldnames) for record in data]
+
+    def peek(data: Iterable[dict]) -> tuple[dict | None, Iterable[dict]]:
+        """Get the first record without losing it
+
+        Returns:
+            tuple: The first record (None if empty) and the records to iterate over (still includes the first)
+        """
+        if isinstance(data, (list, tuple)):
+            return (data[0] if data else None), data
+        records = iter(data)
+        first = next(records, None)
+        return first, (chain([first], records) if first is not None else [])
 
     @classmethod
     def support_file_format(cls):
@@ -24,11 +43,11 @@ class FileFormat:
             if key.startswith(method_prefix)
         ]
 
-    def write_csv(data: list[dict], file=None, options: dict = {}) -> str:
+    def write_csv(data: Iterable[dict], file=None, options: dict = {}) -> str:
         """Write list of data item into CSV format.
 
         Args:
-            - data (list[dict]): Data to render
+            - data (Iterable[dict]): Data to render
             - file (io, optional): File to save result. Defaults to None (return string)
             - options (dict, optional): Format options for CSV, with following keys. Defaults to {}.
                 - headers (bool): False to not generate headers. Default to True
@@ -43,7 +62,15 @@ class FileFormat:
         """
         destination = file or io.StringIO(newline="")
         headers = options.pop("headers", True)
-        fieldnames = list(data[0].keys())
+        if hasattr(data, "rows"):
+            if not len(data):
+                return None if file else ""
+            fieldnames = list(data.names)
+        else:
+            first, data = FileFormat.peek(data)
+            if first is None:
+                return None if file else ""
+            fieldnames = list(first.keys())
         if headers:
             rename = options.pop("rename", {}) or {}
             if rename:
@@ -57,17 +84,26 @@ class FileFormat:
             restval="",
         )
 
+        if hasattr(data, "rows") and all(k in data.names for k in fieldnames):
+            # columnar data: write the tuples of values, no dict per row
+            options.pop("restval")
+            writer = csv.writer(destination, **options)
+            if headers:
+                writer.writerow([rename.get(k, k) for k in fieldnames])
+            writer.writerows(data.rows(fieldnames))
+            return None if file else destination.getvalue()
+
         writer = csv.DictWriter(destination, fieldnames, **options)
         if headers:
             writer.writerow({k: rename.get(k, k) for k in fieldnames})
         writer.writerows(data)
         return None if file else destination.getvalue()
 
-    def write_json(data: list[dict], file=None, options: dict = {}) -> str:
+    def write_json(data: Iterable[dict], file=None, options: dict = {}) -> str:
         """Write list of data item into JSON format.
 
         Args:
-            - data (list[dict]): Data to render
+            - data (Iterable[dict]): Data to render
             - file (io, optional): File to save result. Defaults to None (return string)
             - options (dict, optional): Format options for JSON, with following keys. Defaults to {}.
                 - skipkeys (bool): True to ignore error on keys that are not Python basic types.
@@ -92,13 +128,34 @@ class FileFormat:
             sort_keys=False,  # sort keys on same level
         )
         options["default"] = Json.serializer
-        return json.dump(data, file, **options) if file else json.dumps(data, **options)
+        if isinstance(data, (list, tuple)):
+            return (
+                json.dump(data, file, **options) if file else json.dumps(data, **options)
+            )
+        # write the array item by item, same layout as `json.dump`
+        destination = file or io.StringIO()
+        indent = options["indent"]
+        if isinstance(indent, int):
+            indent = " " * indent
+        newline = "" if indent is None else "\n" + indent
+        destination.write("[")
+        empty = True
+        for index, record in enumerate(data):
+            item = json.dumps(record, **options)
+            destination.write(
+                (options["separators"][0] if index else "")
+                + newline
+                + (item.replace("\n", newline) if newline else item)
+            )
+            empty = False
+        destination.write("]" if empty or not newline else "\n]")
+        return None if file else destination.getvalue()
 
-    def write_yaml(data: list[dict], file=None, options: dict = {}) -> str:
+    def write_yaml(data: Iterable[dict], file=None, options: dict = {}) -> str:
         """Write list of data item into YAML format.
 
         Args:
-            - data (list[dict]): Data to render
+            - data (Iterable[dict]): Data to render
             - file (io, optional): File to save result. Defaults to None (return string)
             - options (dict, optional): Format options for YAML, with following keys. Defaults to {}.
                 - default_flow_style (bool): True to use flow style, or else (False) use block style. Default to False
@@ -120,13 +177,23 @@ class FileFormat:
             allow_unicode=True,
             sort_keys=False,  # sort keys on same level
         )
-        return yaml.dump(data, file, **options)
+        if isinstance(data, (list, tuple)):
+            return yaml.dump(data, file, **options)
+        # a block-style sequence can be written item by item
+        destination = file or io.StringIO()
+        empty = True
+        for record in data:
+            yaml.dump([record], destination, **options)
+            empty = False
+        if empty:
+            yaml.dump([], destination, **options)
+        return None if file else destination.getvalue()
 
-    def write_html(data: list[dict], file=None, options: dict = {}) -> str:
+    def write_html(data: Iterable[dict], file=None, options: dict = {}) -> str:
         """Write list of data item into HTML table. HTML table format is customized by `options`
 
         Args:
-            - data (list[dict]): Data to render
+            - data (Iterable[dict]): Data to render
             - file (io, optional): File to save result. Defaults to None (return string)
             - options (dict, optional): Format options for HTML, with following keys. Defaults to {}.
                 - template (str): Template in html format, placeholders are placed inside `{{<placeholder>}}`. If not provided, use custom template, it provides some css and js to sort
@@ -156,7 +223,8 @@ class FileFormat:
             with open(template_path, "r") as template_file:
                 template = template_file.read()
         # render data
-        raw_headers = list(data[0].keys())
+        first, data = FileFormat.peek(data)
+        raw_headers = list(first.keys()) if first is not None else []
         if rename:
             renamed_headers = list(rename.values()) + [
                 v for v in raw_headers if v not in rename
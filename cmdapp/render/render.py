@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Iterable
 from .template import Template, TemplateParser
 from .table import Tabling
 from .file import FileFormat
@@ -38,18 +38,29 @@ class ResponseFormatter:
             return Template.apply_format(message, **style)
         return message
 
-    def table(self, data: list[dict], style="Simple", widths=None, headers=None):
+    def table(self, data: Iterable[dict], style="Simple", widths=None, headers=None):
+        """Render data as a table. For a non-list iterable (like a generator over query results), return a generator over the table lines instead of the whole table. Columnar data (like `ColumnSet`) is rendered at once"""
+        if not isinstance(data, (list, tuple)) and not hasattr(data, "rows"):
+            return Tabling.iter_generate(
+                data, style=style, widths=widths, headers=headers
+            )
         return Tabling.generate(data, style=style, widths=widths, headers=headers)
 
     def _file(
-        data: list[dict],
+        data: Iterable[dict],
         path: str = None,
         append: str = False,
         formatter: Callable = None,
+        file=None,
         **kwargs,
     ):
         if path:
-            file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+            with open(
+                path, "a" if append else "w", newline="", encoding="utf-8"
+            ) as file:
+                formatted_data = formatter(data, file, kwargs)
+        elif file is not None:
+            # an open stream (like the standard output): written as the data comes, nothing is returned
             formatted_data = formatter(data, file, kwargs)
         else:
             formatted_data = formatter(data, None, kwargs)
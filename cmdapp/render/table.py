@@ -1,6 +1,10 @@
+from itertools import chain
+from typing import Iterable
+
 from ..utils import Terminal
 
 from cmd2 import table_creator as tabling
+from cmd2.utils import align_left
 
 
 class Tabling:
@@ -22,16 +26,55 @@ class Tabling:
             for header, w in zip(headers, widths)
         ]
 
-    def generate(data: list[dict], style="Simple", widths=None, headers=None):
+    def _create_table(style, widths, headers):
         if isinstance(style, int):
             style = __class__.STYLE[max(0, min(len(__class__.STYLE) - 1, style))]
-        if not headers:
-            if not data:
-                return ""
-            headers = list(data[0])
         table_class = getattr(
             tabling, f"{str(style).title()}Table", tabling.SimpleTable
         )
         columns = __class__._create_columns(headers, widths)
-        table = table_class(columns).generate_table([list(d.values()) for d in data])
-        return table
+        return table_class(columns)
+
+    def iter_generate(data: Iterable[dict], style="Simple", widths=None, headers=None):
+        """Same as `generate` but consume the records one by one and yield the table line by line (header, rows, borders). Use it for a large or lazy data source"""
+        records = iter(data)
+        first = next(records, None)
+        if not headers:
+            if first is None:
+                return
+            headers = list(first)
+        table = __class__._create_table(style, widths, headers)
+        yield table.generate_header()
+        if first is None:
+            return
+
+        is_bordered = isinstance(table, tabling.BorderedTable)
+        if isinstance(table, tabling.AlternatingTable):
+            row_separator = None
+        elif is_bordered:
+            row_separator = table.generate_row_bottom_border()
+        else:
+            # blank line between rows, same as `SimpleTable.generate_table`
+            row_separator = align_left(
+                "", fill_char=table.apply_data_bg(" "), width=table.total_width()
+            )
+        for index, record in enumerate(chain([first], records)):
+            if index > 0 and row_separator is not None:
+                yield row_separator
+            yield table.generate_data_row(list(record.values()))
+        if is_bordered:
+            yield table.generate_table_bottom_border()
+
+    def generate(data: list[dict], style="Simple", widths=None, headers=None):
+        """Render records as a table. `data` can also be columnar (like `ColumnSet`): it has `names` and `rows()` over the tuples of values"""
+        if hasattr(data, "rows"):
+            if not headers and not len(data):
+                return ""
+            table = __class__._create_table(style, widths, headers or data.names)
+            return table.generate_table([list(row) for row in data.rows()])
+        if not headers:
+            if not data:
+                return ""
+            headers = list(data[0])
+        table = __class__._create_table(style, widths, headers)
+        return table.generate_table([list(d.values()) for d in data])
@@ -0,0 +1,87 @@
+import sqlite3
+
+from cmdapp.base import Alias
+from cmdapp.database import Database
+from cmdapp.parser import TableMeta
+
+SCHEMA = [
+    TableMeta(
+        "team",
+        {"name": {"annotation": "(*str)", "folded": True}},
+        meta_columns=["created_at", "updated_at"],
+    ),
+    TableMeta("person", {"name": "(*str)", "team_id": "(int)"}),
+]
+
+
+def prepare_database(path=":memory:"):
+    database = Database(path, SCHEMA)
+    database.prepare()
+    database["team"].insert_batch([{"name": "Đội Một"}, {"name": "Đội Hai"}])
+    database["person"].insert_batch([{"name": "Ann", "team_id": 1}])
+    return database
+
+
+def test_alias():
+    database = prepare_database()
+    alias = Alias(database, ["team", ("person", "name")])
+    assert alias.resolve("team", ["Đội Một", "doi hai", "3"]) == [1, 2, 3]
+    assert alias[("person", "Ann")] == 1 and ("person", "Bob") not in alias
+    try:
+        alias.resolve("team", "Đội Ba")
+        assert False
+    except ValueError as error:
+        assert "Đội Ba" in error.args[0]
+
+
+def test_lazy(tmp_path):
+    path = str(tmp_path / "alias.db")
+    database = prepare_database(path)
+    alias = Alias(database, ["team", "person"], lazy=True, max_size=3)
+    assert alias.aliases == {}
+    assert alias.resolve("team", ["Đội Một", "doi hai", "3"]) == [1, 2, 3]
+    assert ("person", "Bob") not in alias
+    # the least recently used values are dropped over the size
+    assert list(alias.aliases) == [
+        ("team", "Đội Một"),
+        ("team", "doi hai"),
+        ("person", "Bob"),
+    ]
+    assert alias[("person", "Ann")] == 1 and len(alias.aliases) == 3
+
+    # writes drop the values of the written table only
+    database["person"].insert({"name": "Bob", "team_id": 2})
+    assert alias[("team", "doi hai")] == 2
+    assert ("person", "Bob") in alias
+    assert ("team", "doi hai") in alias.aliases
+
+    # commits of other connections drop all values
+    other = sqlite3.connect(path)
+    other.execute("UPDATE team SET name = 'Đội Ba', name__ascii = 'doi ba' WHERE id = 2")
+    other.commit()
+    other.close()
+    assert alias[("team", "doi hai")] is None
+    assert alias.resolve("team", "doi ba") == 2
+    database.close()
+
+
+def test_index():
+    database = prepare_database()
+    alias = Alias(database, ["team", "person"], lazy=True)
+    assert alias.complete("team", "doi") == ["Đội Hai", "Đội Một"]
+    assert alias.complete("unknown", "doi") == []
+    assert alias.resolve("team", ["Doi Mot", "Đội Hia"], fuzzy=True) == [1, 2]
+    try:
+        alias.resolve("team", "Đội Hia")
+        assert False
+    except ValueError as error:
+        assert "Đội Hia" in error.args[0]
+
+    # the index follows the changes of its table
+    index = alias.index("team")
+    database["team"].insert({"name": "Đội Ba"})
+    database["team"].update({"id": 1, "name": "Đội Bốn"})
+    assert alias.complete("team", "doi") == ["Đội Ba", "Đội Bốn", "Đội Hai"]
+    assert alias.index("team") is index
+    database["team"].delete_by_id(2, permanent=True)
+    assert alias.complete("team", "doi") == ["Đội Ba", "Đội Bốn"]
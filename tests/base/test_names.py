@@ -0,0 +1,25 @@
+from cmdapp.base import NameIndex
+
+
+def test_name_index():
+    index = NameIndex(
+        [(1, "Đội Một"), (2, "Đội Hai"), (3, "Beta"), (4, "beta"), (5, None)]
+    )
+    assert len(index) == 4 and 5 not in index
+    assert index.prefix("doi") == ["Đội Hai", "Đội Một"]
+    assert index.prefix("BE") == ["Beta", "beta"]
+    assert index.prefix("x") == []
+    assert index.get("beta") == [4] and index.get("BETA") == [3, 4]
+
+    assert index.fuzzy("doi mot", limit=1) == [("Đội Một", 1.0)]
+    assert index.fuzzy("Dội Moot", limit=1)[0][0] == "Đội Một"
+    assert index.fuzzy("zzz") == []
+
+    # renamed and removed incrementally
+    index.add(2, "Đội Ba")
+    index.remove(1)
+    index.remove(99)
+    assert index.prefix("doi") == ["Đội Ba"]
+    assert index.fuzzy("doi hai", threshold=0.7) == []
+    index.add(6, "Alpha")
+    assert index.prefix("") == ["Alpha", "Beta", "beta", "Đội Ba"]
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+from cmdapp.database import *
+from cmdapp.parser import *
+
+from tests.database.test_operation import TABLE_NAME, TABLE_SCHEMA, ITEMS
+
+
+def test_async_database():
+    async def main():
+        database = Database(":memory:", [TableMeta(**TABLE_SCHEMA)])
+        async with AsyncDatabase(database) as adatabase:
+            table = adatabase[TABLE_NAME]
+            assert await table.prepare()
+            assert await table.insert_batch(ITEMS) == len(ITEMS)
+
+            # queued requests run one by one on the database thread
+            counts = await asyncio.gather(*[table.count() for _ in range(10)])
+            assert counts == [len(ITEMS)] * 10
+            thread_name = lambda: threading.current_thread().name
+            names = await asyncio.gather(*[adatabase.run(thread_name) for _ in range(5)])
+            assert len(set(names)) == 1 and names[0] != threading.current_thread().name
+
+            records = [record async for record in table.iter_query(chunk_size=3)]
+            assert records == await table.query()
+            assert len(records) == len(ITEMS)
+
+            # errors are collected by the table, same as the synchronous API
+            assert await table.insert({"type": "image"}) == 0
+            assert len(table.errors) == 1
+            assert "title" in table.errors[0]["message"]
+
+            rows = [row async for row in adatabase.iter_query("SELECT 1 AS one")]
+            assert rows == [{"one": 1}]
+
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+
+from cmdapp.database import *
+from cmdapp.parser import *
+
+from tests.database.test_operation import TABLE_NAME, TABLE_SCHEMA, ITEMS
+
+
+def prepare_table(path=":memory:", **kwargs):
+    cache = QueryCache(**kwargs)
+    database = Database(path, [TableMeta(**TABLE_SCHEMA)], cache=cache)
+    table = database[TABLE_NAME]
+    table.prepare()
+    table.insert_batch(ITEMS)
+    return database, table, cache
+
+
+def test_hit_and_invalidate():
+    _, table, cache = prepare_table()
+    first = table.query(order_by=[("id", "ASC")])
+    assert table.query(order_by=[("id", "ASC")]) is first
+    assert table.count() == table.count() == len(ITEMS)
+    assert table.get(1)["title"] == ITEMS[0]["title"]
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 3 and stats["entries"] == 3
+
+    # writes through the table drop its entries
+    table.update({"id": 1, "title": "Changed"})
+    assert cache.stats()["entries"] == 0
+    assert table.get(1)["title"] == "Changed"
+    table.insert({"title": "New", "type": "text"})
+    assert table.count() == len(ITEMS) + 1
+    table.delete_by_id(1, permanent=True)
+    assert table.get(1) is None
+    assert table.insert_batch([{"title": "Batch", "type": "text"}]) == 1
+    assert table.count() == len(ITEMS) + 1
+
+
+def test_external_write(tmp_path):
+    path = str(tmp_path / "cache.db")
+    database, table, cache = prepare_table(path)
+    assert table.count() == len(ITEMS)
+
+    other = sqlite3.connect(path)
+    other.execute(f"DELETE FROM {TABLE_NAME} WHERE id = 1")
+    other.commit()
+    other.close()
+    assert table.count() == len(ITEMS) - 1
+    assert cache.stats()["invalidations"] >= 1
+    database.close()
+
+
+def test_own_write(tmp_path):
+    schema = [TableMeta(**TABLE_SCHEMA), TableMeta(**TABLE_SCHEMA | {"name": "other"})]
+    cache = QueryCache()
+    database = Database(str(tmp_path / "cache.db"), schema, cache=cache)
+    assert database.prepare()
+    table, other = database[TABLE_NAME], database["other"]
+    assert other.insert_batch(ITEMS) == len(ITEMS)
+    first = other.query()
+
+    # commits of the database itself only drop the entries of the written table
+    assert table.insert({"title": "New", "type": "text"}) == 1
+    assert table.count() == 1
+    assert other.query() is first
+    assert cache.epoch == 0
+    database.close()
+
+
+def test_transaction(tmp_path):
+    database, table, cache = prepare_table(str(tmp_path / "cache.db"))
+    assert table.count() == len(ITEMS)
+    started, release, counts = threading.Event(), threading.Event(), []
+
+    def write():
+        with database.transaction():
+            table.insert({"title": "New", "type": "text"})
+            # the uncommitted count is read but not cached
+            counts.append(table.count())
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    started.wait(5)
+    # cached reads of other threads do not wait for the transaction
+    assert table.count() == len(ITEMS)
+    release.set()
+    thread.join()
+    assert counts == [len(ITEMS) + 1]
+    assert table.count() == len(ITEMS) + 1
+    database.close()
+
+
+def test_eviction():
+    _, table, cache = prepare_table()
+    size = QueryCache.estimate_size(table.get(1))
+    cache.max_bytes, cache.max_entry_bytes = size * 3, size * 2
+    cache.invalidate()
+    for item_id in range(1, len(ITEMS) + 1):
+        table.get(item_id)
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["evictions"] == len(ITEMS) - 3
+    assert stats["bytes"] <= cache.max_bytes
+
+    # the least recently used entries are evicted
+    table.get(len(ITEMS))
+    table.get(1)
+    assert cache.stats()["hits"] == stats["hits"] + 1
+    # results over the entry limit are not cached
+    table.query()
+    table.query()
+    assert cache.stats()["misses"] == stats["misses"] + 3
@@ -74,3 +74,48 @@ def test_with_group():
         condition.build(),
         "NOT age > 15 AND subject IN ('maths', 'physics') AND ( score BETWEEN 1 AND 4 OR score BETWEEN 8 AND 10 )",
     )
+
+
+def test_compiled():
+    condition = (
+        SQLCondition("age", SQLOperators.GREATER_THAN, 15, negative=True)
+        .AND("subject", SQLOperators.IN, ["maths", "physics"])
+        .AND("name", SQLOperators.EQUAL, ":name")
+        .OR("score", SQLOperators.BETWEEN, (4, 7), force_quote=True)
+    )
+    sql, params = condition.build(compiled=True)
+    assert (
+        sql
+        == "NOT age > :__p0 AND subject IN (:__p1, :__p2) AND name = :name OR score BETWEEN :__p3 AND :__p4"
+    )
+    assert params == {
+        "__p0": 15,
+        "__p1": "maths",
+        "__p2": "physics",
+        "__p3": "4",
+        "__p4": "7",
+    }
+    # same shape, different values => same SQL string
+    other_sql, _ = (
+        SQLCondition("age", SQLOperators.GREATER_THAN, 30, negative=True)
+        .AND("subject", SQLOperators.IN, ["chemistry", "biology"])
+        .AND("name", SQLOperators.EQUAL, ":name")
+        .OR("score", SQLOperators.BETWEEN, (1, 2), force_quote=True)
+        .build(compiled=True)
+    )
+    assert other_sql == sql
+
+
+def test_qualify():
+    condition = SQLCondition("age", SQLOperators.GREATER_THAN, 15).AND_GROUP(
+        SQLCondition(("name", "id"), SQLOperators.GREATER_THAN, ("a", 2)).OR(
+            "length(name)", SQLOperators.EQUAL, 3
+        )
+    )
+    qualified = condition.qualify("person", ["id", "name", "age"])
+    assert (
+        qualified.build()
+        == "person.age > 15 AND ( (person.name, person.id) > ('a', 2) OR length(name) = 3 )"
+    )
+    # the condition itself is not changed
+    assert condition.build().startswith("age > 15")
@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+
+from cmdapp.database.connection import DbConnection
+
+
+def create_connection(path, **kwargs):
+    conn = DbConnection(path, **kwargs)
+    conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)")
+    return conn
+
+
+def test_memory_fallback():
+    conn = create_connection(":memory:")
+    conn.execute("INSERT INTO item (name) VALUES (:name)", {"name": "a"})
+    assert conn.reader() is conn.conn
+    assert conn.execute("SELECT name FROM item").fetchall() == [{"name": "a"}]
+    conn.close()
+
+
+def test_concurrent_readers(tmp_path):
+    conn = create_connection(str(tmp_path / "pool.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()["journal_mode"] == "wal"
+
+    readers, counts, errors = [], [], []
+
+    def read():
+        readers.append(conn.reader())
+        for _ in range(20):
+            cursor = conn.execute("SELECT COUNT(*) AS count FROM item", on_error=errors.append)
+            counts.append(cursor.fetchone()["count"])
+
+    def write():
+        for index in range(50):
+            conn.execute("INSERT INTO item (name) VALUES (:name)", {"name": str(index)}, on_error=errors.append)
+
+    threads = [threading.Thread(target=read) for _ in range(4)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(map(id, readers))) == 4
+    assert conn.conn not in readers
+    assert all(0 <= count <= 50 for count in counts)
+    assert conn.execute("SELECT COUNT(*) AS count FROM item").fetchone()["count"] == 50
+    conn.close()
+
+
+def test_dead_readers(tmp_path):
+    conn = create_connection(str(tmp_path / "readers.db"))
+    readers = []
+    for _ in range(5):
+        thread = threading.Thread(target=lambda: readers.append(conn.reader()))
+        thread.start()
+        thread.join()
+    # the readers of the exited threads are closed when a new reader is created
+    assert len(conn.connections) == 2 and readers[-1] in conn.connections
+    conn.reader()
+    assert len(conn.connections) == 2 and len(conn.readers) == 1
+    try:
+        readers[0].execute("SELECT 1")
+        assert False, "the reader of an exited thread should be closed"
+    except sqlite3.ProgrammingError:
+        pass
+    conn.close()
+    assert conn.readers == {}
+
+
+def test_retry_busy():
+    conn = DbConnection(":memory:", retries=2)
+    calls = []
+
+    def busy():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return "done"
+
+    assert conn.with_retry(busy) == "done"
+    assert len(calls) == 3
+
+    calls.clear()
+    conn.retries = 1
+    try:
+        conn.with_retry(busy)
+        assert False, "busy error should be raised after all retries"
+    except sqlite3.OperationalError:
+        pass
+    assert len(calls) == 2
+    conn.close()
+
+
+def test_profile(tmp_path):
+    conn = create_connection(str(tmp_path / "profile.db"), profile="durable")
+    pragma = lambda name: list(conn.execute(f"PRAGMA {name}").fetchone().values())[0]
+    assert conn.profile_name == "durable"
+    assert pragma("synchronous") == 2
+    assert pragma("journal_mode") == "wal"
+
+    conn.set_profile("bulk-load")
+    assert conn.profile_name == "bulk-load"
+    assert pragma("synchronous") == 0
+    assert pragma("cache_size") == -64000
+
+    conn.set_profile({"synchronous": "NORMAL"})
+    assert conn.profile_name == "custom"
+    assert pragma("synchronous") == 1
+
+    for profile in ["fast", {"foreign_keys": "ON"}]:
+        try:
+            conn.set_profile(profile)
+            assert False, "unsupported profile should be rejected"
+        except ValueError:
+            pass
+    assert conn.profile_name == "custom"
+    conn.close()
+
+
+def test_transaction(tmp_path):
+    conn = create_connection(str(tmp_path / "transaction.db"))
+    insert = lambda name: conn.execute("INSERT INTO item (name) VALUES (:name)", {"name": name})
+    names = lambda: [row["name"] for row in conn.execute("SELECT name FROM item ORDER BY id")]
+    outside = []
+
+    with conn.transaction():
+        insert("a")
+        try:
+            with conn.transaction():
+                insert("b")
+                assert names() == ["a", "b"]
+                raise ValueError("roll back the nested block")
+        except ValueError:
+            pass
+        # a savepoint inside the transaction
+        assert conn.with_transaction(lambda c: c.execute("INSERT INTO item (name) VALUES ('c')").rowcount) == 1
+        assert conn.batch_execute([[("INSERT INTO item (name) VALUES (:name)", [{"name": "d"}])]], commit_rows=1) == 1
+        # other threads only see the committed rows
+        thread = threading.Thread(target=lambda: outside.append(names()))
+        thread.start()
+        thread.join()
+        assert conn.in_transaction() and names() == ["a", "c", "d"]
+    assert outside == [[]]
+    assert not conn.in_transaction() and names() == ["a", "c", "d"]
+
+    try:
+        with conn.transaction():
+            insert("e")
+            raise ValueError("roll back the transaction")
+    except ValueError:
+        pass
+    assert names() == ["a", "c", "d"] and not conn.conn.in_transaction
+    conn.close()
@@ -0,0 +1,54 @@
+import sqlite3
+
+from tests.helper import *
+
+from cmdapp.database.helper import CursorHelper, Record, RowFactory
+
+SQL = "SELECT 1 AS id, 'x' AS name, 2 AS class, 3 AS \"COUNT(*)\""
+
+
+@with_cases(
+    lambda name: sqlite3.connect(":memory:"),
+    inputs={
+        "dict": "dict",
+        "namedtuple": "namedtuple",
+        "record": "record",
+        "tuple": "tuple",
+    },
+    expects={
+        "dict": dict,
+        "namedtuple": tuple,
+        "record": Record,
+        "tuple": tuple,
+    },
+    pass_directly=True,
+)
+def test_row_factory(output: sqlite3.Connection, expect, case):
+    output.row_factory = getattr(RowFactory, f"{case}_factory")
+    rows = output.execute(f"{SQL} UNION ALL {SQL}").fetchall()
+    assert all(isinstance(row, expect) for row in rows)
+    assert type(rows[0]) is type(rows[1])
+    assert CursorHelper.row_values(rows[0]) == [1, "x", 2, 3]
+    assert CursorHelper.as_value(output.execute(SQL)) == [1, "x", 2, 3]
+    assert CursorHelper.as_values(output.execute("SELECT 7 AS id")) == [7]
+    if case in ["dict", "record"]:
+        assert rows[0]["name"] == "x"
+        assert rows[0]["COUNT(*)"] == 3
+        assert list(rows[0].keys()) == ["id", "name", "class", "COUNT(*)"]
+        assert rows[0] == {"id": 1, "name": "x", "class": 2, "COUNT(*)": 3}
+
+
+def test_layout_cache():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = RowFactory.record_factory
+    cursor = conn.execute(f"{SQL} UNION ALL {SQL}")
+    first, second = cursor.fetchall()
+    assert RowFactory.layout(cursor).description is cursor.description
+    assert not hasattr(first, "__dict__")
+    assert first.name == second.name == "x"
+    assert first._2 == 2 and first.get("missing") is None
+
+    # names starting with `__` would be mangled as slots
+    row = conn.execute("SELECT 1 AS id, 2 AS __rank").fetchone()
+    assert row["__rank"] == 2 and row._1 == 2
+    assert dict(row.items()) == {"id": 1, "__rank": 2}
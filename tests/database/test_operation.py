@@ -1,4 +1,6 @@
 import random
+import threading
+import time
 
 from tests.helper import *
 
@@ -309,6 +311,108 @@ def test_insert_batch(table: Table, output, expect, case):
     assert table.count() == expect["output"]
 
 
+def test_prepare_indexes():
+    indexes = ["year", {"columns": ["lower(title)"], "where": "deleted_at IS NULL"}]
+    database = Database(":memory:", [TableMeta(**TABLE_SCHEMA, indexes=indexes)])
+    table = database[TABLE_NAME]
+    assert table.prepare()
+    assert table.prepare()
+    sql = "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    names = [row["name"] for row in database.query(sql)]
+    assert names == [f"idx_{TABLE_NAME}_year", f"idx_{TABLE_NAME}_lower_title_"]
+
+    sql = f"EXPLAIN QUERY PLAN SELECT * FROM {TABLE_NAME} WHERE year = 1"
+    assert "USING INDEX" in database.query(sql)[0]["detail"]
+
+
+def test_insert_batch_stream():
+    def records(count, mixed):
+        for index in range(count):
+            record = {"title": f"Stream {index}", "type": "text", "year": index}
+            # records with different columns are grouped on multi-row VALUES
+            if mixed and index % 3 == 0:
+                record.pop("year")
+            # duplicated (title, year) fails the whole batch
+            if index == 26:
+                record.update(title="Stream 25", year=25)
+            yield record
+
+    for options in [
+        dict(multi_values=False, commit_rows=None),
+        dict(multi_values=True, commit_rows=None),
+        dict(multi_values=True, commit_rows=0),
+        dict(multi_values=True, commit_interval=0),
+    ]:
+        table = prepare_table(with_populate=False)
+        progress = []
+        count = table.insert_batch(
+            records(100, mixed=options["multi_values"]),
+            batch_size=10,
+            on_progress=lambda rows, rate: progress.append(rows),
+            **options,
+        )
+        assert count == 90
+        assert len(table.errors) == 1
+        assert contains_all(table.errors[0]["message"], ["unique", "title", "year"])
+        assert table.count() == 90
+        assert progress == [10, 20] + list(range(20, 100, 10))
+        assert table.get(1)["title"] == "Stream 0"
+        assert table.get(1).get("year") == (None if options["multi_values"] else 0)
+
+
+def test_upsert():
+    table = prepare_table()
+    before = table.get(2)
+    conflict_columns = ["title", "year"]
+
+    item = {"title": "Title 1", "year": 1926, "type": "text"}
+    assert table.upsert(item, conflict_columns) == 1
+    after = table.get(2)
+    assert after["type"] == "text"
+    assert after[COLUMN_CREATE] == before[COLUMN_CREATE]
+    assert after[COLUMN_UPDATE] is not None
+
+    items = [
+        {"title": "Title 2", "year": 1927, "type": "remake", "done": True},
+        {"title": "New", "year": 2000, "type": "image", "done": False},
+    ]
+    count = table.upsert_batch(items, conflict_columns, update_columns=["done"])
+    assert count == 2
+    assert table.get(3)["done"] == True
+    assert table.get(3)["type"] == ITEMS[2]["type"]
+    assert table.get(len(ITEMS) + 1)[COLUMN_UPDATE] is None
+
+    assert table.upsert({"title": "Title 1", "type": "text"}, ["type"]) == 0
+    assert len(table.errors) == 1
+
+
+def test_update_batch():
+    table = prepare_table()
+    items = [
+        {COLUMN_ID: 1, "year": 2001},
+        {COLUMN_ID: 2, "year": 2002, "pdf": None},
+        {COLUMN_ID: 3, "year": 2003},
+        # unique constraint on (title, year)
+        {COLUMN_ID: 4, "title": "Title 0", "year": 2001},
+        {COLUMN_ID: 5, "title": "Renamed"},
+        # missing ID
+        {"year": 2000},
+    ]
+    assert table.update_batch(items) == 4
+    assert len(table.errors) == 2
+    assert table.errors[0]["type"] == "ValueError"
+    assert contains_all(table.errors[1]["message"], ["unique", "title", "year"])
+    assert table.errors[1]["data"][COLUMN_ID] == 4
+
+    records = {record[COLUMN_ID]: record for record in table.query()}
+    years = [records[i]["year"] for i in range(1, 5)]
+    assert years == [2001, 2002, 2003, ITEMS[3]["year"]]
+    assert records[2]["pdf"] is None
+    assert records[5]["title"] == "Renamed"
+    assert records[4][COLUMN_UPDATE] is None
+    assert all(records[i][COLUMN_UPDATE] is not None for i in [1, 2, 3, 5])
+
+
 @with_cases(
     prepare_table(with_delete=True).which_exists,
     inputs={
@@ -386,6 +490,25 @@ def test_query(output, expect, case):
     assert output_without_meta_fields == get_saved_value(expect)
 
 
+def test_query_columns():
+    table = prepare_table()
+    columns = ["title", "year", "done", "pdf"]
+    records = table.query(columns=columns)
+    output = table.query(columns=columns, layout="columns")
+    assert isinstance(output, ColumnSet)
+    assert len(output) == len(records)
+    assert output.names == list(records[0])
+    assert output["year"].typecode == "q"
+    assert isinstance(output["title"], list)
+    assert list(output) == records
+    assert list(output.rows(["year"]))[0] == (records[0]["year"],)
+
+    empty = table.query(
+        condition=SQLCondition("year", SQLOperators.LESS_THAN, 0), layout="columns"
+    )
+    assert len(empty) == 0 and list(empty) == [] and COLUMN_ID in empty
+
+
 @with_cases(
     prepare_table().translate,
     inputs={
@@ -439,3 +562,359 @@ def test_translate(output, expect, case):
 )
 def test_get_columns(output, expect, case):
     assert same_data(output, expect)
+
+
+def test_iter_query():
+    table = prepare_table()
+    condition = SQLCondition("year", SQLOperators.GREATER_THAN, 1927)
+    records = table.iter_query(condition=condition, chunk_size=3)
+    assert not isinstance(records, list)
+    assert list(records) == table.query(condition=condition)
+    assert list(table.iter_query(page_size=2, page_index=3)) == table.query(
+        page_size=2, page_index=3
+    )
+
+
+def test_query_after():
+    table = prepare_table()
+    # by ID
+    first_page = table.query(page_size=4)
+    token = Table.next_page_token(first_page[-1])
+    assert table.query(page_size=4, after=token) == table.query(
+        page_size=4, page_index=2
+    )
+    # by other columns, ID is tie-breaker
+    order_by = [("type", SQLOrderByDirection.DESC), ("year", SQLOrderByDirection.DESC)]
+    expect = table.query(order_by=order_by)
+    pages, token = [], None
+    while True:
+        page = table.query(
+            columns=["title", "type", "year", COLUMN_ID],
+            order_by=order_by,
+            page_size=3,
+            after=token,
+        )
+        if not page:
+            break
+        pages.extend(page)
+        token = Table.next_page_token(page[-1], order_by)
+    assert [item["title"] for item in pages] == [item["title"] for item in expect]
+    # invalid token and mixed directions
+    for kwargs in [
+        dict(after="invalid"),
+        dict(after=token, order_by=[("type", SQLOrderByDirection.ASC)]),
+        dict(
+            after=token,
+            order_by=[
+                ("type", SQLOrderByDirection.ASC),
+                ("year", SQLOrderByDirection.DESC),
+            ],
+        ),
+    ]:
+        assert table.query(page_size=3, **kwargs) == []
+        assert table.errors[0]["type"] == "ValueError"
+
+
+def test_count_counters():
+    database = Database(":memory:", [TableMeta(**TABLE_SCHEMA)])
+    database.prepare()
+    database[TABLE_NAME].insert(ITEMS[0])
+    # existing records are counted on prepare
+    table = Table(database.conn, TableMeta(**TABLE_SCHEMA, counted=True))
+    assert table.prepare()
+    assert table.insert_batch(ITEMS[1:]) == len(ITEMS) - 1
+    alive = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+    assert table.counter_column() == "total"
+    assert table.counter_column(alive) == "alive"
+    assert table.counter_column(SQLCondition("year", SQLOperators.IS_NULL)) is None
+
+    table.delete_by_id(1, 2)
+    table.delete_by_id(3, permanent=True)
+    table.update({"id": 1, COLUMN_DELETE: None})
+    expect = {"total": len(ITEMS) - 1, "alive": len(ITEMS) - 2}
+    assert table.count() == expect["total"]
+    assert table.count(alive) == expect["alive"]
+
+    # counts drifted by changes without the triggers are repaired
+    database.conn.execute(f"DROP TRIGGER {TABLE_NAME}__count_delete")
+    database.conn.execute(f"DELETE FROM {TABLE_NAME} WHERE id = 4")
+    assert table.count() == expect["total"]
+    assert table.recount() == {"total": len(ITEMS) - 2, "alive": len(ITEMS) - 3}
+    assert table.count(alive) == len(ITEMS) - 3
+
+
+def test_search():
+    columns = TABLE_SCHEMA["columns"] | {
+        "title": TABLE_SCHEMA["columns"]["title"] | {"searchable": True},
+        "pdf": {"dtype": "str", "searchable": True},
+    }
+    database = Database(":memory:", [TableMeta(**TABLE_SCHEMA)])
+    database.prepare()
+    database[TABLE_NAME].insert({"title": "Existing Story", "type": "text"})
+    table = Table(database.conn, TableMeta(**TABLE_SCHEMA | {"columns": columns}))
+    assert table.searchable_columns == ["title", "pdf"]
+    # existing records are indexed on prepare
+    assert table.prepare()
+    table.insert_batch(ITEMS)
+    assert [r["title"] for r in table.search("story")] == ["Existing Story"]
+
+    assert len(table.search("title")) == len(ITEMS)
+    assert [r["title"] for r in table.search("title 3")] == ["Title 3"]
+    assert table.search("file-4.pdf", columns=["title"]) == [{"title": "Title 4"}]
+    assert len(table.search("title", limit=3)) == 3
+    assert len(table.search('title:"title" NOT 3', raw=True)) == len(ITEMS) - 1
+    assert table.search('"unbalanced') == []
+    assert table.errors == []
+
+    # changes are synced, deleted records are excluded by default
+    table.update({"id": 2, "title": "Renamed"})
+    table.delete_by_id(3)
+    table.delete_by_id(4, permanent=True)
+    assert [r["id"] for r in table.search("renamed")] == [2]
+    assert len(table.search("title")) == len(ITEMS) - 3
+    assert len(table.search("title", with_deleted=True)) == len(ITEMS) - 2
+
+    assert table.search("AND", raw=True) == []
+    assert len(table.errors) == 1
+
+
+def test_search_trigram():
+    columns = TABLE_SCHEMA["columns"] | {
+        "title": TABLE_SCHEMA["columns"]["title"] | {"searchable": True}
+    }
+    meta = TableMeta(
+        **TABLE_SCHEMA | {"columns": columns}, search_tokenizer="trigram"
+    )
+    table = Database(":memory:", [meta])[TABLE_NAME]
+    assert table.prepare()
+    table.insert_batch(ITEMS)
+    assert len(table.search("itl")) == len(ITEMS)
+    assert [r["title"] for r in table.search("\"tle 7\"", raw=True)] == ["Title 7"]
+
+
+def test_folded():
+    database = Database(":memory:", [TableMeta(**TABLE_SCHEMA)])
+    database.prepare()
+    database[TABLE_NAME].insert({"title": "Truyện Kiều", "type": "text"})
+    columns = TABLE_SCHEMA["columns"] | {
+        "title": TABLE_SCHEMA["columns"]["title"] | {"folded": True}
+    }
+    table = Table(database.conn, TableMeta(**TABLE_SCHEMA | {"columns": columns}))
+    assert table.folded_columns == {"title": "title__ascii"}
+    # the shadow column is added to the existing table and filled
+    assert table.prepare()
+    shadow = database.query("SELECT title__ascii FROM book WHERE id = 1")
+    assert shadow == [{"title__ascii": "truyen kieu"}]
+    # shadow columns are never selected
+    assert "title__ascii" not in table.get(1)
+    plan = database.query(
+        "EXPLAIN QUERY PLAN SELECT id FROM book WHERE title__ascii = 'x'"
+    )
+    assert "idx_book_title__ascii" in plan[0]["detail"]
+
+    table.insert_batch(
+        [
+            {"title": "Đất Rừng Phương Nam", "year": 1957, "type": "text"},
+            {"title": "Dat rung phuong nam", "year": 2000, "type": "text"},
+        ]
+    )
+    table.update({"id": 1, "title": "Số Đỏ"})
+    table.upsert({"title": "Dế Mèn", "year": 1941, "type": "text"}, ["title", "year"])
+    assert table.translate("title", "so do", "DE MEN", "dat rung phuong nam") == {
+        "so do": [1],
+        "DE MEN": [4],
+        "dat rung phuong nam": [2, 3],
+    }
+    assert table.translate("title", "Truyện Kiều") == {}
+    records = table.translate("title", "so do", full_record=True)["so do"]
+    assert [r["title"] for r in records] == ["Số Đỏ"]
+    assert "title__ascii" not in records[0]
+
+    condition = table.match_condition({"title": "đất rừng phương nam", "year": "2000"})
+    assert [r["id"] for r in table.query(condition=condition)] == [3]
+    records = table.query() + list(table.iter_query()) + [table.first(), table.last()]
+    records += table.select_in(COLUMN_ID, [1, 2])
+    assert all("title__ascii" not in record for record in records)
+    try:
+        table.match_condition({"unknown": 1})
+        assert False
+    except ValueError as error:
+        assert "unknown" in error.args[0]
+
+
+def test_aggregate():
+    table = prepare_table()
+    expect = {}
+    for item in ITEMS:
+        expect.setdefault(item["type"], []).append(item["year"])
+    expect = [
+        {"type": t, "n": len(y), "avg_year": sum(y) / len(y), "first": min(y)}
+        for t, y in sorted(expect.items())
+    ]
+    metrics = {"n": "count", "avg_year": ("avg", "year"), "first": ("min", "year")}
+    assert table.aggregate(["type"], metrics) == expect
+    assert table.aggregate() == [{"count": len(ITEMS)}]
+
+    condition = SQLCondition("year", SQLOperators.LESS_THAN, 1929)
+    groups = table.aggregate(
+        ["type"], {"n": "count"}, condition, order_by=[("n", "DESC")], limit=1
+    )
+    assert groups == [{"type": "image", "n": 2}]
+    columns = table.aggregate(["type"], metrics, layout="columns")
+    assert list(columns["n"]) == [group["n"] for group in expect]
+
+    for kwargs in [
+        dict(group_by=["unknown"]),
+        dict(metrics={"n": ("avg", "unknown")}),
+        dict(metrics={"n": "median"}),
+        dict(group_by=["type"], order_by=[("year", "ASC")]),
+    ]:
+        assert table.aggregate(**kwargs) == []
+        assert table.errors[0]["type"] == "ValueError"
+
+
+def test_query_expand():
+    columns = TABLE_SCHEMA["columns"] | {"publisher_id": {"dtype": "int"}}
+    schema = [
+        TableMeta(
+            **TABLE_SCHEMA | {"columns": columns},
+            relations={"publisher_id": "publisher"},
+        ),
+        TableMeta("publisher", {"name": "(*str)", "year": "(int)"}),
+    ]
+    database = Database(":memory:", schema, cache=QueryCache())
+    assert database.prepare()
+    table, publishers = database[TABLE_NAME], database["publisher"]
+    publishers.insert_batch([{"name": "Kim Dong", "year": 1957}, {"name": "Tre", "year": 1981}])
+    # publisher 3 does not exist
+    table.insert_batch(
+        [item | {"publisher_id": i % 3 + 1} for i, item in enumerate(ITEMS)]
+    )
+
+    condition = SQLCondition("year", SQLOperators.GREATER_THAN, 1930)
+    order_by = [("year", SQLOrderByDirection.DESC)]
+    records = table.query(["title"], condition, order_by, expand=True)
+    assert records == [
+        {"title": item["title"], "publisher_name": ["Kim Dong", "Tre", None][i % 3]}
+        for i, item in reversed(list(enumerate(ITEMS)))
+        if item["year"] > 1930
+    ]
+    # the related values are read in the same query as the records
+    assert list(table.iter_query(["title"], expand=["publisher_name"]))[1] == {
+        "title": ITEMS[1]["title"],
+        "publisher_name": "Tre",
+    }
+    last = {"year": ITEMS[-1]["year"], "id": len(ITEMS)}
+    token = table.next_page_token(last, order_by)
+    page = table.query(["title"], order_by=order_by, after=token, expand=True)
+    assert page[0]["title"] == records[1]["title"]
+
+    # writes to the related table invalidate the cached results
+    publishers.update({"id": 1, "name": "NXB Kim Dong"})
+    records = table.query(["title"], condition, order_by, expand=True)
+    assert records[0]["publisher_name"] == "NXB Kim Dong"
+
+    assert table.query(expand=["title"]) == []
+    assert table.errors[0]["type"] == "ValueError"
+
+
+def test_select_in():
+    table = prepare_table(with_delete=True)
+    ids = list(range(1, len(ITEMS) + 1))
+    alive = table.which_exists(*ids, with_deleted=False)
+    condition = SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)
+    for options in [{}, dict(chunk_size=3), dict(chunk_size=3, temp_table_threshold=5), dict(temp_table_threshold=0)]:
+        records = table.select_in(
+            COLUMN_ID, ids + ids, ["id", "year"], condition, **options
+        )
+        assert sorted(record["id"] for record in records) == alive
+
+    # more values than the parameters allowed in one statement
+    many = list(range(1, 50_001))
+    assert table.which_exists(*many) == ids
+    titles = {i + 1: item["title"] for i, item in enumerate(ITEMS)}
+    assert table.get_columns(["title"], many) == titles
+    names = [f"Title {i}" for i in range(50_000)]
+    assert table.translate("title", *names) == {v: [k] for k, v in titles.items()}
+    assert table.delete_by_id(*many, permanent=True) == len(ITEMS)
+    assert table.count() == 0 and not table.errors
+
+
+def test_select_in_reader(tmp_path):
+    database = Database(str(tmp_path / "select_in.db"), [TableMeta(**TABLE_SCHEMA)])
+    table = database[TABLE_NAME]
+    table.prepare()
+    table.insert_batch(ITEMS)
+    ids = list(range(1, len(ITEMS) + 1))
+    started, release = threading.Event(), threading.Event()
+
+    def write():
+        with database.transaction():
+            table.insert({"title": "New", "type": "text"})
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    started.wait(5)
+    # the temporary table is filled on the reader, without waiting for the writer
+    started_at = time.perf_counter()
+    records = table.select_in(
+        COLUMN_ID, ids + [len(ITEMS) + 1], chunk_size=3, temp_table_threshold=0
+    )
+    elapsed = time.perf_counter() - started_at
+    release.set()
+    thread.join()
+    assert elapsed < 1 and sorted(record["id"] for record in records) == ids
+    assert not table.errors
+    database.close()
+
+
+def test_error_store():
+    table = prepare_table()
+    # every batch fails on the unique constraint
+    item = {"title": "Title 1", "year": 1926, "type": "image", "pdf": "x" * 500}
+    assert table.insert_batch([item] * 5_000, batch_size=10) == 0
+    errors = table.errors
+    assert len(errors) == ERROR_STORE_CAPACITY and errors.total == 500
+    assert errors.dropped == 500 - ERROR_STORE_CAPACITY
+    assert errors.summary() == {errors[-1]["type"]: 500}
+    # the failed batch is kept as its number of rows and a few of them
+    data = errors[0]["data"]
+    assert data["rows"] == 10 and len(data["sample"]) == ERROR_PAYLOAD_ROWS
+    assert data["sample"][0]["pdf"] == f"{'x' * ERROR_PAYLOAD_LENGTH}...(500)"
+
+    merged = ErrorStore(capacity=10)
+    merged.extend(errors)
+    merged.extend([{"type": "ValueError", "message": "bad", "data": None}])
+    assert len(merged) == 10 and merged.total == 501
+    assert merged[-1]["type"] == "ValueError"
+    table.refresh()
+    assert table.errors == [] and table.errors.total == 0
+
+
+def test_transaction():
+    publishers = TableMeta("publisher", {"name": "(*str)"})
+    database = Database(
+        ":memory:", [TableMeta(**TABLE_SCHEMA), publishers], cache=QueryCache()
+    )
+    database.prepare()
+    table, publisher = database[TABLE_NAME], database["publisher"]
+    with database.transaction():
+        publisher.insert({"name": "NXB Tre"})
+        table.insert_batch(ITEMS[:3])
+        table.update({"id": 1, "title": "Renamed"})
+    assert publisher.count() == 1 and table.count() == 3
+
+    try:
+        with database.transaction():
+            publisher.insert({"name": "NXB Kim Dong"})
+            table.delete_by_id(1, 2, permanent=True)
+            # the cached results see the changes not committed yet
+            assert publisher.count() == 2 and table.count() == 1
+            raise ValueError("roll back all tables")
+    except ValueError:
+        pass
+    assert publisher.count() == 1 and table.count() == 3
+    assert table.get(1)["title"] == "Renamed"
+    database.close()
@@ -0,0 +1,179 @@
+from cmdapp.database import *
+from cmdapp.parser import *
+
+from tests.database.test_operation import TABLE_NAME, TABLE_SCHEMA, ITEMS
+
+
+def prepare_tables(tmp_path, shards):
+    schema = [TableMeta(**TABLE_SCHEMA)]
+    single = Database(":memory:", schema)
+    sharded = Database(str(tmp_path / "main.db"), schema, shards={TABLE_NAME: shards})
+    for database in [single, sharded]:
+        table = database[TABLE_NAME]
+        assert table.prepare()
+        assert table.insert_batch(ITEMS, batch_size=4) == len(ITEMS)
+    return single, sharded
+
+
+def test_routing(tmp_path):
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    _, database = prepare_tables(tmp_path, paths)
+    table = database[TABLE_NAME]
+    assert isinstance(table, ShardedTable)
+    for index, shard in enumerate(table.shards):
+        ids = [record["id"] for record in shard.query(columns=["id"])]
+        assert ids and all(i % 3 == index for i in ids)
+    assert table.insert({"title": "New", "type": "text"}) == len(ITEMS) + 1
+    assert table.get(len(ITEMS) + 1)["title"] == "New"
+
+    database.close()
+    paths = [str(tmp_path / f"range-{i}.db") for i in range(3)]
+    ranges = {"paths": paths, "by": "range", "ranges": [4, 8]}
+    _, database = prepare_tables(tmp_path, ranges)
+    table = database[TABLE_NAME]
+    counts = [shard.count() for shard in table.shards]
+    assert counts == [3, 4, 3]
+    database.close()
+
+
+def test_merge(tmp_path):
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    single, sharded = prepare_tables(tmp_path, paths)
+    expected, table = single[TABLE_NAME], sharded[TABLE_NAME]
+
+    assert table.count() == expected.count() == len(ITEMS)
+    order_by = [("type", "ASC"), ("year", "DESC")]
+    for page_index in [1, 2, 3, 4]:
+        options = dict(columns=["title"], order_by=order_by, page_size=3)
+        assert table.query(page_index=page_index, **options) == expected.query(
+            page_index=page_index, **options
+        )
+    titles = [record["title"] for record in table.iter_query(order_by=order_by)]
+    assert titles == [record["title"] for record in expected.query(order_by=order_by)]
+
+    # keyset pagination visits all records in order
+    after, titles = None, []
+    while records := table.query(order_by=[("year", "DESC")], page_size=4, after=after):
+        titles.extend(record["title"] for record in records)
+        after = table.next_page_token(records[-1], [("year", "DESC")])
+    assert titles == [item["title"] for item in reversed(ITEMS)]
+
+    condition = table.match_condition({"type": "text"})
+    options = dict(columns=["id", "title"], condition=condition)
+    assert table.query(**options) == expected.query(**options)
+
+    columns = table.query(columns=["id", "year"], layout="columns")
+    assert list(columns["year"]) == [item["year"] for item in ITEMS]
+
+    assert table.which_exists(1, 5, 99) == [1, 5]
+    assert table.delete_by_id(1, 5, permanent=True) == 2
+    assert table.which_exists(1, 5) == []
+    assert table.count() == len(ITEMS) - 2
+    sharded.close()
+
+
+def test_expand(tmp_path):
+    schema = [
+        TableMeta("team", {"name": "(*str)"}),
+        TableMeta(
+            "person", {"name": "(*str)", "team_id": "(int)"}, relations={"team_id": "team"}
+        ),
+    ]
+    paths = [str(tmp_path / f"team-{i}.db") for i in range(2)]
+    database = Database(str(tmp_path / "main.db"), schema, shards={"team": paths})
+    assert database.prepare()
+    database["team"].insert({"name": "Team A"})
+    table = database["person"]
+    table.insert({"name": "Ann", "team_id": 1})
+    # the sharded table is not in the database file of the query
+    assert table.query(expand=True) == []
+    assert "sharded" in table.errors[0]["message"]
+    assert table.query(columns=["name"]) == [{"name": "Ann"}]
+    database.close()
+
+
+def test_upsert(tmp_path):
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    _, database = prepare_tables(tmp_path, paths)
+    table = database[TABLE_NAME]
+    conflict_columns = ["title", "year"]
+    # the existing record is updated on its shard
+    assert table.upsert({"title": "Title 1", "year": 1926, "type": "text"}, conflict_columns) == 1
+    assert table.get(2)["type"] == "text"
+    items = [
+        {"title": "Title 2", "year": 1927, "type": "remake", "done": True},
+        {"title": "New", "year": 2000, "type": "image", "done": False},
+    ]
+    assert table.upsert_batch(items, conflict_columns, update_columns=["done"]) == 2
+    assert table.get(3)["done"] == True and table.get(3)["type"] == ITEMS[2]["type"]
+    assert table.get(len(ITEMS) + 1)["title"] == "New"
+    assert table.count() == len(ITEMS) + 1
+    database.close()
+
+
+def test_recount(tmp_path):
+    schema = [TableMeta(**TABLE_SCHEMA, counted=True)]
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    database = Database(str(tmp_path / "main.db"), schema, shards={TABLE_NAME: paths})
+    table = database[TABLE_NAME]
+    assert table.prepare()
+    assert table.insert_batch(ITEMS) == len(ITEMS)
+    table.delete_by_id(1, 2)
+    expect = {"total": len(ITEMS), "alive": len(ITEMS) - 2}
+    assert table.recount() == expect
+    assert table.count(SQLCondition(COLUMN_DELETE, SQLOperators.IS_NULL)) == expect["alive"]
+    database.close()
+
+
+def test_search(tmp_path):
+    columns = TABLE_SCHEMA["columns"] | {
+        "title": TABLE_SCHEMA["columns"]["title"] | {"searchable": True}
+    }
+    schema = [TableMeta(**TABLE_SCHEMA | {"columns": columns})]
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    database = Database(str(tmp_path / "main.db"), schema, shards={TABLE_NAME: paths})
+    table = database[TABLE_NAME]
+    assert table.prepare()
+    table.insert_batch(ITEMS)
+    table.insert({"title": "Title Title 3", "type": "text"})
+    titles = [r["title"] for r in table.search("title 3", columns=["title"])]
+    assert sorted(titles) == ["Title 3", "Title Title 3"]
+    assert len(table.search("title", limit=4)) == 4
+    assert "__rank" not in table.search("title 3")[0]
+    database.close()
+
+
+def test_aggregate(tmp_path):
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(3)]
+    single, sharded = prepare_tables(tmp_path, paths)
+    expected, table = single[TABLE_NAME], sharded[TABLE_NAME]
+    metrics = {
+        "n": "count",
+        "avg_year": ("avg", "year"),
+        "first": ("min", "year"),
+        "last": ("max", "year"),
+        "sum_year": ("sum", "year"),
+    }
+    for options in [
+        dict(group_by=["type"], metrics=metrics),
+        dict(group_by=["type", "done"], order_by=[("n", "DESC"), ("type", "ASC")], limit=2),
+        dict(condition=SQLCondition("year", SQLOperators.GREATER_THAN, 3000)),
+    ]:
+        assert table.aggregate(**options) == expected.aggregate(**options)
+    columns = table.aggregate(["type"], metrics, layout="columns")
+    assert list(columns["n"]) == list(expected.aggregate(["type"], metrics, layout="columns")["n"])
+
+    assert table.aggregate(metrics={"n": ("count_distinct", "type")}) == []
+    assert table.errors[0]["type"] == "ValueError"
+    sharded.close()
+
+
+def test_profile(tmp_path):
+    schema = [TableMeta(**TABLE_SCHEMA)]
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(2)]
+    database = Database(str(tmp_path / "main.db"), schema, shards={TABLE_NAME: paths})
+    database.set_profile("bulk-load")
+    for conn in [database.conn, *database.shard_connections]:
+        assert conn.profile_name == "bulk-load"
+        assert conn.execute("PRAGMA synchronous").fetchone()["synchronous"] == 0
+    database.close()
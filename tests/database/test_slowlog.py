@@ -0,0 +1,76 @@
+from tests.helper import *
+
+from cmdapp.database import *
+from cmdapp.parser import TableMeta
+from cmdapp.utils import Json
+
+from tests.database.test_operation import TABLE_NAME, TABLE_SCHEMA
+
+
+@with_cases(
+    SlowQueryLog.normalize,
+    inputs={
+        "Literals": "SELECT * FROM book WHERE year > 1920 AND title = 'it''s 42'",
+        "Spaces": "SELECT *\n  FROM book\n\tWHERE id = :id",
+    },
+    expects={
+        "Literals": "SELECT * FROM book WHERE year > ? AND title = ?",
+        "Spaces": "SELECT * FROM book WHERE id = :id",
+    },
+    pass_directly=True,
+)
+def test_normalize(output, expect, case):
+    assert output == expect
+
+
+def test_track(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    slowlog = SlowQueryLog(threshold=0, path=str(path), capacity=3)
+    database = Database(":memory:", [], slowlog=slowlog)
+    database.execute("CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT)")
+    database.execute("CREATE INDEX idx_book_title ON book (title)")
+    database.query("SELECT * FROM book WHERE id > :id", {"id": 1})
+    database.query("SELECT * FROM book WHERE title = :title", {"title": "x" * 200})
+
+    records = slowlog.get_records()
+    assert len(records) == 3
+    assert records[0]["sql"] == "SELECT * FROM book WHERE title = :title"
+    assert records[0]["params"]["title"].endswith("...(200)")
+    assert not records[0]["full_scan"]
+    assert records[1]["params"] == {"id": 1}
+    assert records[1]["full_scan"] is False
+    assert slowlog.get_records(full_scan_only=True) == []
+
+    database.query("SELECT COUNT(*) FROM book WHERE title LIKE '%a%'")
+    assert slowlog.get_records(1, full_scan_only=True)[0]["plan"]
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 5
+    assert Json.load(lines[-1])["sql"] == "SELECT COUNT(*) FROM book WHERE title LIKE ?"
+
+    slowlog.threshold = 1000
+    database.query("SELECT * FROM book")
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 5
+    database.close()
+
+
+def test_set_slowlog(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    paths = [str(tmp_path / f"shard-{i}.db") for i in range(2)]
+    database = Database(
+        str(tmp_path / "main.db"),
+        [TableMeta(**TABLE_SCHEMA)],
+        slowlog=SlowQueryLog(threshold=1000, path=str(path)),
+        shards={TABLE_NAME: paths},
+    )
+    database.set_slowlog(-1)
+    assert all(conn.slowlog is None for conn in database.shard_connections)
+
+    # enabled again, it writes to the same file and is shared by the shards
+    database.set_slowlog(0)
+    slowlog = database.conn.slowlog
+    assert slowlog.path == str(path)
+    assert all(conn.slowlog is slowlog for conn in database.shard_connections)
+    database.shard_connections[0].execute("SELECT 1")
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1
+    database.close()
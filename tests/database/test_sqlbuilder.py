@@ -47,6 +47,69 @@ def test_create_table(output: TableMeta, expect, case):
     assert SQLBuilder.create_table(TABLE_NAME, output) == expect
 
 
+@with_cases(
+    lambda x: SQLBuilder.create_index(TABLE_NAME, x),
+    inputs={
+        "Composite": {"name": "idx_test_name_age", "columns": ["name", "age"]},
+        "UniquePartial": {
+            "name": "idx_test_lower_name",
+            "columns": ["lower(name)"],
+            "unique": True,
+            "where": "deleted_at IS NULL",
+        },
+    },
+    expects={
+        "Composite": "CREATE INDEX IF NOT EXISTS idx_test_name_age ON test (name, age)",
+        "UniquePartial": "CREATE UNIQUE INDEX IF NOT EXISTS idx_test_lower_name ON test (lower(name)) WHERE deleted_at IS NULL",
+    },
+    pass_directly=True,
+)
+def test_create_index(output, expect, case):
+    assert output == expect
+
+
+@with_cases(
+    lambda x: SQLBuilder.recount(TABLE_NAME, **x),
+    inputs={
+        "SoftDelete": {"deleted_column": "deleted_at"},
+        "KeepCounts": {"replace": False},
+    },
+    expects={
+        "SoftDelete": "INSERT OR REPLACE INTO _counters (name, total, alive) SELECT 'test', COUNT(*), COUNT(*) - COUNT(deleted_at) FROM test",
+        "KeepCounts": "INSERT OR IGNORE INTO _counters (name, total, alive) SELECT 'test', COUNT(*), COUNT(*) FROM test",
+    },
+    pass_directly=True,
+)
+def test_recount(output, expect, case):
+    assert output == expect
+
+
+@with_cases(
+    SQLBuilder.aggregate_expression,
+    inputs={
+        "Count": "count",
+        "Column": ("AVG", "age"),
+        "Distinct": ("count_distinct", "name"),
+        "MissingColumn": "sum",
+        "Unsupported": ("median", "age"),
+    },
+    expects={
+        "Count": "COUNT(*)",
+        "Column": "AVG(age)",
+        "Distinct": "COUNT(DISTINCT name)",
+        "MissingColumn": ("ValueError", "requires a column"),
+        "Unsupported": ("ValueError", "is not supported"),
+    },
+    pass_directly=True,
+)
+def test_aggregate_expression(output, expect, case):
+    if isinstance(expect, tuple):
+        assert output[0] == expect[0]
+        assert contains_all(output[1][0], [expect[1]])
+    else:
+        assert output == expect
+
+
 @with_cases(
     lambda x: SQLBuilder.insert(TABLE_NAME, **x),
     inputs={
@@ -176,3 +239,93 @@ def test_delete(output, expect, case):
 )
 def test_select(output, expect, case):
     assert output == expect
+
+
+@with_cases(
+    lambda x: SQLBuilder.select(TABLE_NAME, compiled=True, **x),
+    inputs={
+        "WithoutAll": {},
+        "WithAll": {
+            "condition": SQLCondition("name", SQLOperators.LIKE, r"%user%").AND(
+                "age", SQLOperators.IS_NOT_NULL, None
+            ),
+            "order_by": [("name", SQLOrderByDirection.ASC)],
+            "limit": 10,
+            "offset": 2,
+        },
+    },
+    expects={
+        "WithoutAll": ("SELECT * FROM test", {}),
+        "WithAll": (
+            "SELECT * FROM test WHERE name LIKE :__p0 AND age IS NOT NULL ORDER BY name ASC LIMIT :__plimit OFFSET :__poffset",
+            {"__p0": r"%user%", "__plimit": 10, "__poffset": 2},
+        ),
+    },
+)
+def test_select_compiled(output, expect, case):
+    assert output == expect
+
+
+def test_select_join():
+    join = SQLBuilder.join("person", "team_id", "team", alias="t", join_type="left")
+    assert join == "LEFT JOIN team AS t ON person.team_id = t.id"
+    sql = SQLBuilder.select(
+        "person",
+        ["person.name", "team.name AS team_name"],
+        joins=[SQLBuilder.join("person", "team_id", "team")],
+    )
+    assert (
+        sql
+        == "SELECT person.name, team.name AS team_name FROM person INNER JOIN team AS team ON person.team_id = team.id"
+    )
+
+
+def test_update_delete_compiled():
+    condition = SQLCondition("age", SQLOperators.GREATER_THAN, 12)
+    assert SQLBuilder.update(
+        TABLE_NAME, {"name": "anonymous"}, condition, compiled=True
+    ) == (
+        "UPDATE test SET name = :name WHERE age > :__p0",
+        {"name": "anonymous", "__p0": 12},
+    )
+    assert SQLBuilder.delete(TABLE_NAME, condition, compiled=True) == (
+        "DELETE FROM test WHERE age > :__p0",
+        {"__p0": 12},
+    )
+
+
+@with_cases(
+    lambda x: SQLBuilder.upsert(TABLE_NAME, **x),
+    inputs={
+        "Default": {
+            "data": {"name": "user", "age": 12, COLUMN_ID: 3},
+            "conflict_columns": ["name"],
+        },
+        "WithId": {
+            "data": {"name": "user", "age": 12, COLUMN_ID: 3},
+            "conflict_columns": [COLUMN_ID],
+            "update_columns": ["age"],
+            "update_values": {COLUMN_UPDATE: "now"},
+        },
+        "Nothing": {
+            "data": {"name": "user"},
+            "conflict_columns": ["name"],
+        },
+    },
+    expects={
+        "Default": (
+            "INSERT INTO test (name, age) VALUES (:name, :age) ON CONFLICT (name) DO UPDATE SET age = excluded.age",
+            {"name": "user", "age": 12, COLUMN_ID: 3},
+        ),
+        "WithId": (
+            f"INSERT INTO test (name, age, {COLUMN_ID}) VALUES (:name, :age, :{COLUMN_ID}) ON CONFLICT ({COLUMN_ID}) DO UPDATE SET age = excluded.age, {COLUMN_UPDATE} = :__p{COLUMN_UPDATE}",
+            {"name": "user", "age": 12, COLUMN_ID: 3, f"__p{COLUMN_UPDATE}": "now"},
+        ),
+        "Nothing": (
+            "INSERT INTO test (name) VALUES (:name) ON CONFLICT (name) DO NOTHING",
+            {"name": "user"},
+        ),
+    },
+)
+def test_upsert(output, expect, case):
+    assert output == expect
@@ -90,3 +90,84 @@ def test_table_meta_init(output: TableMeta, expect, case):
 )
 def test_filter_columns(output, expect, case):
     assert same_data(output, expect)
+
+
+@with_cases(
+    lambda x: TableHelper.parse_indexes(x, "c1"),
+    inputs={
+        "Single": ["name"],
+        "Composite": [["name", "dob"]],
+        "Partial": [
+            {"columns": "name", "unique": True, "where": "deleted_at IS NULL"}
+        ],
+        "Expression": [{"columns": ["lower(name)"], "name": "idx_lower_name"}],
+    },
+    expects={
+        "Single": [{"name": "idx_c1_name", "columns": ["name"]}],
+        "Composite": [{"name": "idx_c1_name_dob", "columns": ["name", "dob"]}],
+        "Partial": [
+            {
+                "name": "idx_c1_name",
+                "columns": ["name"],
+                "unique": True,
+                "where": "deleted_at IS NULL",
+            }
+        ],
+        "Expression": [{"name": "idx_lower_name", "columns": ["lower(name)"]}],
+    },
+)
+def test_parse_indexes(output, expect, case):
+    assert output == expect
+    table_meta = TableMeta(**TABLE_METADATA["c1"], indexes=output)
+    assert TableMeta(**table_meta.to_json()).indexes == expect
+
+
+@with_cases(
+    lambda x: TableHelper.parse_relations(x, TABLE_META_INSTANCE.columns, "c1"),
+    inputs={
+        "Table": {"dob": "calendar"},
+        "Display": {"name": "user.username"},
+        "Dict": {"name": {"table": "user", "column": "username", "name": "owner"}},
+        "Unknown": {"team_id": "team"},
+    },
+    expects={
+        "Table": {
+            "dob": dict(table="calendar", column="id", display="name", name="dob_name")
+        },
+        "Display": {
+            "name": dict(
+                table="user", column="id", display="username", name="name_username"
+            )
+        },
+        "Dict": {
+            "name": dict(table="user", column="username", display="name", name="owner")
+        },
+        "Unknown": ("ValueError", ["team_id"]),
+    },
+)
+def test_parse_relations(output, expect, case):
+    if isinstance(expect, tuple):
+        assert output[0] == expect[0]
+        assert contains_all(output[1][0], expect[1])
+    else:
+        assert output == expect
+
+
+@with_cases(
+    TableMeta.fold,
+    inputs={
+        "Ascii": "Dat Rung",
+        "Accents": "Nguyễn Văn A",
+        "HookHorn": "Ủy Ban Ảnh Ỏ Ẻ Ỉ Ỷ Ẳ Ở Ử",
+        "None": None,
+    },
+    expects={
+        "Ascii": "dat rung",
+        "Accents": "nguyen van a",
+        "HookHorn": "uy ban anh o e i y a o u",
+        "None": None,
+    },
+    pass_directly=True,
+)
+def test_fold(output, expect, case):
+    assert output == expect
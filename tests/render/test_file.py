@@ -1,7 +1,9 @@
+import io
 from datetime import datetime
 
 from tests.helper import *
-from cmdapp.render import FileFormat
+from cmdapp.render import FileFormat, ResponseFormatter
+from cmdapp.database import ColumnSet
 
 SAMPLE_DATA = [
     # Contains non-basic Python data type (datetime) + Non ASCII text
@@ -105,3 +107,47 @@ def test_write_json(output: str, expect: list[str], case: str):
 
 # yaml is same as json
 # html is too complicated but rename is same as csv
+
+
+def test_write_iterable():
+    for writer in [
+        FileFormat.write_csv,
+        FileFormat.write_json,
+        FileFormat.write_yaml,
+        FileFormat.write_html,
+    ]:
+        for options in [{}, dict(indent=2), dict(rename={"dob": "date of birth"})]:
+            expect = writer(SAMPLE_DATA[:2], None, dict(options))
+            output = writer((item for item in SAMPLE_DATA[:2]), None, dict(options))
+            assert output == expect
+
+
+def test_write_stream():
+    formatter = ResponseFormatter()
+    for format in ["csv", "json", "yaml"]:
+        expect = getattr(formatter, format)(SAMPLE_DATA[:2], indent=2)
+        stream = io.StringIO(newline="")
+        output = getattr(formatter, format)(
+            (item for item in SAMPLE_DATA[:2]), file=stream, indent=2
+        )
+        # written into the open stream, nothing returned
+        assert output is None
+        assert stream.getvalue() == expect
+
+
+def test_write_columnar():
+    data = SAMPLE_DATA[:2]
+    columnar = ColumnSet({key: [item[key] for item in data] for key in data[0]})
+    for writer in [
+        FileFormat.write_csv,
+        FileFormat.write_json,
+        FileFormat.write_yaml,
+        FileFormat.write_html,
+    ]:
+        for options in [
+            {},
+            dict(headers=False),
+            dict(rename={"dob": "date of birth"}),
+        ]:
+            expect = writer(data, None, dict(options))
+            assert writer(columnar, None, dict(options)) == expect